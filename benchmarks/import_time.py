@@ -0,0 +1,101 @@
+"""
+Import-time budget for the CLI.
+
+Each scenario runs in a fresh interpreter under ``python -X importtime``.
+The check fails if the fastest run exceeds the scenario's budget, or if a
+module that the scenario must not load (a cloud SDK, the other database's
+driver) gets imported.
+
+Usage:
+    python benchmarks/import_time.py [--runs 5] [--scale 1.0]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+CLOUD_SDKS = ["boto3", "botocore", "google.cloud.storage", "azure.storage.blob"]
+
+# (name, code, budget in milliseconds, modules that must not be imported)
+SCENARIOS = [
+    (
+        "cli",
+        "import cli",
+        150,
+        CLOUD_SDKS + ["psycopg2", "pymongo", "cryptography", "requests"],
+    ),
+    (
+        "postgres handler",
+        "import cli; from database.db_factory import get_db_handler; "
+        "get_db_handler('postgres', host='h', user='u', password='p', database='d')",
+        300,
+        CLOUD_SDKS + ["pymongo", "requests"],
+    ),
+    (
+        "mongo handler",
+        "import cli; from database.db_factory import get_db_handler; "
+        "get_db_handler('mongo', host='h', port=27017)",
+        400,
+        CLOUD_SDKS + ["psycopg2", "requests"],
+    ),
+]
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure(code):
+    """
+    Import ``code`` in a fresh interpreter.
+
+    Returns:
+        tuple: Milliseconds spent importing beyond interpreter startup, and
+        the set of imported module names.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total, modules = 0, set()
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        modules.add(name)
+        # Top-level entries carry the cumulative time of everything below them.
+        if len(indent) == 1:
+            total += int(cumulative)
+    return total / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="Runs per scenario; the fastest counts")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget, e.g. on slow CI machines")
+    args = parser.parse_args()
+
+    baseline = min(measure("pass")[0] for _ in range(args.runs))
+    failures = 0
+    for name, code, budget, forbidden in SCENARIOS:
+        runs = [measure(code) for _ in range(args.runs)]
+        elapsed = min(ms for ms, _ in runs) - baseline
+        loaded = sorted(
+            module for module in forbidden if any(module in imported for _, imported in runs)
+        )
+        limit = budget * args.scale
+        ok = elapsed <= limit and not loaded
+        failures += not ok
+        print(f"{'ok' if ok else 'FAIL':<5}{name}: {elapsed:.1f} ms (budget {limit:.0f} ms)")
+        if loaded:
+            print(f"     unexpected imports: {', '.join(loaded)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
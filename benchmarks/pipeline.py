@@ -0,0 +1,358 @@
+"""
+Throughput and memory benchmark of the backup pipeline.
+
+Synthetic dump-like datasets (compressible COPY-style rows and incompressible
+random bytes) are generated once into ``--data-dir`` and reused. Each case
+(dataset, stage, codec) runs in a fresh interpreter, so its peak memory is
+not hidden by an earlier case. Peak memory is the growth of the process's
+peak RSS during the case, beyond the peak reached while importing, and
+includes the buffers of the C compression libraries. Stages:
+
+    compress, decompress  compress_stream / decompress_stream, per codec
+    encrypt, decrypt      encrypt_stream / decrypt_stream
+    store                 write_stream of the dataset to a local file
+    roundtrip             compress, encrypt and write a backup, then read it
+                          back through unpack_stream and check its digest
+
+No database or cloud account is needed; a fixed throwaway encryption key is
+used. With ``--baseline`` the results are compared with a stored run, and
+the check fails if a case's throughput drops, or its peak memory grows, by
+more than ``--tolerance``. Baselines depend on the machine: save one on the
+same host before comparing.
+
+Usage:
+    python benchmarks/pipeline.py [--sizes 1MB,64MB] [--codecs gzip,zstd] [--runs 3]
+    python benchmarks/pipeline.py --save-baseline benchmarks/baseline.json
+    python benchmarks/pipeline.py --baseline benchmarks/baseline.json
+"""
+import argparse
+import base64
+import contextlib
+import hashlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+DATA_KINDS = ["compressible", "incompressible"]
+CODEC_STAGES = ["compress", "decompress", "roundtrip"]
+STAGES = ["compress", "decompress", "encrypt", "decrypt", "store", "roundtrip"]
+# Not a secret: the benchmark encrypts synthetic data only.
+BENCHMARK_KEY = base64.urlsafe_b64encode(b"backup-utility-benchmark-key-32b").decode()
+# Peak RSS is noisy by a few MiB between runs; smaller growth is not a regression.
+MEMORY_SLACK = 8 * 1024 * 1024
+
+_UNITS = {"": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3}
+_SIZE = re.compile(r"^(\d+)\s*(KB|MB|GB|)$", re.IGNORECASE)
+_STATUSES = ["active", "pending", "shipped", "cancelled", "refunded"]
+_CITIES = ["Berlin", "Lisbon", "Osaka", "Toronto", "Nairobi", "Lima", "Oslo", "Pune"]
+
+
+def parse_size(text):
+    match = _SIZE.match(text.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid size: {text}")
+    return int(match.group(1)) * _UNITS[match.group(2).upper()]
+
+
+def format_size(size):
+    for unit in ("GB", "MB", "KB"):
+        if size >= _UNITS[unit] and size % _UNITS[unit] == 0:
+            return f"{size // _UNITS[unit]}{unit}"
+    return str(size)
+
+
+def _compressible_block(rng, first_id, size):
+    # Rows of a COPY-format table dump: sequential ids, repeated vocabulary,
+    # random amounts and timestamps. Compresses about as well as real dumps.
+    rows = []
+    length = 0
+    row_id = first_id
+    while length < size:
+        row = (
+            f"{row_id}\tcustomer_{rng.randrange(100000)}\t"
+            f"user{rng.randrange(100000)}@example.com\t{rng.choice(_CITIES)}\t"
+            f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d} "
+            f"{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}\t"
+            f"{rng.randrange(100000) / 100:.2f}\t{rng.choice(_STATUSES)}\n"
+        )
+        rows.append(row)
+        length += len(row)
+        row_id += 1
+    return "".join(rows).encode()[:size], row_id
+
+
+def generate_dataset(kind, size, file_path, block_size=1024 * 1024):
+    """
+    Write a deterministic synthetic dataset, block by block.
+
+    Args:
+        kind (str): 'compressible' or 'incompressible'.
+        size (int): Size in bytes.
+        file_path (str): Destination file.
+    """
+    rng = random.Random(f"{kind}-{size}")
+    row_id = 1
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "wb") as file:
+        remaining = size
+        while remaining:
+            length = min(block_size, remaining)
+            if kind == "compressible":
+                block, row_id = _compressible_block(rng, row_id, length)
+            else:
+                block = rng.randbytes(length)
+            file.write(block)
+            remaining -= length
+    os.replace(tmp_path, file_path)
+
+
+def prepare(data_dir, kind, size, codecs):
+    """
+    Create a dataset and the stage inputs derived from it, unless cached.
+
+    Returns:
+        str: Path of the dataset.
+    """
+    from utils.compression import compress_backup, get_codec
+    from utils.encryption import encrypt_file
+
+    raw = os.path.join(data_dir, f"{kind}-{format_size(size)}.bin")
+    if not os.path.exists(raw):
+        print(f"Generating {raw}...", file=sys.stderr)
+        generate_dataset(kind, size, raw)
+    for codec in codecs:
+        compressed = f"{raw}{get_codec(codec).extension}"
+        if not os.path.exists(compressed):
+            # Keep the library's progress messages out of the results.
+            with contextlib.redirect_stdout(sys.stderr):
+                compress_backup(raw, compressed, codec)
+    # Encrypted inputs are cheap and depend on a random nonce; always redo them.
+    encrypt_file(raw)
+    return raw
+
+
+def _drain(chunks):
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+    return size
+
+
+def run_case(case):
+    """
+    Run one case ``case["runs"]`` times in this process.
+
+    Returns:
+        dict: Bytes processed, the best time in seconds, the throughput in
+        bytes per second and the peak RSS growth in bytes.
+    """
+    import resource
+    from utils.compression import compress_stream, decompress_stream, get_codec
+    from utils.encryption import decrypt_stream, encrypt_stream
+    from utils.metrics import RunMetrics
+    from utils.packing import unpack_stream
+    from utils.pipeline import read_chunks, write_stream
+
+    raw = case["dataset"]
+    codec = case["codec"]
+    threads = case["threads"]
+    output = os.path.join(case["work_dir"], f"out-{os.getpid()}")
+    stage_report = None
+
+    def once():
+        nonlocal stage_report
+        stage = case["stage"]
+        if stage == "compress":
+            with open(raw, "rb") as file:
+                _drain(compress_stream(read_chunks(file), codec, None, threads))
+        elif stage == "decompress":
+            with open(f"{raw}{get_codec(codec).extension}", "rb") as file:
+                _drain(decompress_stream(read_chunks(file)))
+        elif stage == "encrypt":
+            with open(raw, "rb") as file:
+                _drain(encrypt_stream(read_chunks(file)))
+        elif stage == "decrypt":
+            with open(f"{raw}.enc", "rb") as file:
+                _drain(decrypt_stream(file))
+        elif stage == "store":
+            with open(raw, "rb") as file:
+                write_stream(read_chunks(file), output)
+            os.remove(output)
+        elif stage == "roundtrip":
+            metrics = RunMetrics("roundtrip")
+            with open(raw, "rb") as file:
+                chunks = metrics.meter("read", read_chunks(file))
+                chunks = metrics.meter("compress", compress_stream(chunks, codec, None, threads))
+                chunks = metrics.meter("encrypt", encrypt_stream(chunks))
+                with metrics.sink("store", chunks):
+                    write_stream(chunks, output)
+            digest = hashlib.sha256()
+            with open(output, "rb") as file:
+                chunks = metrics.meter("read", read_chunks(file))
+                chunks = metrics.meter("unpack", unpack_stream(chunks), upstream=chunks)
+                for chunk in chunks:
+                    digest.update(chunk)
+            os.remove(output)
+            if digest.hexdigest() != case["sha256"]:
+                raise ValueError(f"Round trip of {raw} with {codec} changed the data.")
+            stage_report = [stage.as_dict() for stage in metrics.stages()]
+        else:
+            raise ValueError(f"Unknown stage: {stage}")
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    times = []
+    for _ in range(case["runs"]):
+        started = time.perf_counter()
+        once()
+        times.append(time.perf_counter() - started)
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    scale = 1 if sys.platform == "darwin" else 1024
+    seconds = min(times)
+    result = {
+        "bytes": case["size"],
+        "seconds": round(seconds, 6),
+        "throughput_bytes_per_second": round(case["size"] / seconds) if seconds else None,
+        "peak_memory_bytes": (rss_after - rss_before) * scale,
+    }
+    if stage_report:
+        result["stages"] = stage_report
+    return result
+
+
+def measure(case):
+    """
+    Run a case in a fresh interpreter.
+    """
+    env = dict(os.environ, ENCRYPTION_KEY=BENCHMARK_KEY)
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(case)],
+        cwd=SRC_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(f"Case {case['name']} failed:\n{result.stderr.strip()}")
+    return json.loads(result.stdout)
+
+
+def compare(result, baseline, tolerance):
+    """
+    Compare a result with its baseline.
+
+    Returns:
+        list: Descriptions of the regressions, empty if there are none.
+    """
+    problems = []
+    rate, base_rate = result["throughput_bytes_per_second"], baseline["throughput_bytes_per_second"]
+    if rate and base_rate and rate < base_rate * (1 - tolerance):
+        problems.append(f"throughput {rate / base_rate - 1:+.0%}")
+    memory, base_memory = result["peak_memory_bytes"], baseline["peak_memory_bytes"]
+    if memory > max(base_memory * (1 + tolerance), base_memory + MEMORY_SLACK):
+        problems.append(f"peak memory {memory / 1048576:.1f} MiB (baseline {base_memory / 1048576:.1f} MiB)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1MB,64MB", help="Comma-separated dataset sizes, e.g. 1MB,100MB,1GB,10GB")
+    parser.add_argument("--data", default=",".join(DATA_KINDS), help="Comma-separated dataset kinds")
+    parser.add_argument("--codecs", default="gzip,zstd", help="Comma-separated codecs")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages")
+    parser.add_argument("--threads", type=int, default=None, help="Compression threads; the CPU count if omitted")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per case; the fastest counts")
+    parser.add_argument(
+        "--data-dir",
+        default=os.path.join(tempfile.gettempdir(), "backup-utility-benchmark"),
+        help="Directory for the generated datasets, kept between runs",
+    )
+    parser.add_argument("--baseline", help="Compare with the results stored in this file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed regression, as a fraction")
+    parser.add_argument("--save-baseline", help="Store the results in this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.path.insert(0, SRC_DIR)
+        print(json.dumps(run_case(json.loads(args.worker))))
+        return 0
+
+    sys.path.insert(0, SRC_DIR)
+    os.environ["ENCRYPTION_KEY"] = BENCHMARK_KEY
+    try:
+        sizes = [parse_size(size) for size in args.sizes.split(",")]
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    kinds = args.data.split(",")
+    codecs = args.codecs.split(",")
+    stages = args.stages.split(",")
+    for name, values, known in (("dataset kind", kinds, DATA_KINDS), ("stage", stages, STAGES)):
+        unknown = sorted(set(values) - set(known))
+        if unknown:
+            parser.error(f"unknown {name}: {', '.join(unknown)}")
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)["results"]
+
+    results = {}
+    failures = 0
+    os.makedirs(args.data_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=args.data_dir) as work_dir:
+        for kind in kinds:
+            for size in sizes:
+                raw = prepare(args.data_dir, kind, size, codecs)
+                digest = hashlib.sha256()
+                with open(raw, "rb") as file:
+                    for block in iter(lambda: file.read(1024 * 1024), b""):
+                        digest.update(block)
+                for stage in stages:
+                    for codec in codecs if stage in CODEC_STAGES else [None]:
+                        name = f"{kind}-{format_size(size)}/{stage}" + (f"/{codec}" if codec else "")
+                        case = {
+                            "name": name,
+                            "dataset": raw,
+                            "size": size,
+                            "sha256": digest.hexdigest(),
+                            "stage": stage,
+                            "codec": codec,
+                            "threads": args.threads,
+                            "runs": args.runs,
+                            "work_dir": work_dir,
+                        }
+                        result = results[name] = measure(case)
+                        problems = compare(result, baseline[name], args.tolerance) if name in baseline else []
+                        failures += bool(problems)
+                        rate = result["throughput_bytes_per_second"] or 0
+                        line = (
+                            f"{'FAIL' if problems else 'ok':<5}{name}: {rate / 1048576:.1f} MiB/s, "
+                            f"peak +{result['peak_memory_bytes'] / 1048576:.1f} MiB"
+                        )
+                        if name in baseline:
+                            base_rate = baseline[name]["throughput_bytes_per_second"] or 0
+                            line += f" (baseline {base_rate / 1048576:.1f} MiB/s)"
+                        print(line)
+                        for problem in problems:
+                            print(f"     regression: {problem}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            json.dump(
+                {"python": sys.version.split()[0], "cpus": os.cpu_count(), "results": results},
+                file,
+                indent=2,
+            )
+        print(f"Results saved to {args.save_baseline}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
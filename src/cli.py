@@ -1,7 +1,13 @@
 import typer
 import os
+import json
+from typing import List
 from database.db_factory import get_db_handler
+from database.jobs import catalog_backup, expand_inventory, run_backup_batch
+from storage.providers import parse_location
+from scheduler.scheduler import Scheduler
 from utils.logging import setup_logger
+from utils.metrics import RunMetrics
 
 
 app = typer.Typer()
@@ -10,43 +16,113 @@ app = typer.Typer()
 logger = setup_logger()
 
 
-def get_db_params(db_type: str):
+def get_db_params(db_type: str, ask_database: bool = True, profile: dict = None):
     """
     Collects database connection parameters based on the type of database.
+
+    Parameters set by a connection profile are not asked for. With a
+    profile, optional parameters it leaves out take their defaults, so
+    scripted runs only prompt for what is missing.
     """
+
+    def ask(field, text, **kwargs):
+        if profile is not None:
+            if profile.get(field) is not None:
+                return profile[field]
+            if "default" in kwargs:
+                return kwargs["default"]
+        return typer.prompt(text, **kwargs)
+
     if db_type in ["postgres"]:
-        return {
-            "host": typer.prompt("Enter host"),
-            "user": typer.prompt("Enter username"),
-            "password": typer.prompt("Enter password", hide_input=True),
-            "database": typer.prompt("Enter database name"),
-            "port": typer.prompt(
-                "Enter port", default=5432
-            ),
+        params = {
+            "host": ask("host", "Enter host"),
+            "user": ask("user", "Enter username"),
+            "password": ask("password", "Enter password", hide_input=True),
         }
+        if ask_database:
+            params["database"] = ask("database", "Enter database name")
+        params["port"] = ask(
+            "port", "Enter port", default=5432
+        )
+        return params
     elif db_type == "mongo":
-        return {
-            "host": typer.prompt("Enter host"),
-            "port": typer.prompt("Enter port", default=27017),
-            "user": typer.prompt("Enter username (leave blank for none)", default=""),
-            "password": typer.prompt(
-                "Enter password (leave blank for none)", hide_input=True, default=""
+        params = {
+            "host": ask("host", "Enter host"),
+            "port": ask("port", "Enter port", default=27017),
+            "user": ask("user", "Enter username (leave blank for none)", default=""),
+            "password": ask(
+                "password", "Enter password (leave blank for none)", hide_input=True, default=""
             ),
-            "database": typer.prompt("Enter database name"),
         }
+        if ask_database:
+            params["database"] = ask("database", "Enter database name")
+        return params
     else:
         typer.echo("Unsupported database type!")
         raise typer.Exit()
 
 
+def load_profile(name: str, db_type: str):
+    """
+    Load a command's connection profile and settle its database type.
+
+    Returns:
+        tuple: The database type, and the profile from
+        ``utils.profiles.connection_profile`` or None without a name.
+    """
+    if not name:
+        if not db_type:
+            typer.echo("Error: pass --db-type or --profile.")
+            raise typer.Exit(code=1)
+        return db_type, None
+    from utils.profiles import connection_profile
+
+    try:
+        profile = connection_profile(name)
+    except (ValueError, RuntimeError) as e:
+        typer.echo(f"Error loading profile {name}: {e}")
+        raise typer.Exit(code=1)
+    if db_type and profile["db_type"] and db_type != profile["db_type"]:
+        typer.echo(f"Error: profile {name} is for {profile['db_type']}, not {db_type}.")
+        raise typer.Exit(code=1)
+    db_type = db_type or profile["db_type"]
+    if not db_type:
+        typer.echo(f"Error: profile {name} sets no db_type; pass --db-type.")
+        raise typer.Exit(code=1)
+    return db_type, profile
+
+
+def export_metrics(metrics, metrics_json=None, metrics_prom=None):
+    """
+    Log a run's stage summary and write its metrics exports.
+    """
+    logger.info(f"{metrics.operation.capitalize()} stages: {metrics.summary()}")
+    try:
+        if metrics_json:
+            metrics.write_json(metrics_json)
+        if metrics_prom:
+            metrics.write_prometheus(metrics_prom)
+    except OSError as e:
+        logger.error(f"Failed to write metrics: {e}")
+
+
 @app.command()
 def backup(
     db_type: str = typer.Option(
-        ..., help="Database type (postgres, mongo)"
+        None, help="Database type (postgres, mongo); taken from --profile if omitted"
+    ),
+    profile: str = typer.Option(
+        None,
+        envvar="BACKUP_PROFILE",
+        help="Connection profile from the config's profiles section (default: $BACKUP_PROFILE)",
     ),
-    storage: str = typer.Option("local", help="Storage type (local, cloud)"),
+    storage_profile: str = typer.Option(
+        None,
+        help="Storage profile setting --storage, --path, --provider, --bucket, --repository and --destination (default: the connection profile's)",
+    ),
+    storage: str = typer.Option(None, help="Storage type (local, cloud, repository); default local"),
     path: str = typer.Option(
-        ...,
+        None,
         help="Local directory path (required for local storage)",
     ),
     provider: str = typer.Option(None, help="Cloud provider (aws, gcp, azure)"),
@@ -59,91 +135,671 @@ def backup(
     ),
     compress: bool = True,
     encrypt: bool = True,
+    stream: bool = typer.Option(
+        False,
+        help="Stream the dump through compression, encryption and upload without intermediate files.",
+    ),
+    codec: str = typer.Option("gzip", help="Compression codec (gzip, zstd, lz4, xz)"),
+    level: int = typer.Option(None, help="Compression level (codec default if omitted)"),
+    threads: int = typer.Option(
+        None, help="Compression threads (defaults to the number of CPUs)"
+    ),
+    dump_format: str = typer.Option(
+        None,
+        help="Dump format: custom (the PostgreSQL default) or directory (PostgreSQL), archive (MongoDB, a streamed mongodump --archive), or objects for one member per table or collection",
+    ),
+    jobs: int = typer.Option(
+        None,
+        help="Parallel dump jobs for the directory and objects formats, and collections dumped at once into a MongoDB archive",
+    ),
+    include: List[str] = typer.Option(
+        None,
+        help="Only back up tables (table, schema.table, schema.*) or collections matching this pattern; repeatable",
+    ),
+    exclude: List[str] = typer.Option(
+        None, help="Skip tables or collections matching this pattern; repeatable"
+    ),
+    mode: str = typer.Option(
+        "full",
+        help="Backup mode (full, incremental). Incremental ships PostgreSQL WAL or the MongoDB oplog into the --path archive directory.",
+    ),
+    new_base: bool = typer.Option(
+        False,
+        help="Take a new PostgreSQL base backup in incremental mode, bounding the WAL a point-in-time restore replays",
+    ),
+    repository: str = typer.Option(
+        None,
+        help="Deduplicating repository directory (required for repository storage)",
+    ),
+    container: bool = typer.Option(
+        False,
+        help="Store the dump in a seekable .dbk container with an encrypted table of contents",
+    ),
+    destination: List[str] = typer.Option(
+        None,
+        help="Stream the backup to this destination (local:/dir, s3://bucket/prefix, gs://..., az://...) instead of --storage; repeatable, the dump runs once",
+    ),
+    metrics_json: str = typer.Option(
+        None, help="Write a JSON report of the run's per-stage metrics to this file"
+    ),
+    metrics_prom: str = typer.Option(
+        None,
+        help="Write the run's metrics in Prometheus text format to this file (node_exporter textfile collector)",
+    ),
+    catalog: str = typer.Option(
+        None, help="Catalog recording the backup (default: $BACKUP_CATALOG or ~/.cache/database-backup-utility/catalog.sqlite)"
+    ),
+    record_counts: bool = typer.Option(
+        False,
+        help="Record the row count of each table or collection in the manifest for restore-test (PostgreSQL scans every table)",
+    ),
+    rate_limit: str = typer.Option(
+        None,
+        help="Limit the streamed backup and uploads to this rate, e.g. 20MB or 10MiB (default: the config's throttle.job_rate)",
+    ),
+    nice: int = typer.Option(
+        None, help="Niceness of the dump processes (default: the config's throttle.nice)"
+    ),
+    ionice: str = typer.Option(
+        None,
+        help="I/O class of the dump processes: idle or best-effort[:level] (default: the config's throttle.ionice)",
+    ),
 ):
     """
     Perform a database backup.
     """
-    params = get_db_params(db_type)
+    db_type, profile = load_profile(profile, db_type)
+    if new_base and db_type != "postgres":
+        typer.echo("Error: --new-base applies to PostgreSQL incremental backups.")
+        raise typer.Exit(code=1)
+    settings = profile["backup"] if profile else {}
+    if storage_profile:
+        from utils.profiles import storage_profile as load_storage_profile
+
+        try:
+            settings = load_storage_profile(storage_profile)
+        except ValueError as e:
+            typer.echo(f"Error loading profile {storage_profile}: {e}")
+            raise typer.Exit(code=1)
+    storage = storage or settings.get("storage", "local")
+    path = path or settings.get("path")
+    provider = provider or settings.get("provider")
+    bucket = bucket or settings.get("bucket")
+    repository = repository or settings.get("repository")
+    destination = destination or settings.get("destinations")
+    if not path:
+        typer.echo("Error: --path is required (or set path in the storage profile).")
+        raise typer.Exit(code=1)
+    params = get_db_params(db_type, profile=profile["connection"] if profile else None)
+    format_options = {
+        "mode": mode,
+        "include": include,
+        "exclude": exclude,
+        "container": container,
+        "destinations": destination,
+    }
+    if dump_format is not None:
+        format_options["dump_format"] = dump_format
+    if db_type == "postgres":
+        format_options["new_base"] = new_base
+    format_options["jobs"] = jobs
+    metrics = RunMetrics(
+        "backup", {"db_type": db_type, "database": params.get("database")}
+    )
     try:
         db_handler = get_db_handler(db_type, **params)
         db_handler.connect(logger=logger)
         typer.echo("Connection successful. Starting backup...")
-        compressed_backup_path = db_handler.backup(
+        options = dict(
             storage=storage,
             path=path,
             provider=provider,
             bucket=bucket,
+            compress=compress,
+            encrypt=encrypt,
+            stream=stream,
+            codec=codec,
+            level=level,
+            threads=threads,
+            repository=repository,
+            record_counts=record_counts,
+            rate_limit=rate_limit,
+            nice=nice,
+            ionice=ionice,
+            **format_options,
+        )
+        compressed_backup_path = db_handler.backup(
             notify_slack=notify_slack,
             slack_webhook_url=slack_webhook_url,
-            compress=compress,
             logger=logger,
-            encrypt=encrypt,
+            metrics=metrics,
+            **options,
+        )
+        metrics.finish("success", compressed_backup_path)
+        catalog_backup(
+            db_type, params, options, compressed_backup_path, logger, metrics, catalog
         )
+        if isinstance(compressed_backup_path, list):
+            compressed_backup_path = ", ".join(compressed_backup_path)
         if compress:
             typer.echo(f"Backup and Compressed saved to: {compressed_backup_path}")
         else:
             typer.echo(f"Backup saved to: {compressed_backup_path}")
         typer.echo("Backup completed successfully.")
     except Exception as e:
+        metrics.finish("failed")
         typer.echo(f"Error during backup: {e}")
     finally:
         if "db_handler" in locals():
             db_handler.close(
                 logger=logger,
             )
+        export_metrics(metrics, metrics_json, metrics_prom)
+
+
+@app.command()
+def backup_all(
+    inventory: str = typer.Option(
+        None, help="JSON inventory of servers and databases to back up"
+    ),
+    db_type: str = typer.Option(
+        None, help="Database type (postgres, mongo) to back up every database of one server"
+    ),
+    path: str = typer.Option(
+        "backups",
+        help="Directory for the backups of the discovered databases (with --db-type)",
+    ),
+    parallel: int = typer.Option(4, help="Number of backups running at once"),
+    max_per_host: int = typer.Option(
+        1, help="Number of backups running against the same host at once"
+    ),
+    report: str = typer.Option(None, help="Write the JSON report to this file"),
+):
+    """
+    Back up many databases concurrently and report per-database results.
+    """
+    if inventory:
+        with open(inventory, "r") as file:
+            servers = json.load(file)
+    elif db_type:
+        # Prompt once for the server, then back up all of its databases.
+        suffix = ".dump" if db_type == "postgres" else ""
+        servers = {
+            "servers": [
+                {
+                    "db_type": db_type,
+                    "connection": get_db_params(db_type, ask_database=False),
+                    "databases": "all",
+                    "backup": {
+                        "path": os.path.join(path, "{database}-{timestamp}" + suffix)
+                    },
+                }
+            ]
+        }
+    else:
+        typer.echo("Error: pass --inventory or --db-type.")
+        raise typer.Exit(code=1)
+
+    try:
+        targets = expand_inventory(servers, logger)
+    except Exception as e:
+        typer.echo(f"Error reading the inventory: {e}")
+        raise typer.Exit(code=1)
+    typer.echo(f"Backing up {len(targets)} databases...")
+    results = run_backup_batch(targets, logger, parallel, max_per_host)
+
+    for entry in results:
+        size = "-" if entry["bytes"] is None else f"{entry['bytes']} bytes"
+        typer.echo(
+            f"{entry['status']:<8} {entry['host']}/{entry['database']}: "
+            f"{entry['seconds']}s, {size}, {entry['location'] or entry['error']}"
+        )
+    failed = sum(entry["status"] != "success" for entry in results)
+    typer.echo(f"{len(results) - failed} succeeded, {failed} failed.")
+    if report:
+        with open(report, "w") as file:
+            json.dump(results, file, indent=2)
+        typer.echo(f"Report written to {report}")
+    if failed:
+        raise typer.Exit(code=1)
 
 
 @app.command()
 def restore(
     db_type: str = typer.Option(
-        ..., help="Database type (postgres, mongo)"
+        None, help="Database type (postgres, mongo); taken from --profile if omitted"
+    ),
+    profile: str = typer.Option(
+        None,
+        envvar="BACKUP_PROFILE",
+        help="Connection profile from the config's profiles section (default: $BACKUP_PROFILE)",
     ),
     backup_path: str = typer.Option(
-        ..., help="Path to the backup file (compressed or uncompressed)"
+        ...,
+        help="Path or cloud location (s3://, gs://, az://) of the backup file",
+    ),
+    jobs: int = typer.Option(
+        None,
+        help="Parallel restore jobs for directory-format and objects-format backups, or MongoDB insertion workers per collection",
+    ),
+    include: List[str] = typer.Option(
+        None,
+        help="Only restore tables or collections matching this pattern from an objects-format backup; repeatable",
+    ),
+    exclude: List[str] = typer.Option(
+        None, help="Skip tables or collections matching this pattern; repeatable"
+    ),
+    point_in_time: str = typer.Option(
+        None,
+        help="Recover an incremental archive to this ISO 8601 timestamp",
+    ),
+    data_dir: str = typer.Option(
+        None,
+        help="Empty data directory to recover a PostgreSQL archive into (with --point-in-time)",
+    ),
+    metrics_json: str = typer.Option(
+        None, help="Write a JSON report of the run's per-stage metrics to this file"
+    ),
+    metrics_prom: str = typer.Option(
+        None, help="Write the run's metrics in Prometheus text format to this file"
     ),
 ):
     """
     Restore a database from a backup file.
     """
-    if not os.path.exists(backup_path):
+    db_type, profile = load_profile(profile, db_type)
+    if parse_location(backup_path) is None and not os.path.exists(backup_path):
         typer.echo(f"Error: Backup file '{backup_path}' does not exist.")
         raise typer.Exit(code=1)
 
-    params = get_db_params(db_type)
+    if point_in_time and db_type == "postgres":
+        # Recovery builds a new data directory; no server connection is needed.
+        if not data_dir:
+            typer.echo("Error: --point-in-time needs --data-dir for PostgreSQL.")
+            raise typer.Exit(code=1)
+        from database.postgres_wal import restore_point_in_time
+
+        try:
+            restore_point_in_time(backup_path, point_in_time, data_dir, logger)
+            typer.echo(f"Recovery prepared in {data_dir}. Start PostgreSQL on it to replay WAL.")
+        except Exception as e:
+            typer.echo(f"Error during restore: {e}")
+        return
+
+    params = get_db_params(db_type, profile=profile["connection"] if profile else None)
+    metrics = RunMetrics(
+        "restore", {"db_type": db_type, "database": params.get("database")}
+    )
 
     try:
         db_handler = get_db_handler(db_type, **params)
         db_handler.connect(logger=logger)
         typer.echo("Connection successful. Starting restore...")
         # Restore logic per database type
-        db_handler.restore(backup_path, logger=logger)
+        if db_type == "postgres":
+            db_handler.restore(
+                backup_path,
+                logger=logger,
+                jobs=jobs,
+                include=include,
+                exclude=exclude,
+                metrics=metrics,
+            )
+        else:
+            db_handler.restore(
+                backup_path,
+                logger=logger,
+                point_in_time=point_in_time,
+                jobs=jobs,
+                include=include,
+                exclude=exclude,
+                metrics=metrics,
+            )
+        metrics.finish("success", backup_path)
         typer.echo("Restore completed successfully.")
     except Exception as e:
+        metrics.finish("failed")
         typer.echo(f"Error during restore: {e}")
     finally:
         if "db_handler" in locals():
             db_handler.close(logger=logger)
+        export_metrics(metrics, metrics_json, metrics_prom)
+
+
+@app.command()
+def inspect(
+    backup_path: str = typer.Option(
+        ..., help="Path or cloud location (s3://, gs://, az://) of a .dbk container"
+    ),
+):
+    """
+    List the members of a backup container, reading only its table of contents.
+    """
+    from storage.container import ContainerReader
+
+    try:
+        with ContainerReader(backup_path) as reader:
+            toc = reader.toc
+            typer.echo(
+                f"Created {toc['created']}, codec {toc['codec'] or 'none'}, "
+                f"{'encrypted' if toc['encrypted'] else 'not encrypted'}"
+            )
+            typer.echo(f"{'size':>14} {'stored':>14} {'sha256':<12}  name")
+            for member in toc["members"]:
+                typer.echo(
+                    f"{member['size']:>14} {member['stored_size']:>14} "
+                    f"{member['sha256'][:12]}  {member['name']}"
+                )
+            total = sum(member["size"] for member in toc["members"])
+            stored = sum(member["stored_size"] for member in toc["members"])
+            typer.echo(f"{len(toc['members'])} members, {total} bytes ({stored} stored)")
+    except Exception as e:
+        typer.echo(f"Error reading container: {e}")
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def extract(
+    backup_path: str = typer.Option(
+        ..., help="Path or cloud location (s3://, gs://, az://) of a .dbk container"
+    ),
+    output: str = typer.Option(..., help="Directory to extract the members into"),
+    member: List[str] = typer.Option(
+        None, help="Member to extract (see inspect); repeatable, all members if omitted"
+    ),
+):
+    """
+    Extract members of a backup container, reading only their frames.
+    """
+    from storage.container import ContainerReader
+
+    try:
+        with ContainerReader(backup_path) as reader:
+            for name in member or list(reader.members):
+                typer.echo(f"Extracted {reader.extract(name, output)}")
+    except KeyError as e:
+        typer.echo(f"Error: the container has no member {e}.")
+        raise typer.Exit(code=1)
+    except Exception as e:
+        typer.echo(f"Error extracting from container: {e}")
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def verify(
+    backup_path: List[str] = typer.Option(
+        None,
+        help="Backup file, directory or cloud location (s3://, gs://, az://) to verify; repeatable",
+    ),
+    backup_id: int = typer.Option(None, help="Verify every copy of this cataloged backup"),
+    database: str = typer.Option(
+        None, help="Verify every copy of the latest cataloged backup of this database"
+    ),
+    quick: bool = typer.Option(
+        False,
+        help="Compare cloud objects with their ETag, CRC32C or MD5 instead of downloading them when possible",
+    ),
+    audit: bool = typer.Option(False, help="Also re-hash with SHA-256"),
+    parallel: int = typer.Option(8, help="Objects verified at once"),
+    catalog: str = typer.Option(None, help="Catalog file (default: $BACKUP_CATALOG)"),
+):
+    """
+    Check stored backups against the checksums in their sidecar manifests.
+    """
+    from storage.catalog import BackupCatalog
+    from storage.manifest import verify_backup
+
+    locations = list(backup_path or [])
+    if backup_id is not None or database:
+        with BackupCatalog(catalog) as backups:
+            if backup_id is not None:
+                entry = backups.get(backup_id)
+            else:
+                entry = backups.latest(database)
+        if not entry:
+            typer.echo("Error: no such backup in the catalog.")
+            raise typer.Exit(code=1)
+        locations.extend(entry["locations"])
+    if not locations:
+        typer.echo("Error: pass --backup-path, --backup-id or --database.")
+        raise typer.Exit(code=1)
+
+    failed = 0
+    for location in locations:
+        try:
+            results = verify_backup(location, quick, audit, parallel)
+        except RuntimeError as e:
+            typer.echo(f"error    {location}: {e}")
+            failed += 1
+            continue
+        for result in results:
+            failed += result["status"] != "ok"
+            typer.echo(f"{result['status']:<8} {result['location']}: {result['detail']}")
+    if failed:
+        typer.echo(f"{failed} objects failed verification.")
+        raise typer.Exit(code=1)
+    typer.echo("All objects verified.")
+
+
+@app.command()
+def restore_test(
+    backup_path: str = typer.Option(
+        None,
+        help="Backup to test (file, directory or cloud location); the latest cataloged backup of every database if omitted",
+    ),
+    db_type: str = typer.Option(
+        None, help="Database type (postgres, mongo); required with --backup-path, a filter otherwise"
+    ),
+    database: str = typer.Option(
+        None, help="Name of the backed-up database; required with --backup-path, a filter otherwise"
+    ),
+    parallel: int = typer.Option(2, help="Restore tests running at once"),
+    jobs: int = typer.Option(None, help="Parallel restore jobs of each test"),
+    tolerance: float = typer.Option(
+        0.0, help="Allowed relative difference of row and document counts, e.g. 0.01"
+    ),
+    bin_dir: str = typer.Option(
+        None, help="Directory holding initdb and pg_ctl, or mongod"
+    ),
+    report: str = typer.Option(None, help="Write the JSON report to this file"),
+    metrics_prom: str = typer.Option(
+        None,
+        help="Write the outcome and restore time of each test in Prometheus text format to this file",
+    ),
+    catalog: str = typer.Option(None, help="Catalog file (default: $BACKUP_CATALOG)"),
+):
+    """
+    Restore backups into throwaway local servers, check the restored row and
+    document counts against the manifest and report the restore time (RTO).
+    """
+    from database.restore_test import catalog_targets, run_restore_tests
+    from storage.catalog import BackupCatalog
+    from utils.metrics import write_restore_test_prometheus
+
+    if backup_path:
+        if not db_type or not database:
+            typer.echo("Error: --backup-path requires --db-type and --database.")
+            raise typer.Exit(code=1)
+        targets = [{"db_type": db_type, "database": database, "location": backup_path}]
+    else:
+        with BackupCatalog(catalog) as backups:
+            targets = catalog_targets(backups, database, db_type)
+        if not targets:
+            typer.echo("No cataloged backups to test.")
+            raise typer.Exit(code=1)
+    typer.echo(f"Testing {len(targets)} backups...")
+    results = run_restore_tests(targets, logger, parallel, jobs, tolerance, bin_dir)
+    if not backup_path:
+        with BackupCatalog(catalog) as backups:
+            for target, result in zip(targets, results):
+                backups.record_restore_test(target["backup_id"], result)
+
+    for result in results:
+        typer.echo(
+            f"{result['status']:<8} {result['host'] or 'local'}/{result['database']}: "
+            f"RTO {result['rto_seconds']}s, {result['checked']} counts checked, "
+            f"{result['error'] or result['location']}"
+        )
+        for mismatch in result["mismatches"]:
+            typer.echo(
+                f"         {mismatch['name']}: expected {mismatch['expected']}, "
+                f"restored {mismatch['actual']}"
+            )
+    failed = sum(result["status"] != "passed" for result in results)
+    typer.echo(f"{len(results) - failed} passed, {failed} failed.")
+    try:
+        if report:
+            with open(report, "w") as file:
+                json.dump(results, file, indent=2)
+            typer.echo(f"Report written to {report}")
+        if metrics_prom:
+            write_restore_test_prometheus(results, metrics_prom)
+    except OSError as e:
+        logger.error(f"Failed to write the restore test report: {e}")
+    if failed:
+        raise typer.Exit(code=1)
 
 
 @app.command()
-def schedule():
+def list_backups(
+    database: str = typer.Option(None, help="Only backups of this database"),
+    db_type: str = typer.Option(None, help="Only backups of this database type (postgres, mongo)"),
+    since: str = typer.Option(None, help="Only backups taken at or after this ISO date or time"),
+    until: str = typer.Option(None, help="Only backups taken before this ISO date or time"),
+    latest: bool = typer.Option(
+        False, help="Only the most recent backup before --until (requires --database)"
+    ),
+    pruned: bool = typer.Option(False, help="List pruned backups instead of available ones"),
+    catalog: str = typer.Option(None, help="Catalog file (default: $BACKUP_CATALOG)"),
+):
     """
-    Schedule automatic backups.
+    List cataloged backups, newest first, without listing any bucket.
     """
-    # TODO: Implement the schedule command
-    typer.echo("Backup schedule configured successfully.")
+    from storage.catalog import BackupCatalog
+
+    try:
+        with BackupCatalog(catalog) as backups:
+            if latest:
+                if not database:
+                    typer.echo("Error: --latest requires --database.")
+                    raise typer.Exit(code=1)
+                found = backups.latest(database, db_type, before=until)
+                entries = [found] if found else []
+            else:
+                entries = backups.find(
+                    database, db_type, since=since, until=until,
+                    status="pruned" if pruned else "available",
+                )
+    except ValueError as e:
+        typer.echo(f"Error: {e}")
+        raise typer.Exit(code=1)
+    for entry in entries:
+        size = "-" if entry["size"] is None else f"{entry['size']} bytes"
+        typer.echo(
+            f"#{entry['id']:<5} {entry['created']} {entry['db_type']:<8} "
+            f"{entry['host']}/{entry['database']} {entry['format']}, "
+            f"{entry['codec'] or 'uncompressed'}"
+            f"{', encrypted' if entry['encrypted'] else ''}, {size}"
+        )
+        for location in entry["locations"]:
+            typer.echo(f"       {location}")
+    typer.echo(f"{len(entries)} backups.")
+
+
+@app.command()
+def prune(
+    keep_last: int = typer.Option(None, help="Most recent backups of each database to keep"),
+    hourly: int = typer.Option(None, help="Hours to keep the newest backup of"),
+    daily: int = typer.Option(None, help="Days to keep the newest backup of"),
+    weekly: int = typer.Option(None, help="Weeks to keep the newest backup of"),
+    monthly: int = typer.Option(None, help="Months to keep the newest backup of"),
+    database: str = typer.Option(None, help="Only prune backups of this database"),
+    db_type: str = typer.Option(None, help="Only prune backups of this database type"),
+    dry_run: bool = typer.Option(False, help="Show what would be deleted without deleting"),
+    concurrency: int = typer.Option(32, help="Deletions running at once"),
+    catalog: str = typer.Option(None, help="Catalog file (default: $BACKUP_CATALOG)"),
+):
+    """
+    Delete cataloged backups that the retention policy no longer keeps.
+
+    The policy is the config's ``retention`` section, overridden by the options.
+    """
+    from storage.catalog import BackupCatalog
+    from storage.retention import RetentionPolicy, prune as prune_backups
+    from utils.config import load_config
+
+    try:
+        policy = RetentionPolicy.from_config(
+            load_config(),
+            keep_last=keep_last,
+            hourly=hourly,
+            daily=daily,
+            weekly=weekly,
+            monthly=monthly,
+        )
+    except (TypeError, ValueError) as e:
+        typer.echo(f"Invalid retention policy: {e}")
+        raise typer.Exit(code=1)
+    with BackupCatalog(catalog) as backups:
+        expired = prune_backups(
+            backups, policy, logger, database, db_type, dry_run, concurrency
+        )
+    failed = 0
+    for entry in expired:
+        errors = entry.get("errors", {})
+        failed += bool(errors)
+        status = "expired" if dry_run else "failed" if errors else "pruned"
+        typer.echo(
+            f"{status:<8} #{entry['id']} {entry['created']} "
+            f"{entry['host']}/{entry['database']}: {', '.join(entry['locations']) or '-'}"
+        )
+        for location, error in errors.items():
+            typer.echo(f"         {location}: {error}")
+    if dry_run:
+        typer.echo(f"{len(expired)} backups would be pruned.")
+    else:
+        typer.echo(f"{len(expired) - failed} backups pruned, {failed} failed.")
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def schedule(
+    jobs_file: str = typer.Option(
+        ..., help="JSON file listing the backup jobs and their cron schedules"
+    ),
+    poll_interval: int = typer.Option(
+        30, help="Maximum seconds between checks for due jobs"
+    ),
+):
+    """
+    Run the backup scheduler until interrupted.
+    """
+    try:
+        scheduler = Scheduler(jobs_file, logger)
+    except Exception as e:
+        typer.echo(f"Error loading jobs file: {e}")
+        raise typer.Exit(code=1)
+    scheduler.run(poll_interval=poll_interval)
+    typer.echo("Scheduler stopped.")
 
 
 @app.command()
 def test_connection(
     db_type: str = typer.Option(
-        ..., help="Database type (postgres, mongo)"
-    )
+        None, help="Database type (postgres, mongo); taken from --profile if omitted"
+    ),
+    profile: str = typer.Option(
+        None,
+        envvar="BACKUP_PROFILE",
+        help="Connection profile from the config's profiles section (default: $BACKUP_PROFILE)",
+    ),
 ):
     """
     Test the connection to the database.
     """
-    params = get_db_params(db_type)
+    db_type, profile = load_profile(profile, db_type)
+    params = get_db_params(db_type, profile=profile["connection"] if profile else None)
     try:
         db_handler = get_db_handler(db_type, **params)
         db_handler.connect(logger=logger)
@@ -1,10 +1,27 @@
-from database.postgres_handler import PostgresHandler
-from database.mongo_handler import MongoDBHandler
+from importlib import import_module
 
 class UnsupportedDBTypeError(Exception):
     """Custom exception for unsupported database types."""
     pass
 
+# Handlers are imported on first use, so a command that only touches one
+# database type does not load the drivers of the others.
+HANDLERS = {
+    "postgres": ("database.postgres_handler", "PostgresHandler"),
+    "mongo": ("database.mongo_handler", "MongoDBHandler"),
+}
+
+def register_handler(db_type, module, class_name):
+    """
+    Register a database handler class by module path.
+
+    Args:
+        db_type (str): The type of the database used on the command line.
+        module (str): Module defining the handler.
+        class_name (str): Name of the handler class in the module.
+    """
+    HANDLERS[db_type.lower()] = (module, class_name)
+
 def get_db_handler(db_type, **kwargs):
     """
     Factory function to return the appropriate database handler.
@@ -20,10 +37,8 @@ def get_db_handler(db_type, **kwargs):
         UnsupportedDBTypeError: If an unsupported database type is provided.
     """
     db_type = db_type.lower()
-    
-    if db_type == "postgres":
-        return PostgresHandler(**kwargs)
-    elif db_type == "mongo":
-        return MongoDBHandler(**kwargs)
-    else:
+
+    if db_type not in HANDLERS:
         raise UnsupportedDBTypeError(f"Unsupported database type: {db_type}")
+    module, class_name = HANDLERS[db_type]
+    return getattr(import_module(module), class_name)(**kwargs)
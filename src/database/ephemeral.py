@@ -0,0 +1,233 @@
+import getpass
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from database.db_factory import get_db_handler
+
+# Attempts at starting a server, each on a new random port, in case another
+# process takes the port between picking it and the server binding it.
+START_ATTEMPTS = 3
+# Seconds to wait for a server to accept connections.
+START_TIMEOUT = 60
+
+# Where distribution packages install the PostgreSQL server binaries, which
+# are usually not on the PATH.
+POSTGRES_BIN_GLOBS = ["/usr/lib/postgresql/*/bin", "/usr/pgsql-*/bin"]
+
+
+def free_port():
+    """
+    A TCP port on the loopback interface that is free right now.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _log_tail(path, size=2000):
+    try:
+        with open(path, errors="replace") as file:
+            return file.read()[-size:]
+    except OSError:
+        return "no log written"
+
+
+def find_binary(name, bin_dir=None, search=()):
+    """
+    Locate a server binary in ``bin_dir``, on the PATH or in the newest of
+    the ``search`` directories.
+
+    Raises:
+        FileNotFoundError: If the binary is not found.
+    """
+    directories = [bin_dir] if bin_dir else []
+    for pattern in search:
+        directories.extend(sorted(glob.glob(pattern), reverse=True))
+    candidates = [os.path.join(directory, name) for directory in directories]
+    if shutil.which(name):
+        candidates.insert(1 if bin_dir else 0, shutil.which(name))
+    for candidate in candidates:
+        if os.access(candidate, os.X_OK):
+            return candidate
+    raise FileNotFoundError(
+        f"{name} not found. Install the database server or pass its bin directory."
+    )
+
+
+class EphemeralPostgres:
+    """
+    A throwaway PostgreSQL cluster in a temporary data directory, listening
+    on a random loopback port with trust authentication and durability
+    turned off. Entering it yields a handler for a new, empty database
+    named ``database``; leaving it stops the server and removes the data.
+
+    Args:
+        database (str): Name of the database to create.
+        bin_dir (str, optional): Directory holding ``initdb`` and ``pg_ctl``.
+    """
+
+    def __init__(self, database, bin_dir=None):
+        self.database = database
+        self.initdb = find_binary("initdb", bin_dir, POSTGRES_BIN_GLOBS)
+        self.pg_ctl = find_binary("pg_ctl", bin_dir, POSTGRES_BIN_GLOBS)
+        self.user = getpass.getuser()
+        self.root = None
+        self.port = None
+
+    def __enter__(self):
+        self.root = tempfile.mkdtemp(prefix="restore-test-pg-")
+        data_dir = os.path.join(self.root, "data")
+        try:
+            subprocess.run(
+                [self.initdb, "-D", data_dir, "-U", self.user, "--auth=trust",
+                 "-E", "UTF8", "-N"],
+                check=True,
+                capture_output=True,
+            )
+            self._start(data_dir)
+            import psycopg2
+
+            connection = psycopg2.connect(
+                host="127.0.0.1", port=self.port, user=self.user, dbname="postgres"
+            )
+            try:
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'CREATE DATABASE "{}"'.format(self.database.replace('"', '""'))
+                    )
+            finally:
+                connection.close()
+        except subprocess.CalledProcessError as e:
+            self.__exit__(None, None, None)
+            raise RuntimeError(
+                f"Failed to start a PostgreSQL server: {e.stderr.decode(errors='replace')}"
+            )
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return get_db_handler(
+            "postgres", host="127.0.0.1", user=self.user, password="",
+            database=self.database, port=self.port,
+        )
+
+    def _start(self, data_dir):
+        log_file = os.path.join(self.root, "server.log")
+        for attempt in range(START_ATTEMPTS):
+            self.port = free_port()
+            options = (
+                f"-p {self.port} -k {self.root} -c listen_addresses=127.0.0.1 "
+                "-c fsync=off -c synchronous_commit=off -c full_page_writes=off"
+            )
+            result = subprocess.run(
+                [self.pg_ctl, "-D", data_dir, "-l", log_file, "-w",
+                 "-t", str(START_TIMEOUT), "-o", options, "start"],
+                capture_output=True,
+            )
+            if result.returncode == 0:
+                return
+        raise RuntimeError(f"PostgreSQL did not start: {_log_tail(log_file)}")
+
+    def __exit__(self, exc_type, exc, tb):
+        data_dir = os.path.join(self.root, "data")
+        if os.path.exists(os.path.join(data_dir, "postmaster.pid")):
+            subprocess.run(
+                [self.pg_ctl, "-D", data_dir, "-m", "immediate", "stop"],
+                capture_output=True,
+            )
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class EphemeralMongo:
+    """
+    A throwaway ``mongod`` in a temporary data directory, listening on a
+    random loopback port without authentication. Entering it yields a
+    handler for ``database``; leaving it stops the server and removes the
+    data.
+
+    Args:
+        database (str): Name of the database the handler uses.
+        bin_dir (str, optional): Directory holding ``mongod``.
+    """
+
+    def __init__(self, database, bin_dir=None):
+        self.database = database
+        self.mongod = find_binary("mongod", bin_dir)
+        self.root = None
+        self.process = None
+
+    def __enter__(self):
+        self.root = tempfile.mkdtemp(prefix="restore-test-mongo-")
+        try:
+            handler = self._start()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return handler
+
+    def _start(self):
+        from pymongo import MongoClient
+        from pymongo.errors import PyMongoError
+
+        log_file = os.path.join(self.root, "mongod.log")
+        for attempt in range(START_ATTEMPTS):
+            port = free_port()
+            self.process = subprocess.Popen(
+                [self.mongod, "--dbpath", self.root, "--port", str(port),
+                 "--bind_ip", "127.0.0.1", "--logpath", log_file, "--nounixsocket"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            deadline = time.monotonic() + START_TIMEOUT
+            while self.process.poll() is None and time.monotonic() < deadline:
+                client = MongoClient("127.0.0.1", port, serverSelectionTimeoutMS=500)
+                try:
+                    client.admin.command("ping")
+                    break
+                except PyMongoError:
+                    time.sleep(0.2)
+                finally:
+                    client.close()
+            else:
+                self._stop()
+                continue
+            return get_db_handler(
+                "mongo", host="127.0.0.1", port=port, database=self.database
+            )
+        raise RuntimeError(f"mongod did not start: {_log_tail(log_file)}")
+
+    def _stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+# Ephemeral server for each database type.
+EPHEMERAL_SERVERS = {
+    "postgres": EphemeralPostgres,
+    "mongo": EphemeralMongo,
+}
+
+
+def ephemeral_server(db_type, database, bin_dir=None):
+    """
+    A throwaway local server of ``db_type``, to be used as a context manager.
+
+    Raises:
+        ValueError: If the database type has no ephemeral server.
+    """
+    if db_type not in EPHEMERAL_SERVERS:
+        raise ValueError(f"No ephemeral server for database type: {db_type}")
+    return EPHEMERAL_SERVERS[db_type](database, bin_dir)
@@ -0,0 +1,244 @@
+import itertools
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from database.db_factory import get_db_handler
+from utils.metrics import RunMetrics, path_size
+
+BACKUP_DEFAULTS = {
+    "compress": True,
+    "encrypt": True,
+    "storage": "local",
+    "notify_slack": False,
+    "slack_webhook_url": None,
+}
+DEFAULT_PATHS = {
+    "postgres": os.path.join("backups", "{database}-{timestamp}.dump"),
+    "mongo": os.path.join("backups", "{database}-{timestamp}"),
+}
+
+
+def backup_options(options, now=None, database=None):
+    """
+    Fill in the handler's required backup arguments and expand the
+    ``{timestamp}`` and ``{database}`` placeholders in ``path``, so repeated
+    runs and several databases sharing one setting write to new files. Only
+    ``{database}`` is expanded in ``metrics_json`` and ``metrics_prom``: the
+    Prometheus textfile collector expects one file per job, replaced on
+    every run.
+
+    Args:
+        options (dict): Keyword arguments for the handler's ``backup``.
+        now (datetime, optional): Time used for the placeholder.
+        database (str, optional): Database name used for the placeholder.
+
+    Returns:
+        dict: The complete keyword arguments.
+    """
+    now = now or datetime.now()
+    options = dict(BACKUP_DEFAULTS, **options)
+    if "path" in options:
+        options["path"] = options["path"].format(
+            timestamp=now.strftime("%Y%m%dT%H%M%S"), database=database or ""
+        )
+    for key in ("metrics_json", "metrics_prom"):
+        if options.get(key):
+            options[key] = options[key].format(database=database or "")
+    return options
+
+
+def run_backup_job(db_type, connection, options, logger):
+    """
+    Connect to a database, take one backup and close the connection.
+
+    Args:
+        db_type (str): The type of the database (postgres, mongo).
+        connection (dict): Connection parameters for the handler.
+        options (dict): Keyword arguments for the handler's ``backup``, plus
+            optional ``metrics_json`` and ``metrics_prom`` files receiving
+            the run's per-stage metrics and a ``catalog`` file recording
+            the backup.
+        logger: Logger instance for logging.
+
+    Returns:
+        str: Location of the stored backup.
+    """
+    options = backup_options(options, database=connection.get("database"))
+    metrics_json = options.pop("metrics_json", None)
+    metrics_prom = options.pop("metrics_prom", None)
+    catalog = options.pop("catalog", None)
+    metrics = RunMetrics(
+        "backup", {"db_type": db_type, "database": connection.get("database")}
+    )
+    try:
+        handler = get_db_handler(db_type, **connection)
+        handler.connect(logger=logger)
+        try:
+            if os.path.dirname(options.get("path", "")):
+                os.makedirs(os.path.dirname(options["path"]), exist_ok=True)
+            location = handler.backup(logger=logger, metrics=metrics, **options)
+        finally:
+            handler.close(logger=logger)
+        metrics.finish("success", location)
+        catalog_backup(db_type, connection, options, location, logger, metrics, catalog)
+        return location
+    except Exception:
+        metrics.finish("failed")
+        raise
+    finally:
+        logger.info(f"Backup stages of {connection.get('database')}: {metrics.summary()}")
+        if metrics_json:
+            metrics.write_json(metrics_json)
+        if metrics_prom:
+            metrics.write_prometheus(metrics_prom)
+
+
+def catalog_backup(db_type, connection, options, location, logger, metrics=None, catalog=None):
+    """
+    Record a finished backup in the catalog. The backup itself succeeded,
+    so a failure to record it is logged rather than raised.
+    """
+    from storage.catalog import record_backup
+
+    try:
+        backup_id = record_backup(db_type, connection, options, location, metrics, catalog)
+        logger.info(f"Backup of {connection.get('database')} cataloged as #{backup_id}")
+    except Exception as e:
+        logger.error(f"Failed to record the backup in the catalog: {e}")
+
+
+def discover_databases(db_type, connection, logger):
+    """
+    List the databases on a server.
+
+    Args:
+        db_type (str): The type of the database (postgres, mongo).
+        connection (dict): Connection parameters; the database is ignored.
+        logger: Logger instance for logging.
+
+    Returns:
+        list: Database names.
+    """
+    connection = dict(connection)
+    # PostgreSQL needs a database to connect to; the maintenance one always exists.
+    connection["database"] = "postgres" if db_type == "postgres" else None
+    handler = get_db_handler(db_type, **connection)
+    handler.connect(logger=logger)
+    try:
+        return handler.list_databases()
+    finally:
+        handler.close(logger=logger)
+
+
+def expand_inventory(inventory, logger):
+    """
+    Turn an inventory into one backup target per database.
+
+    Each server entry has ``db_type``, ``connection`` and optional ``backup``
+    options, which override the inventory's ``defaults``. An entry either
+    names one database in ``connection``, lists several in ``databases``, or
+    sets ``databases`` to ``"all"`` to back up every database on the server.
+
+    Args:
+        inventory (dict): The parsed inventory.
+        logger: Logger instance for logging.
+
+    Returns:
+        list: Targets as dicts with ``db_type``, ``connection`` and ``backup``.
+    """
+    defaults = inventory.get("defaults", {})
+    targets = []
+    for entry in inventory["servers"]:
+        db_type = entry["db_type"]
+        connection = entry["connection"]
+        options = dict(defaults, **entry.get("backup", {}))
+        options.setdefault("path", DEFAULT_PATHS[db_type])
+
+        databases = entry.get("databases")
+        if databases == "all":
+            databases = discover_databases(db_type, connection, logger)
+            logger.info(
+                f"Found {len(databases)} databases on {connection.get('host')}"
+            )
+        elif databases is None:
+            databases = [connection["database"]]
+        for database in databases:
+            targets.append(
+                {
+                    "db_type": db_type,
+                    "connection": dict(connection, database=database),
+                    "backup": options,
+                }
+            )
+    return targets
+
+
+def _backup_size(location):
+    if isinstance(location, list):
+        # Fanned out to several destinations: the size of the first local copy.
+        location = next((item for item in location if os.path.exists(item)), None)
+    if not location or not os.path.exists(location):
+        return None
+    return path_size(location)
+
+
+def run_backup_batch(targets, logger, parallel=4, max_per_host=1):
+    """
+    Back up many databases concurrently.
+
+    Targets are interleaved across hosts so that workers rarely wait for a
+    busy host, and at most ``max_per_host`` dumps run against one host.
+
+    Args:
+        targets (list): Targets from ``expand_inventory``.
+        logger: Logger instance for logging.
+        parallel (int): Number of backups running at once.
+        max_per_host (int): Number of backups running against one host.
+
+    Returns:
+        list: One report entry per target, in input order, with the
+        database, status, duration in seconds, size in bytes (local backups
+        only), location and error.
+    """
+    by_host = defaultdict(list)
+    for index, target in enumerate(targets):
+        by_host[target["connection"].get("host")].append(index)
+    # Round-robin over hosts: a, b, c, a, b, c, ...
+    order = [
+        index
+        for group in itertools.zip_longest(*by_host.values())
+        for index in group
+        if index is not None
+    ]
+    host_slots = {host: threading.BoundedSemaphore(max_per_host) for host in by_host}
+
+    def run(index):
+        target = targets[index]
+        connection = target["connection"]
+        entry = {
+            "db_type": target["db_type"],
+            "host": connection.get("host"),
+            "database": connection.get("database"),
+        }
+        with host_slots[connection.get("host")]:
+            started = time.monotonic()
+            try:
+                location = run_backup_job(
+                    target["db_type"], connection, target["backup"], logger
+                )
+                entry.update(status="success", location=location, error=None)
+            except Exception as e:
+                logger.error(f"Backup of {entry['database']} failed: {e}")
+                entry.update(status="failed", location=None, error=str(e))
+            entry["seconds"] = round(time.monotonic() - started, 3)
+        entry["bytes"] = _backup_size(entry["location"])
+        return index, entry
+
+    report = [None] * len(targets)
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        for index, entry in executor.map(run, order):
+            report[index] = entry
+    return report
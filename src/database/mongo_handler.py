@@ -1,13 +1,64 @@
 from pymongo import MongoClient
 import subprocess
 import shutil
-from utils.compression import compress_backup_tar_folder, decompress_backup_tar_folder
-from storage.local_storage import store_locally
-from storage.azure_storage import store_on_azure
-from storage.s3_storage import store_on_s3
-from storage.gcp_storage import store_on_gcp
+import os
+import json
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from utils.compression import (
+    compress_backup_tar_folder,
+    compress_stream,
+    extract_tar_stream,
+    get_codec,
+    is_tar_header,
+)
+from storage.backend import get_backend, upload_files
+from storage.fanout import Destination, fan_out, written_locations
+from storage.manifest import checksums_for, save_stream_manifest, write_backup_manifest
+from storage.providers import get_provider, open_location, parse_location
+from storage.container import CONTAINER_EXTENSION, ContainerReader, is_container, pack_container
+from storage.repository import ChunkRepository, is_snapshot, read_snapshot
+from database.object_backup import dump_objects, index_location, read_index, select_objects
 from utils.notification import send_slack_notification
-from utils.encryption import encrypt_file, decrypt_file
+from utils.checksums import Checksums
+from utils.encryption import encrypt_file, encrypt_stream
+from utils.metrics import Meter, RunMetrics, path_size
+from utils.packing import pack_file, unpack_file, unpack_stream
+from utils.pipeline import feed_command, peek, stream_command_output, write_stream
+from utils.throttle import Throttle, job_throttle, process_priority
+from database.mongo_oplog import (
+    CATALOG_FILE,
+    OplogCatalog,
+    combine_segments,
+    latest_oplog_ts,
+    to_timestamp,
+    write_oplog_segments,
+)
+
+# Database the users of mongodump and mongorestore authenticate against,
+# as for MongoClient.
+AUTH_SOURCE = "admin"
+
+# First bytes of a ``mongodump --archive`` stream.
+ARCHIVE_MAGIC = b"\x6d\xe2\x99\x81"
+
+
+def _find_dump_dir(root, database):
+    """
+    Find the directory holding a database's ``.bson`` files in an extracted
+    ``mongodump`` output directory.
+    """
+    for current, dirs, files in os.walk(root):
+        if os.path.basename(current) == database and any(
+            name.endswith(".bson") for name in files
+        ):
+            return current
+    for current, dirs, files in os.walk(root):
+        if any(name.endswith(".bson") for name in files):
+            return current
+    raise FileNotFoundError("No .bson files found in the backup.")
 
 
 class MongoDBHandler:
@@ -24,12 +75,18 @@ class MongoDBHandler:
         """
         self.client = None
         self.database = database
+        # Command prefix lowering the priority of the dump processes.
+        self.priority = []
         self.config = {
             "host": host,
             "port": port,
             "username": user,
             "password": password,
         }
+        # Removes the --config file of the tools; see _tool_args.
+        self._tool_config = None
+        self._tool_config_path = None
+        self._tool_lock = threading.Lock()
 
     def connect(self, logger):
         """
@@ -60,11 +117,114 @@ class MongoDBHandler:
         except Exception as e:
             raise ConnectionError(f"MongoDB connection failed: {e}")
 
+    def _tool_args(self):
+        """
+        Connection and authentication arguments of mongodump and
+        mongorestore. The password is passed in a private ``--config`` YAML
+        file, written once per handler, so it does not show in the process
+        list.
+        """
+        args = ["--host", self.config["host"], "--port", str(self.config["port"])]
+        if not self.config["username"]:
+            return args
+        args += [
+            "--username",
+            self.config["username"],
+            "--authenticationDatabase",
+            AUTH_SOURCE,
+        ]
+        if self.config["password"]:
+            with self._tool_lock:
+                if self._tool_config is None:
+                    # mkstemp creates the file readable by its owner only.
+                    descriptor, path = tempfile.mkstemp(prefix="mongo-tools-", suffix=".yaml")
+                    with os.fdopen(descriptor, "w") as file:
+                        # A JSON string is a valid double-quoted YAML scalar.
+                        file.write(f"password: {json.dumps(self.config['password'])}\n")
+                    self._tool_config = weakref.finalize(self, os.remove, path)
+                    self._tool_config_path = path
+            args.append(f"--config={self._tool_config_path}")
+        return args
+
     def close(self, logger):
+        with self._tool_lock:
+            if self._tool_config is not None:
+                self._tool_config()
+                self._tool_config = None
         if self.client:
             self.client.close()
             logger.info("MongoDB connection closed.")
 
+    def list_databases(self):
+        """
+        List the user databases on the server.
+
+        Returns:
+            list: Database names, excluding admin, config and local.
+        """
+        return sorted(
+            name
+            for name in self.client.list_database_names()
+            if name not in ("admin", "config", "local")
+        )
+
+    def _collection_names(self):
+        """
+        Names of the database's collections, without views and ``system.*``
+        collections.
+        """
+        return sorted(
+            info["name"]
+            for info in self.client[self.database].list_collections(
+                filter={"type": "collection"}
+            )
+            if not info["name"].startswith("system.")
+        )
+
+    def _select_collections(self, include=None, exclude=None, names=None):
+        """
+        Names of the database's collections matching the filters, out of
+        ``names`` if given.
+        """
+        if names is None:
+            names = sorted(self.client[self.database].list_collection_names())
+        selected = select_objects(names, include, exclude)
+        if not selected:
+            raise ValueError("No collections match the filters.")
+        return selected
+
+    def _filter_args(self, include=None, exclude=None):
+        """
+        mongodump arguments leaving out the collections not selected by the
+        filters; mongodump itself only accepts exact names.
+        """
+        if not include and not exclude:
+            return []
+        selected = set(self._select_collections(include, exclude))
+        args = []
+        for name in sorted(self.client[self.database].list_collection_names()):
+            if name not in selected:
+                args.append(f"--excludeCollection={name}")
+        return args
+
+    def object_counts(self, include=None, exclude=None):
+        """
+        Count the documents of each collection from the collection metadata,
+        without scanning them. Views and ``system.*`` collections are skipped.
+
+        Args:
+            include (list, optional): Only count collections matching these patterns.
+            exclude (list, optional): Skip collections matching these patterns.
+
+        Returns:
+            dict: Document count of each collection, by name.
+        """
+        database = self.client[self.database]
+        return {
+            name: database[name].estimated_document_count()
+            for name in select_objects(self._collection_names(), include, exclude)
+        }
+
     def backup(
         self,
         compress,
@@ -77,17 +237,83 @@ class MongoDBHandler:
         provider=None,
         bucket=None,
         encrypted_file=None,
+        stream=False,
+        codec="gzip",
+        level=None,
+        threads=None,
+        mode="full",
+        repository=None,
+        dump_format=None,
+        jobs=None,
+        include=None,
+        exclude=None,
+        container=False,
+        metrics=None,
+        destinations=None,
+        record_counts=False,
+        rate_limit=None,
+        nice=None,
+        ionice=None,
     ):
         """
         Perform a backup of the MongoDB database.
 
         Args:
             compress (bool): Whether to compress the backup file.
-            storage (str): Storage type ('local' or 'cloud').
+            storage (str): Storage type ('local', 'cloud' or 'repository').
             path (str): Path to save the backup file.
             provider (str, optional): Cloud provider ('aws', 'gcp', 'azure'). Required for cloud storage.
             bucket (str, optional): Cloud bucket name. Required for cloud storage.
+            stream (bool): Pipe a mongodump archive through compression,
+                encryption and upload without writing intermediate files.
+            codec (str): Compression codec (gzip, zstd, lz4, xz).
+            level (int, optional): Compression level; the codec default if None.
+            threads (int, optional): Compression threads; the CPU count if None.
+            mode (str): 'full' for a mongodump, or 'incremental' to copy the
+                oplog since the previous run into the ``path`` archive
+                directory, taking a base dump first if the archive has none.
+            repository (str, optional): Directory of the deduplicating
+                repository. Required for repository storage, which always
+                streams a mongodump archive; with ``provider`` and ``bucket``
+                its chunks are kept in the cloud.
+            dump_format (str, optional): 'objects' to dump every collection
+                into its own compressed and encrypted archive in the ``path``
+                directory, indexed so that single collections can be restored;
+                'archive' to stream one ``mongodump --archive`` through
+                compression and encryption, as ``stream`` does, without the
+                dump directory and tarball.
+            jobs (int, optional): Collections dumped at once in the objects
+                format, and by mongodump into a streamed archive; the CPU
+                count if None.
+            include (list, optional): Only back up collections matching these
+                patterns.
+            exclude (list, optional): Skip collections matching these patterns.
+            container (bool): Pack the dump directory into a seekable
+                ``.dbk`` container of separately compressed and encrypted
+                frames instead of an encrypted tarball.
+            metrics (RunMetrics, optional): Collects per-stage metrics of
+                the run.
+            destinations (list, optional): Write the streamed backup to all
+                of these at once instead of ``storage``: local directories
+                (``local:/dir``) and cloud locations (``s3://bucket/prefix``,
+                ``gs://``, ``az://``). The dump is taken, compressed and
+                encrypted once. Returns the list of written locations.
+            record_counts (bool): Keep the document count of each collection
+                in the sidecar manifest, for ``restore-test`` to check
+                restores against.
+            rate_limit (str or float, optional): Bytes per second for the
+                streamed backup and uploads of this run, e.g. ``20MB``; the
+                config's ``throttle.job_rate`` schedule if None. Streams are
+                paced before they are written, so mongodump slows down too.
+                The config's ``throttle.global_rate`` applies on top.
+            nice (int, optional): Niceness of the mongodump processes; the
+                config's ``throttle.nice`` if None.
+            ionice (str, optional): I/O class of the mongodump processes
+                (``idle``, ``best-effort:7``); the config's ``throttle.ionice``
+                if None.
         """
+        metrics = metrics or RunMetrics("backup")
+        throttle_token = None
         try:
             logger.info("Starting backup...")
             # Ensure pg_dump is available
@@ -96,42 +322,184 @@ class MongoDBHandler:
                     "mongodump command not found. Ensure it is installed and in your PATH."
                 )
 
+            if (include or exclude) and mode != "full":
+                raise ValueError("Collection filters apply to full backups only.")
+            if container and (
+                mode != "full" or dump_format or stream or storage == "repository"
+            ):
+                raise ValueError(
+                    "The container format applies to full, non-streamed mongodump backups."
+                )
+            if destinations and (
+                mode != "full"
+                or dump_format not in (None, "archive")
+                or container
+                or storage == "repository"
+            ):
+                raise ValueError(
+                    "Multiple destinations apply to full, streamed backups."
+                )
+            if record_counts and (mode != "full" or storage == "repository"):
+                raise ValueError(
+                    "Object counts are recorded for full, non-repository backups only."
+                )
+            if dump_format not in (None, "archive", "objects"):
+                raise ValueError(
+                    "Unsupported dump format. Choose 'objects', 'archive' or none."
+                )
+            destinations = [Destination(spec) for spec in destinations or []]
+            self.priority = process_priority(nice, ionice)
+            throttle = job_throttle(rate_limit)
+            # File uploads of this run pick the throttle up from the context.
+            throttle_token = throttle.activate()
+            if storage == "repository":
+                if mode != "full" or dump_format == "objects":
+                    raise ValueError("Repository storage supports full backups only.")
+                if not repository:
+                    raise ValueError("A repository path is required for repository storage.")
+                # Chunks are compressed and encrypted individually by the repository.
+                repository = ChunkRepository(
+                    repository, provider, bucket, codec, level, encrypt, threads
+                )
+
+            if mode == "incremental":
+                new_files = self._backup_incremental(
+                    compress, encrypt, path, logger, codec, level, threads
+                )
+                if storage == "cloud":
+                    if not provider or not bucket:
+                        raise ValueError(
+                            "Cloud provider and bucket name are required for cloud storage."
+                        )
+                    prefix = os.path.basename(os.path.normpath(path))
+                    self._upload_files(
+                        [(os.path.join(path, name), f"{prefix}/{name}") for name in new_files],
+                        provider,
+                        bucket,
+                        logger,
+                    )
+                elif storage != "local":
+                    raise ValueError("Unsupported storage type. Choose 'local' or 'cloud'.")
+                if notify_slack and slack_webhook_url:
+                    send_slack_notification(
+                        slack_webhook_url, f"Incremental backup successful: {path}"
+                    )
+                return path
+            if mode != "full":
+                raise ValueError("Unsupported backup mode. Choose 'full' or 'incremental'.")
+            counts = None
+            if record_counts:
+                with metrics.stage("count"):
+                    counts = self.object_counts(include, exclude)
+                logger.info(f"Counted the documents of {len(counts)} collections")
+
+            if dump_format == "objects":
+                backup_dir = self._backup_objects(
+                    compress, encrypt, path, logger, jobs, codec, level, include, exclude,
+                    metrics,
+                )
+                self._handle_storage(
+                    backup_dir, storage, provider, bucket, logger, metrics=metrics,
+                    counts=counts,
+                )
+                if notify_slack and slack_webhook_url:
+                    send_slack_notification(
+                        slack_webhook_url, f"Backup successful: {backup_dir}"
+                    )
+                return backup_dir
+
+            if destinations or stream or dump_format == "archive" or storage == "repository":
+                backup_file = self._backup_stream(
+                    compress,
+                    encrypt,
+                    storage,
+                    path,
+                    provider,
+                    bucket,
+                    logger,
+                    codec=codec,
+                    level=level,
+                    threads=threads,
+                    repository=repository,
+                    include=include,
+                    exclude=exclude,
+                    metrics=metrics,
+                    destinations=destinations,
+                    counts=counts,
+                    throttle=throttle,
+                    jobs=jobs,
+                )
+                if notify_slack and slack_webhook_url:
+                    send_slack_notification(
+                        slack_webhook_url, f"Backup successful: {backup_file}"
+                    )
+                return backup_file
+
             # Construct the mongodump command
-            command = [
-                "mongodump",
-                "--host",
-                self.config["host"],
+            command = ["mongodump"] + self._tool_args() + [
                 "--db",
                 self.database,
-                "--port",
-                str(self.config["port"]),
                 "--out",
                 path,
-            ]
+            ] + self._filter_args(include, exclude)
 
-            subprocess.run(command, check=True)
+            with metrics.stage("dump") as stage:
+                subprocess.run(self.priority + command, check=True)
+                stage.bytes_out = path_size(path)
             logger.info(f"Backup successful. Files saved to {path}")
 
+            if container:
+                with metrics.stage("pack", path_size(path)) as stage:
+                    backup_file = pack_container(
+                        path,
+                        f"{os.path.normpath(path)}{CONTAINER_EXTENSION}",
+                        codec if compress else None,
+                        level,
+                        encrypt,
+                        threads,
+                    )
+                    stage.bytes_out = os.path.getsize(backup_file)
+                shutil.rmtree(path)
+                logger.info(f"Backup packed into {backup_file}")
+                self._handle_storage(
+                    backup_file, storage, provider, bucket, logger, metrics=metrics,
+                    counts=counts,
+                )
+                if notify_slack and slack_webhook_url:
+                    send_slack_notification(slack_webhook_url, f"Backup successful: {backup_file}")
+                return backup_file
+
             # Handle compression if enabled
             backup_file = path
 
             if compress:
-                backup_file = compress_backup_tar_folder(
-                    path, f"{path}/{self.database}.tar.gz"
-                )
+                with metrics.stage("compress", path_size(path)) as stage:
+                    backup_file = compress_backup_tar_folder(
+                        path,
+                        f"{path}/{self.database}.tar{get_codec(codec).extension}",
+                        codec,
+                        level,
+                        threads,
+                    )
+                    stage.bytes_out = os.path.getsize(backup_file)
 
             # Encrypt the backup file
             if encrypt:
-                encrypted_file = encrypt_file(backup_file)
+                with metrics.stage("encrypt", path_size(backup_file)) as stage:
+                    encrypted_file = encrypt_file(backup_file)
+                    stage.bytes_out = path_size(encrypted_file)
             logger.info(f"Encrypted file saved to {encrypted_file}")
 
             # Handle storage
-            self._handle_storage(encrypted_file, storage, provider, bucket, logger)
+            self._handle_storage(
+                encrypted_file, storage, provider, bucket, logger, metrics=metrics,
+                counts=counts,
+            )
 
             # Notify Slack
             if notify_slack and slack_webhook_url:
                 send_slack_notification(slack_webhook_url, f"Backup successful: {path}")
-            return backup_file
+            return encrypted_file
 
         except subprocess.CalledProcessError as e:
 
@@ -143,29 +511,317 @@ class MongoDBHandler:
         except Exception as e:
             logger.error(f"An error occurred during backup: {e}")
             raise RuntimeError(f"An error occurred during backup: {e}")
+        finally:
+            if throttle_token:
+                Throttle.deactivate(throttle_token)
+
+    def _backup_stream(
+        self,
+        compress,
+        encrypt,
+        storage,
+        path,
+        provider,
+        bucket,
+        logger,
+        codec="gzip",
+        level=None,
+        threads=None,
+        repository=None,
+        include=None,
+        exclude=None,
+        metrics=None,
+        destinations=None,
+        counts=None,
+        throttle=None,
+        jobs=None,
+    ):
+        """
+        Stream a mongodump archive through the compress/encrypt stages to storage.
 
-    def _handle_storage(self, file_path, storage, provider, bucket, logger):
+        Args:
+            compress (bool): Whether to compress the stream.
+            encrypt (bool): Whether to encrypt the stream.
+            storage (str): Storage type ('local', 'cloud' or 'repository').
+            path (str): Directory to save the backup in for local storage.
+            provider (str, optional): Cloud provider ('aws', 'gcp', 'azure').
+            bucket (str, optional): Cloud bucket name.
+            codec (str): Compression codec (gzip, zstd, lz4, xz).
+            level (int, optional): Compression level.
+            threads (int, optional): Compression threads.
+            repository (ChunkRepository, optional): Repository receiving the
+                uncompressed archive for repository storage.
+            include (list, optional): Only dump collections matching these patterns.
+            exclude (list, optional): Skip collections matching these patterns.
+            metrics (RunMetrics, optional): Collects per-stage metrics.
+            destinations (list, optional): ``Destination`` objects the stream is teed
+                to instead of ``storage``.
+            counts (dict, optional): Document counts of the collections for
+                the manifest.
+            throttle (Throttle, optional): Paces the stored stream.
+            jobs (int, optional): Collections mongodump reads at once and
+                interleaves into the archive; the CPU count if None.
+
+        Returns:
+            str: Location of the stored backup, or a list of locations with
+            ``destinations``.
+        """
+        metrics = metrics or RunMetrics("backup")
+        command = ["mongodump"] + self._tool_args() + [
+            "--db",
+            self.database,
+            "--archive",
+            "--numParallelCollections",
+            str(jobs or os.cpu_count() or 1),
+        ] + self._filter_args(include, exclude)
+
+        chunks = metrics.meter("dump", stream_command_output(self.priority + command))
+        file_name = f"{self.database}.archive"
+        if storage == "repository":
+            with metrics.sink("store", chunks):
+                snapshot = repository.store(chunks, file_name, logger)
+            repository.close()
+            return snapshot
+        # Hashed inline: the dump before compression and encryption, and the
+        # stored stream for the sidecar manifest.
+        content = Checksums()
+        chunks = metrics.meter("hash", content.wrap(chunks), upstream=chunks)
+        if compress:
+            chunks = metrics.meter("compress", compress_stream(chunks, codec, level, threads))
+            file_name = f"{file_name}{get_codec(codec).extension}"
+        if encrypt:
+            chunks = metrics.meter("encrypt", encrypt_stream(chunks))
+            file_name = f"{file_name}.enc"
+        if throttle:
+            # Back-pressure through the pipe slows mongodump down as well.
+            chunks = metrics.meter("throttle", throttle.wrap(chunks), upstream=chunks)
+
+        if destinations:
+            providers = [item.provider.name for item in destinations if item.provider]
+        else:
+            providers = [provider] if storage == "cloud" and provider else []
+        stored = checksums_for(*providers)
+        chunks = metrics.meter("hash", stored.wrap(chunks), upstream=chunks)
+
+        if destinations:
+            with metrics.sink("upload", chunks):
+                report = fan_out(
+                    chunks,
+                    destinations,
+                    file_name,
+                    logger,
+                )
+            written = [entry["location"] for entry in report if entry["status"] == "success"]
+            save_stream_manifest(stored, content, file_name, written, logger, counts)
+            return written_locations(report)
+        if storage == "local":
+            os.makedirs(path, exist_ok=True)
+            backup_file = os.path.join(path, file_name)
+            with metrics.sink("store", chunks):
+                size = write_stream(chunks, backup_file)
+            logger.info(f"Backup streamed to {backup_file} ({size} bytes)")
+            save_stream_manifest(stored, content, file_name, [backup_file], logger, counts)
+            return backup_file
+        if storage == "cloud":
+            if not provider or not bucket:
+                raise ValueError(
+                    "Cloud provider and bucket name are required for cloud storage."
+                )
+            with metrics.sink("upload", chunks):
+                self._stream_to_cloud(chunks, file_name, provider, bucket, logger)
+            location = f"{provider}://{bucket}/{file_name}"
+            save_stream_manifest(stored, content, file_name, [location], logger, counts)
+            return location
+        raise ValueError(
+            "Unsupported storage type. Choose 'local', 'cloud' or 'repository'."
+        )
+
+    def _backup_objects(
+        self,
+        compress,
+        encrypt,
+        path,
+        logger,
+        jobs=None,
+        codec="gzip",
+        level=None,
+        include=None,
+        exclude=None,
+        metrics=None,
+    ):
+        """
+        Dump every collection into its own archive member with concurrent
+        mongodump processes. Views and ``system.*`` collections are skipped.
+
+        Args:
+            compress (bool): Whether to compress each member.
+            encrypt (bool): Whether to encrypt each member.
+            path (str): Directory to create for the backup.
+            jobs (int, optional): Collections dumped at once; the CPU count if None.
+            codec (str): Compression codec (gzip, zstd, lz4, xz).
+            level (int, optional): Compression level.
+            include (list, optional): Only dump collections matching these patterns.
+            exclude (list, optional): Skip collections matching these patterns.
+            metrics (RunMetrics, optional): Collects per-stage metrics.
+
+        Returns:
+            str: The backup directory.
+        """
+        database = self.client[self.database]
+        # Largest first so the longest dumps start early and workers finish together.
+        sizes = {
+            name: database.command("collStats", name).get("storageSize", 0)
+            for name in self._select_collections(
+                include, exclude, names=self._collection_names()
+            )
+        }
+        collections = sorted(sizes, key=sizes.get, reverse=True)
+
+        def dump(name, kind):
+            command = ["mongodump"] + self._tool_args() + [
+                "--db",
+                self.database,
+                "--collection",
+                name,
+                "--archive",
+            ]
+            return stream_command_output(self.priority + command)
+
+        return dump_objects(
+            path,
+            [(name, "collection", ".archive") for name in collections],
+            dump,
+            compress,
+            encrypt,
+            logger,
+            codec,
+            level,
+            jobs,
+            metadata={"db_type": "mongo", "database": self.database},
+            metrics=metrics,
+        )
+
+    def _backup_incremental(
+        self, compress, encrypt, path, logger, codec="gzip", level=None, threads=None
+    ):
+        """
+        Copy the oplog written since the previous run into an archive directory.
+
+        The first run takes a base ``mongodump --archive`` and records the
+        oplog position from just before it. Later runs copy the database's
+        oplog entries since the recorded position into BSON segments.
+
+        Args:
+            compress (bool): Whether to compress the archived files.
+            encrypt (bool): Whether to encrypt the archived files.
+            path (str): Archive directory holding the catalog.
+            codec (str): Compression codec (gzip, zstd, lz4, xz).
+            level (int, optional): Compression level.
+            threads (int, optional): Compression threads.
+
+        Returns:
+            list: Files added to the archive, relative to ``path``, including
+            the updated catalog.
+        """
+        catalog = OplogCatalog(path)
+        end_ts = latest_oplog_ts(self.client)
+
+        def pack(file_path):
+            packed = pack_file(file_path, compress, encrypt, codec, level, threads)
+            return os.path.relpath(packed, path)
+
+        if not any(entry["type"] == "base" for entry in catalog.chain):
+            os.makedirs(path, exist_ok=True)
+            base_file = os.path.join(path, f"base-{end_ts.time}.{end_ts.inc}.archive")
+            command = ["mongodump"] + self._tool_args() + [
+                "--db",
+                self.database,
+                f"--archive={base_file}",
+            ]
+            subprocess.run(self.priority + command, check=True)
+            files = [pack(base_file)]
+            catalog.add("base", files, end_ts)
+            logger.info(f"Base dump saved to {base_file}")
+        else:
+            segments = write_oplog_segments(
+                self.client,
+                self.database,
+                catalog.last_ts(),
+                end_ts,
+                os.path.join(path, "oplog"),
+            )
+            with ThreadPoolExecutor() as executor:
+                files = list(executor.map(pack, segments))
+            catalog.add("oplog", files, end_ts)
+            logger.info(f"Copied {len(files)} oplog segments up to {end_ts}")
+
+        return files + [CATALOG_FILE]
+
+    def _handle_storage(
+        self, file_path, storage, provider, bucket, logger, metrics=None, counts=None
+    ):
         """
         Handle the storage of the backup file.
 
         Args:
-            file_path (str): The file path to store.
+            file_path (str): The file path to store. A directory is uploaded
+                file by file under a prefix named after it.
             storage (str): Storage type ('local' or 'cloud').
             provider (str, optional): Cloud provider ('aws', 'gcp', 'azure').
             bucket (str, optional): Cloud bucket name.
+            metrics (RunMetrics, optional): Collects per-stage metrics.
+            counts (dict, optional): Document counts of the collections for
+                the manifest.
         """
+        metrics = metrics or RunMetrics("backup")
         if storage == "cloud":
             if not provider or not bucket:
                 raise ValueError(
                     "Cloud provider and bucket name are required for cloud storage."
                 )
-            self._upload_to_cloud(file_path, provider, bucket, logger)
+            size = path_size(file_path)
+            with metrics.stage("upload", size) as stage:
+                if os.path.isdir(file_path):
+                    prefix = os.path.basename(os.path.normpath(file_path))
+                    self._upload_files(
+                        [
+                            (os.path.join(file_path, name), f"{prefix}/{name}")
+                            for name in sorted(os.listdir(file_path))
+                        ],
+                        provider,
+                        bucket,
+                        logger,
+                    )
+                else:
+                    self._upload_to_cloud(file_path, provider, bucket, logger)
+                stage.bytes_out = size
+            self._write_manifest(
+                file_path, storage, provider, bucket, logger, metrics, counts
+            )
         elif storage == "local":
+            # The backup was written at its destination already.
             logger.info(f"Backup stored locally at {file_path}")
+            self._write_manifest(
+                file_path, storage, provider, bucket, logger, metrics, counts
+            )
         else:
             raise ValueError("Unsupported storage type. Choose 'local' or 'cloud'.")
 
-    def _upload_to_cloud(self, file_path, provider, bucket, logger):
+    def _write_manifest(
+        self, file_path, storage, provider, bucket, logger, metrics, counts=None
+    ):
+        """
+        Hash the stored backup file or directory and write its sidecar
+        manifest next to it, and next to its upload for cloud storage.
+        """
+        size = path_size(file_path)
+        with metrics.stage("hash", size) as stage:
+            write_backup_manifest(
+                file_path, storage, provider, bucket, logger, counts=counts
+            )
+            stage.bytes_out = size
+
+    def _upload_to_cloud(self, file_path, provider, bucket, logger, object_name=None):
         """
         Upload the backup file to the cloud.
 
@@ -173,60 +829,119 @@ class MongoDBHandler:
             file_path (str): Path to the file to upload.
             provider (str): Cloud provider ('aws', 'gcp', 'azure').
             bucket (str): Cloud bucket name.
+            object_name (str, optional): Object name; the file name if None.
+        """
+        self._upload_files(
+            [(file_path, object_name or os.path.basename(file_path))],
+            provider,
+            bucket,
+            logger,
+        )
+
+    def _upload_files(self, files, provider, bucket, logger):
+        """
+        Upload files to the cloud concurrently on one event loop.
+
+        Args:
+            files (list): ``(file_path, object_name)`` pairs.
+            provider (str): Cloud provider ('aws', 'gcp', 'azure').
+            bucket (str): Cloud bucket name.
         """
         try:
-            if provider == "aws":
-                store_on_s3(file_path, bucket, logger)
-            elif provider == "gcp":
-                store_on_gcp(file_path, bucket, logger)
-            elif provider == "azure":
-                store_on_azure(file_path, bucket, logger)
-            else:
-                raise ValueError("Unsupported cloud provider.")
-            logger.info(f"Backup uploaded to {provider} bucket '{bucket}'")
+            upload_files(get_backend(provider, bucket, logger=logger), files)
+            logger.info(f"Uploaded {len(files)} files to {provider} bucket '{bucket}'")
 
         except Exception as e:
             logger.error(f"Failed to upload backup to cloud: {e}")
             raise RuntimeError(f"Error uploading to cloud: {e}")
 
-    def restore(self, backup_file, logger):
+    def _stream_to_cloud(self, chunks, object_name, provider, bucket, logger):
         """
-        Restore the PostgreSQL database from a backup file.
+        Stream the backup to the cloud.
 
         Args:
-            backup_file (str): The path to the backup file.
+            chunks (iterable): Iterator yielding the backup bytes.
+            object_name (str): Name of the object to create.
+            provider (str): Cloud provider ('aws', 'gcp', 'azure').
+            bucket (str): Cloud bucket name.
         """
         try:
-            logger.info("Starting restore...")
+            get_provider(provider).stream(chunks, bucket, object_name, logger)
+            logger.info(f"Backup streamed to {provider} bucket '{bucket}'")
 
-            # Decrypt the backup file
-            logger.info("Decrypting the backup file...")
-            backup_file = decrypt_file(backup_file)
-            logger.info(f"Decrypted file available at {backup_file}")
+        except Exception as e:
+            logger.error(f"Failed to stream backup to cloud: {e}")
+            raise RuntimeError(f"Error streaming to cloud: {e}")
 
-            # Decompress the backup file
-            decompressed_file = decompress_backup_tar_folder(backup_file)
-            # Ensure mongorestore is available
-            if not shutil.which("mongorestore"):
-                raise FileNotFoundError(
-                    "mongorestore command not found. Ensure it is installed and in your PATH."
+    def restore(
+        self,
+        backup_file,
+        logger,
+        point_in_time=None,
+        jobs=None,
+        include=None,
+        exclude=None,
+        metrics=None,
+    ):
+        """
+        Restore the MongoDB database from a backup file.
+
+        Archive backups are streamed from storage through decryption and
+        decompression straight into ``mongorestore --archive``. Backups of a
+        dump directory are extracted once while streaming, as mongorestore
+        can only read directories from disk.
+
+        Args:
+            backup_file (str): The path or cloud location (``s3://``,
+                ``gs://``, ``az://``) of the backup file, a repository
+                snapshot manifest, an objects-format backup directory (or its
+                ``index.json``), a ``.dbk`` container, or an incremental
+                archive directory when ``point_in_time`` is set.
+            point_in_time (str, optional): ISO 8601 time to recover an
+                incremental archive to.
+            jobs (int, optional): Collections restored at once from an
+                objects-format backup, or insertion workers per collection
+                for other backups; the CPU count if None.
+            include (list, optional): Only restore collections matching these
+                patterns from an objects-format backup or a container.
+            exclude (list, optional): Skip collections matching these patterns.
+            metrics (RunMetrics, optional): Collects per-stage metrics of
+                the run.
+        """
+        metrics = metrics or RunMetrics("restore")
+        try:
+            logger.info("Starting restore...")
+
+            index = None if point_in_time else index_location(backup_file)
+            if index:
+                self._restore_objects(index, logger, jobs, include, exclude, metrics)
+                logger.info("Restore successful.")
+                return
+            if not point_in_time and is_container(backup_file):
+                self._restore_container(backup_file, logger, include, exclude, metrics)
+                logger.info("Restore successful.")
+                return
+            if include or exclude:
+                raise ValueError(
+                    "Collection filters need an objects-format backup or a container."
                 )
 
-            # Determine the appropriate command based on file extension
-            command = [
-                "mongorestore",
-                "--host",
-                self.config["host"],
-                "--port",
-                str(self.config["port"]),
-                "--db",
-                self.database,
-                "--dir",
-                decompressed_file,
-            ]
+            if point_in_time:
+                self._restore_point_in_time(backup_file, point_in_time, logger)
+                logger.info("Restore successful.")
+                return
 
-            # Run the restore command
-            subprocess.run(command, check=True)
+            if is_snapshot(backup_file):
+                chunks = read_snapshot(backup_file)
+            else:
+                chunks = open_location(backup_file)
+            source = "download" if parse_location(backup_file) else "read"
+            self._restore_stream(
+                metrics.meter(source, chunks),
+                logger,
+                metrics=metrics,
+                workers=jobs or os.cpu_count() or 1,
+            )
             logger.info("Restore successful.")
         except subprocess.CalledProcessError as e:
             logger.error(f"Restore failed with error code {e.returncode}.")
@@ -234,3 +949,184 @@ class MongoDBHandler:
         except Exception as e:
             logger.error(f"An error occurred: {e}")
             raise RuntimeError(f"An error occurred during restore: {e}")
+
+    def _restore_objects(
+        self, location, logger, jobs=None, include=None, exclude=None, metrics=None
+    ):
+        """
+        Restore an objects-format backup, streaming the archives of the
+        selected collections into concurrent mongorestore processes. Only
+        the selected members are read.
+
+        Args:
+            location (str): Location of the backup's index.
+            jobs (int, optional): Collections restored at once; the CPU count if None.
+            include (list, optional): Only restore collections matching these patterns.
+            exclude (list, optional): Skip collections matching these patterns.
+            metrics (RunMetrics, optional): Collects per-stage metrics.
+        """
+        metrics = metrics or RunMetrics("restore")
+        source = "download" if parse_location(location) else "read"
+        members = read_index(location)["members"]
+        names = set(select_objects([member["name"] for member in members], include, exclude))
+        selected = [member for member in members if member["name"] in names]
+        if not selected:
+            raise ValueError("No collections in the backup match the filters.")
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+            list(
+                executor.map(
+                    lambda member: self._restore_stream(
+                        metrics.meter(source, open_location(member["location"])),
+                        logger,
+                        metrics=metrics,
+                    ),
+                    selected,
+                )
+            )
+        logger.info(f"Restored {len(selected)} collections from {location}")
+
+    def _restore_container(
+        self, location, logger, include=None, exclude=None, metrics=None
+    ):
+        """
+        Restore a container of a dump directory. Only the files of the
+        selected collections are read from the container and extracted.
+
+        Args:
+            location (str): Local path or cloud location of the container.
+            include (list, optional): Only restore collections matching these patterns.
+            exclude (list, optional): Skip collections matching these patterns.
+            metrics (RunMetrics, optional): Collects per-stage metrics.
+        """
+        metrics = metrics or RunMetrics("restore")
+        with ContainerReader(location) as reader:
+            collections = {}
+            for name in reader.members:
+                base = os.path.basename(name)
+                for suffix in (".metadata.json", ".bson"):
+                    if base.endswith(suffix):
+                        collections.setdefault(base[: -len(suffix)], []).append(name)
+            selected = select_objects(sorted(collections), include, exclude)
+            if not selected:
+                raise ValueError("No collections in the backup match the filters.")
+
+            extract_dir = tempfile.mkdtemp()
+            try:
+                with metrics.stage("unpack") as stage:
+                    for collection in selected:
+                        for name in collections[collection]:
+                            reader.extract(name, extract_dir)
+                    stage.bytes_out = path_size(extract_dir)
+                dump_dir = _find_dump_dir(extract_dir, self.database)
+                logger.info(f"Extracted {len(selected)} collections to {dump_dir}")
+                if not shutil.which("mongorestore"):
+                    raise FileNotFoundError(
+                        "mongorestore command not found. Ensure it is installed and in your PATH."
+                    )
+                command = ["mongorestore"] + self._tool_args() + [
+                    "--db",
+                    self.database,
+                    "--dir",
+                    dump_dir,
+                ]
+                with metrics.stage("restore", path_size(dump_dir)):
+                    subprocess.run(command, check=True)
+            finally:
+                shutil.rmtree(extract_dir)
+
+    def _restore_stream(self, chunks, logger, drop=False, metrics=None, workers=None):
+        """
+        Decrypt and decompress a stored backup on the fly and restore it.
+
+        Args:
+            chunks (iterable): Iterator yielding the stored backup bytes.
+            drop (bool): Drop each collection before restoring it.
+            metrics (RunMetrics, optional): Collects per-stage metrics.
+            workers (int, optional): Insertion workers per collection; the
+                mongorestore default (one) if None.
+        """
+        metrics = metrics or RunMetrics("restore")
+        source = chunks if isinstance(chunks, Meter) else None
+        if not shutil.which("mongorestore"):
+            raise FileNotFoundError(
+                "mongorestore command not found. Ensure it is installed and in your PATH."
+            )
+        command = ["mongorestore"] + self._tool_args()
+        if drop:
+            command.append("--drop")
+        if workers:
+            command += ["--numInsertionWorkersPerCollection", str(workers)]
+
+        chunks = unpack_stream(chunks)
+        head, chunks = peek(chunks, 512)
+        chunks = metrics.meter("unpack", chunks, upstream=source)
+        if head.startswith(ARCHIVE_MAGIC):
+            logger.info("Streaming archive into mongorestore...")
+            with metrics.sink("restore", chunks):
+                feed_command(
+                    command + ["--nsInclude", f"{self.database}.*", "--archive"], chunks
+                )
+        elif is_tar_header(head):
+            extract_dir = tempfile.mkdtemp()
+            try:
+                extract_tar_stream(chunks, extract_dir)
+                dump_dir = _find_dump_dir(extract_dir, self.database)
+                logger.info(f"Backup extracted to {dump_dir}")
+                with metrics.stage("restore", path_size(dump_dir)):
+                    subprocess.run(
+                        command + ["--db", self.database, "--dir", dump_dir], check=True
+                    )
+            finally:
+                shutil.rmtree(extract_dir)
+        else:
+            raise ValueError(
+                "Unsupported backup format. Expected a mongodump archive or a tar of a dump directory."
+            )
+
+    def _restore_point_in_time(self, archive_dir, point_in_time, logger):
+        """
+        Restore the base dump of an incremental archive, then replay its
+        oplog segments up to ``point_in_time`` with ``mongorestore --oplogReplay``.
+
+        Args:
+            archive_dir (str): Archive directory holding the catalog.
+            point_in_time (str): ISO 8601 time to recover to.
+        """
+        if not shutil.which("mongorestore"):
+            raise FileNotFoundError(
+                "mongorestore command not found. Ensure it is installed and in your PATH."
+            )
+        catalog = OplogCatalog(archive_dir)
+        target = to_timestamp(point_in_time)
+        base, *increments = catalog.entries_for(target)
+        connection_args = self._tool_args()
+
+        self._restore_stream(
+            open_location(os.path.join(archive_dir, base["files"][0])), logger, drop=True
+        )
+        logger.info(f"Base dump from {base['time']} restored")
+
+        segment_files = [
+            os.path.join(archive_dir, name) for entry in increments for name in entry["files"]
+        ]
+        if not segment_files:
+            return
+        replay_dir = tempfile.mkdtemp(dir=archive_dir)
+        try:
+            # mongorestore only reads the combined oplog.bson from the directory.
+            segments = [unpack_file(segment_file) for segment_file in segment_files]
+            combine_segments(segments, os.path.join(replay_dir, "oplog.bson"))
+            for segment, segment_file in zip(segments, segment_files):
+                if segment != segment_file:
+                    os.remove(segment)
+            command = ["mongorestore"] + connection_args + [
+                "--oplogReplay",
+                "--oplogLimit",
+                f"{target.time}:{target.inc}",
+                "--dir",
+                replay_dir,
+            ]
+            subprocess.run(command, check=True)
+        finally:
+            shutil.rmtree(replay_dir)
+        logger.info(f"Replayed {len(segments)} oplog segments up to {point_in_time}")
@@ -0,0 +1,206 @@
+import json
+import os
+import re
+import shutil
+from datetime import datetime, timezone
+import bson
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from bson.timestamp import Timestamp
+
+CATALOG_FILE = "catalog.json"
+SEGMENT_SIZE = 64 * 1024 * 1024
+OPLOG_BATCH_SIZE = 1000
+
+
+class OplogCatalog:
+    """
+    Record of the base dumps and oplog increments in an archive directory.
+
+    Each entry stores the oplog timestamp it covers up to as ``[time, inc]``
+    so the next run knows where to resume tailing.
+    """
+
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        self.path = os.path.join(archive_dir, CATALOG_FILE)
+        self.chain = []
+        if os.path.exists(self.path):
+            with open(self.path, "r") as file:
+                self.chain = json.load(file)["chain"]
+
+    def save(self):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"chain": self.chain}, file, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add(self, entry_type, files, ts):
+        entry = {
+            "type": entry_type,
+            "time": datetime.now(timezone.utc).isoformat(),
+            "ts": [ts.time, ts.inc],
+            "files": files,
+        }
+        self.chain.append(entry)
+        self.save()
+        return entry
+
+    def last_ts(self):
+        """
+        Oplog timestamp covered by the latest entry, or None if empty.
+        """
+        if not self.chain:
+            return None
+        return Timestamp(*self.chain[-1]["ts"])
+
+    def entries_for(self, target):
+        """
+        Select the latest base at or before ``target`` and the oplog
+        increments after it, up to the first one that reaches ``target``.
+
+        Raises:
+            ValueError: If no base dump precedes the target.
+        """
+        base_index = None
+        for index, entry in enumerate(self.chain):
+            if entry["type"] == "base" and Timestamp(*entry["ts"]) <= target:
+                base_index = index
+        if base_index is None:
+            raise ValueError("No base dump was taken before the requested time.")
+
+        selected = [self.chain[base_index]]
+        for entry in self.chain[base_index + 1 :]:
+            if entry["type"] == "base":
+                continue
+            selected.append(entry)
+            if Timestamp(*entry["ts"]) >= target:
+                break
+        return selected
+
+
+def to_timestamp(value):
+    """
+    Convert an ISO 8601 time to the first oplog timestamp after that second.
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return Timestamp(int(parsed.timestamp()) + 1, 0)
+
+
+def _oplog(client):
+    return client.local.get_collection(
+        "oplog.rs", codec_options=CodecOptions(document_class=RawBSONDocument)
+    )
+
+
+def latest_oplog_ts(client):
+    """
+    Timestamp of the newest oplog entry.
+
+    Raises:
+        RuntimeError: If the server is not a replica set member.
+    """
+    entry = _oplog(client).find_one(sort=[("$natural", -1)])
+    if entry is None:
+        raise RuntimeError(
+            "The oplog is empty or missing. Incremental backups need a replica set."
+        )
+    return entry["ts"]
+
+
+def _transaction_entry(raw, namespace):
+    """
+    Raw BSON of an ``applyOps`` entry (a multi-document transaction)
+    keeping only the operations on the database, or None if there are none.
+    """
+    entry = bson.decode(raw)
+    operations = [
+        operation
+        for operation in entry["o"]["applyOps"]
+        if namespace.match(operation.get("ns", ""))
+    ]
+    if not operations:
+        return None
+    entry["o"]["applyOps"] = operations
+    return bson.encode(entry)
+
+
+def write_oplog_segments(client, database, start_ts, end_ts, output_dir):
+    """
+    Copy the oplog entries of ``database`` in ``(start_ts, end_ts]`` into
+    BSON segment files of at most ``SEGMENT_SIZE`` bytes.
+
+    Entries are copied as raw BSON without decoding, except transactions:
+    they are logged as ``applyOps`` commands on ``admin.$cmd`` and are
+    copied with only their operations on ``database``. Files are named
+    ``oplog-<first>-<last>.bson`` after the timestamps they cover.
+
+    Returns:
+        list: Paths of the written segment files.
+
+    Raises:
+        RuntimeError: If the oplog no longer reaches back to ``start_ts``.
+    """
+    oplog = _oplog(client)
+    oldest = oplog.find_one(sort=[("$natural", 1)])
+    if oldest is None or oldest["ts"] > start_ts:
+        raise RuntimeError(
+            "The oplog has rolled over since the last backup. Take a new base dump."
+        )
+
+    pattern = f"^{re.escape(database)}\\."
+    namespace = re.compile(pattern)
+    cursor = oplog.find(
+        {
+            "ts": {"$gt": start_ts, "$lte": end_ts},
+            "$or": [
+                {"ns": {"$regex": pattern}},
+                {"op": "c", "ns": "admin.$cmd", "o.applyOps.ns": {"$regex": pattern}},
+            ],
+        },
+        sort=[("$natural", 1)],
+        batch_size=OPLOG_BATCH_SIZE,
+    )
+    os.makedirs(output_dir, exist_ok=True)
+    segments = []
+    segment, first_ts, last_ts, size = None, None, None, 0
+
+    def close_segment():
+        segment.close()
+        name = f"oplog-{first_ts.time}.{first_ts.inc}-{last_ts.time}.{last_ts.inc}.bson"
+        final_path = os.path.join(output_dir, name)
+        os.replace(segment.name, final_path)
+        segments.append(final_path)
+
+    for entry in cursor:
+        raw = entry.raw
+        if entry["ns"] == "admin.$cmd":
+            raw = _transaction_entry(raw, namespace)
+            if raw is None:
+                continue
+        if segment is None:
+            segment = open(os.path.join(output_dir, "segment.partial"), "wb")
+            first_ts, size = entry["ts"], 0
+        segment.write(raw)
+        last_ts = entry["ts"]
+        size += len(raw)
+        if size >= SEGMENT_SIZE:
+            close_segment()
+            segment = None
+    if segment is not None:
+        close_segment()
+    return segments
+
+
+def combine_segments(segment_files, output_file):
+    """
+    Concatenate oplog segments into one ``oplog.bson`` for mongorestore.
+    """
+    with open(output_file, "wb") as f_out:
+        for segment_file in segment_files:
+            with open(segment_file, "rb") as f_in:
+                shutil.copyfileobj(f_in, f_out)
+    return output_file
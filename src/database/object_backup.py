@@ -0,0 +1,144 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from fnmatch import fnmatchcase
+from urllib.parse import quote
+from storage.providers import open_location, parse_location
+from utils.compression import compress_stream, get_codec
+from utils.encryption import encrypt_stream
+from utils.metrics import RunMetrics
+from utils.pipeline import write_stream
+
+INDEX_FILE = "index.json"
+
+
+def select_objects(names, include=None, exclude=None):
+    """
+    Filter object names with shell-style patterns.
+
+    Args:
+        names (iterable): Table or collection names.
+        include (list, optional): Keep only names matching one of these.
+        exclude (list, optional): Drop names matching one of these.
+
+    Returns:
+        list: The selected names, in their original order.
+    """
+    return [
+        name
+        for name in names
+        if (not include or any(fnmatchcase(name, pattern) for pattern in include))
+        and not any(fnmatchcase(name, pattern) for pattern in exclude or [])
+    ]
+
+
+def dump_objects(
+    path,
+    objects,
+    dump,
+    compress,
+    encrypt,
+    logger,
+    codec="gzip",
+    level=None,
+    workers=None,
+    metadata=None,
+    metrics=None,
+):
+    """
+    Dump objects concurrently into one independently compressed and
+    encrypted member file each, and write an index of the members.
+
+    Args:
+        path (str): Directory to create for the backup.
+        objects (list): ``(name, kind, extension)`` of each object.
+        dump (callable): ``dump(name, kind)`` returning an iterator over the
+            object's dump.
+        compress (bool): Whether to compress each member.
+        encrypt (bool): Whether to encrypt each member.
+        logger: Logger instance for logging.
+        codec (str): Compression codec (gzip, zstd, lz4, xz).
+        level (int, optional): Compression level.
+        workers (int, optional): Objects dumped at once; the CPU count if None.
+        metadata (dict, optional): Extra fields for the index.
+        metrics (RunMetrics, optional): Collects per-stage metrics, summed
+            over all objects.
+
+    Returns:
+        str: The backup directory.
+    """
+    metrics = metrics or RunMetrics("backup")
+    workers = workers or os.cpu_count() or 1
+    # Split the cores between members being compressed at the same time.
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    os.makedirs(path, exist_ok=True)
+
+    def run(obj):
+        name, kind, extension = obj
+        file_name = f"{quote(name, safe='')}{extension}"
+        chunks = metrics.meter("dump", dump(name, kind))
+        if compress:
+            chunks = metrics.meter("compress", compress_stream(chunks, codec, level, threads))
+            file_name = f"{file_name}{get_codec(codec).extension}"
+        if encrypt:
+            chunks = metrics.meter("encrypt", encrypt_stream(chunks))
+            file_name = f"{file_name}.enc"
+        started = time.monotonic()
+        with metrics.sink("store", chunks):
+            size = write_stream(chunks, os.path.join(path, file_name))
+        seconds = round(time.monotonic() - started, 3)
+        logger.info(f"Dumped {kind} {name} to {file_name} ({size} bytes, {seconds}s)")
+        return {"name": name, "kind": kind, "file": file_name, "size": size}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        members = list(executor.map(run, objects))
+
+    index = dict(metadata or {})
+    index.update(
+        created=datetime.now(timezone.utc).isoformat(),
+        codec=get_codec(codec).name if compress else None,
+        encrypted=encrypt,
+        members=members,
+    )
+    with open(os.path.join(path, INDEX_FILE), "w") as file:
+        json.dump(index, file, indent=2)
+    logger.info(f"Dumped {len(members)} objects into {path}")
+    return path
+
+
+def index_location(location):
+    """
+    Location of the index of a per-object backup, or None if ``location``
+    is not one. A local backup directory or the location of its
+    ``index.json`` (local or cloud) are accepted.
+    """
+    if parse_location(location) is None and os.path.isdir(location):
+        location = os.path.join(location, INDEX_FILE)
+        return location if os.path.exists(location) else None
+    if location.rstrip("/").endswith(f"/{INDEX_FILE}") or location == INDEX_FILE:
+        return location
+    return None
+
+
+def read_index(location):
+    """
+    Read the index of a per-object backup.
+
+    Args:
+        location (str): Location returned by ``index_location``.
+
+    Returns:
+        dict: The index, with each member's ``location`` filled in.
+    """
+    index = json.loads(b"".join(open_location(location)))
+    if parse_location(location):
+        base = location.rsplit("/", 1)[0]
+        for member in index["members"]:
+            member["location"] = f"{base}/{member['file']}"
+    else:
+        base = os.path.dirname(location)
+        for member in index["members"]:
+            member["location"] = os.path.join(base, member["file"])
+    return index
@@ -1,22 +1,74 @@
 import psycopg2
 import subprocess
 import shutil
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from utils.compression import (
-    compress_backup,
     compress_backup_tar_file,
-    decompress_backup_file,
+    compress_stream,
+    get_codec,
+    is_tar_header,
+    tar_member_stream,
 )
-from storage.local_storage import store_locally
-from storage.azure_storage import store_on_azure
-from storage.s3_storage import store_on_s3
-from storage.gcp_storage import store_on_gcp
+from storage.backend import get_backend, upload_files
+from storage.fanout import Destination, fan_out, written_locations
+from storage.manifest import checksums_for, save_stream_manifest, write_backup_manifest
+from storage.providers import get_provider, open_location, parse_location
+from storage.container import (
+    CONTAINER_EXTENSION,
+    is_container,
+    pack_container,
+    read_container_member,
+)
+from storage.repository import ChunkRepository, is_snapshot, read_snapshot
+from database.object_backup import dump_objects, index_location, read_index, select_objects
 from utils.notification import send_slack_notification
-from utils.encryption import encrypt_file, decrypt_file
+from utils.checksums import Checksums
+from utils.config import load_config
+from utils.encryption import encrypt_file, encrypt_stream
+from utils.metrics import Meter, RunMetrics, path_size
+from utils.packing import pack_file, unpack_file, unpack_stream
+from utils.throttle import Throttle, job_throttle, process_priority
+from database.postgres_wal import (
+    CATALOG_FILE,
+    INCOMING_WAL_DIR,
+    WalCatalog,
+    completed_segments,
+    ensure_slot,
+    run_pg_basebackup,
+    run_pg_receivewal,
+    slot_name,
+    switch_wal,
+)
+from utils.pipeline import (
+    feed_command,
+    peek,
+    stream_command_output,
+    write_stream,
+)
+
+
+def _qualify(patterns):
+    """
+    Make table patterns without a schema match the table in any schema.
+    """
+    return [pattern if "." in pattern else f"*.{pattern}" for pattern in patterns or []]
+
+
+def _quote_table(name):
+    """
+    Exact pg_dump ``-t`` pattern for a ``schema.table`` name.
+    """
+    schema, table = name.split(".", 1)
+    return '"{}"."{}"'.format(schema.replace('"', '""'), table.replace('"', '""'))
 
 
 class PostgresHandler:
     def __init__(self, host, user, password, database, port=5432):
         self.connection = None
+        # Command prefix lowering the priority of the dump processes.
+        self.priority = []
         self.config = {
             "host": host,
             "user": user,
@@ -37,6 +89,79 @@ class PostgresHandler:
             self.connection.close()
             logger.info("PostgreSQL connection closed.")
 
+    def list_databases(self):
+        """
+        List the databases on the server that accept connections.
+
+        Returns:
+            list: Database names, excluding templates.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT datname FROM pg_database "
+                "WHERE NOT datistemplate AND datallowconn ORDER BY datname"
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _pg_env(self):
+        """
+        Environment for the PostgreSQL client tools, carrying the password.
+        """
+        return dict(os.environ, PGPASSWORD=str(self.config["password"] or ""))
+
+    def _filter_args(self, include=None, exclude=None):
+        """
+        pg_dump arguments selecting tables by pattern.
+        """
+        args = []
+        for pattern in include or []:
+            args.extend(["-t", pattern])
+        for pattern in exclude or []:
+            args.extend(["-T", pattern])
+        return args
+
+    def _list_tables(self, cursor):
+        """
+        List the user tables as ``schema.table``, largest first so the
+        longest dumps start early and workers finish together.
+        """
+        cursor.execute(
+            "SELECT n.nspname || '.' || c.relname FROM pg_class c "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.relkind = 'r' "
+            "AND n.nspname NOT IN ('pg_catalog', 'information_schema') "
+            "AND n.nspname NOT LIKE 'pg_toast%' "
+            "ORDER BY pg_total_relation_size(c.oid) DESC"
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def object_counts(self, include=None, exclude=None):
+        """
+        Count the rows of each user table, all in one snapshot.
+
+        Args:
+            include (list, optional): Only count tables matching these patterns.
+            exclude (list, optional): Skip tables matching these patterns.
+
+        Returns:
+            dict: Row count of each table, by ``schema.table``.
+        """
+        connection = psycopg2.connect(**self.config)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+                tables = select_objects(
+                    self._list_tables(cursor), _qualify(include), _qualify(exclude)
+                )
+                counts = {}
+                for table in tables:
+                    cursor.execute(f"SELECT count(*) FROM {_quote_table(table)}")
+                    counts[table] = cursor.fetchone()[0]
+            return counts
+        finally:
+            connection.rollback()
+            connection.close()
+
     def backup(
         self,
         compress,
@@ -49,17 +174,83 @@ class PostgresHandler:
         provider=None,
         bucket=None,
         encrypted_file=None,
+        stream=False,
+        codec="gzip",
+        level=None,
+        threads=None,
+        dump_format="custom",
+        jobs=None,
+        mode="full",
+        repository=None,
+        include=None,
+        exclude=None,
+        container=False,
+        metrics=None,
+        destinations=None,
+        record_counts=False,
+        rate_limit=None,
+        nice=None,
+        ionice=None,
+        new_base=False,
     ):
         """
         Backup the PostgreSQL database to a file.
 
         Args:
             compress (bool): Whether to compress the backup file.
-            storage (str): Storage type ('local' or 'cloud').
+            storage (str): Storage type ('local', 'cloud' or 'repository').
             path (str): Path to save the backup file.
             provider (str, optional): Cloud provider ('aws', 'gcp', 'azure'). Required for cloud storage.
             bucket (str, optional): Cloud bucket name. Required for cloud storage.
+            stream (bool): Pipe pg_dump through compression, encryption and
+                upload without writing intermediate files.
+            codec (str): Compression codec (gzip, zstd, lz4, xz).
+            level (int, optional): Compression level; the codec default if None.
+            threads (int, optional): Compression threads; the CPU count if None.
+            dump_format (str): 'custom' for a single archive file,
+                'directory' for a parallel per-table dump into the ``path``
+                directory, or 'objects' for one independently compressed and
+                encrypted member per table, indexed so that single tables
+                can be restored.
+            jobs (int, optional): Parallel pg_dump jobs for the directory
+                and objects formats; the CPU count if None.
+            mode (str): 'full' for a pg_dump, or 'incremental' to ship WAL
+                since the previous run into the ``path`` archive directory,
+                taking a base backup first if the archive has none or the
+                config's ``incremental`` rebase policy calls for one.
+            repository (str, optional): Directory of the deduplicating
+                repository. Required for repository storage; with ``provider``
+                and ``bucket`` its chunks are kept in the cloud.
+            include (list, optional): Only back up tables matching these
+                patterns (``table``, ``schema.table``, ``schema.*``).
+            exclude (list, optional): Skip tables matching these patterns.
+            container (bool): Store a custom-format dump in a seekable
+                ``.dbk`` container of separately compressed and encrypted
+                frames instead of an encrypted tarball.
+            metrics (RunMetrics, optional): Collects per-stage metrics of
+                the run.
+            destinations (list, optional): Write the streamed backup to all
+                of these at once instead of ``storage``: local directories
+                (``local:/dir``) and cloud locations (``s3://bucket/prefix``,
+                ``gs://``, ``az://``). The dump is taken, compressed and
+                encrypted once. Returns the list of written locations.
+            record_counts (bool): Count the rows of each table before the
+                dump and keep them in the sidecar manifest, for
+                ``restore-test`` to check restores against. Scans every table.
+            rate_limit (str or float, optional): Bytes per second for the
+                streamed backup and uploads of this run, e.g. ``20MB``; the
+                config's ``throttle.job_rate`` schedule if None. Streams are
+                paced before they are written, so the dump slows down too.
+                The config's ``throttle.global_rate`` applies on top.
+            nice (int, optional): Niceness of the dump processes; the config's
+                ``throttle.nice`` if None.
+            ionice (str, optional): I/O class of the dump processes (``idle``,
+                ``best-effort:7``); the config's ``throttle.ionice`` if None.
+            new_base (bool): Take a new base backup in incremental mode even
+                if the rebase policy does not call for one.
         """
+        metrics = metrics or RunMetrics("backup")
+        throttle_token = None
         try:
             logger.info("Starting backup...")
             # Ensure pg_dump is available
@@ -68,6 +259,136 @@ class PostgresHandler:
                     "pg_dump command not found. Ensure it is installed and in your PATH."
                 )
 
+            if (include or exclude) and mode != "full":
+                raise ValueError("Table filters apply to full backups only.")
+            if container and (
+                mode != "full" or dump_format != "custom" or stream or storage == "repository"
+            ):
+                raise ValueError(
+                    "The container format applies to full, non-streamed custom-format backups."
+                )
+            if destinations and (
+                mode != "full" or dump_format != "custom" or container or storage == "repository"
+            ):
+                raise ValueError(
+                    "Multiple destinations apply to full, streamed custom-format backups."
+                )
+            if record_counts and (mode != "full" or storage == "repository"):
+                raise ValueError(
+                    "Object counts are recorded for full, non-repository backups only."
+                )
+            destinations = [Destination(spec) for spec in destinations or []]
+            self.priority = process_priority(nice, ionice)
+            throttle = job_throttle(rate_limit)
+            # File uploads of this run pick the throttle up from the context.
+            throttle_token = throttle.activate()
+            if storage == "repository":
+                if mode != "full" or dump_format != "custom":
+                    raise ValueError(
+                        "Repository storage supports full custom-format backups only."
+                    )
+                if not repository:
+                    raise ValueError("A repository path is required for repository storage.")
+                # Chunks are compressed and encrypted individually by the repository.
+                repository = ChunkRepository(
+                    repository, provider, bucket, codec, level, encrypt, threads
+                )
+
+            if new_base and mode != "incremental":
+                raise ValueError("A new base backup applies to incremental backups only.")
+            if mode == "incremental":
+                new_files = self._backup_incremental(
+                    compress, encrypt, path, logger, codec, level, threads, new_base
+                )
+                if storage == "cloud":
+                    if not provider or not bucket:
+                        raise ValueError(
+                            "Cloud provider and bucket name are required for cloud storage."
+                        )
+                    prefix = os.path.basename(os.path.normpath(path))
+                    self._upload_files(
+                        [(os.path.join(path, name), f"{prefix}/{name}") for name in new_files],
+                        provider,
+                        bucket,
+                        logger,
+                    )
+                elif storage != "local":
+                    raise ValueError("Unsupported storage type. Choose 'local' or 'cloud'.")
+                if notify_slack and slack_webhook_url:
+                    send_slack_notification(
+                        slack_webhook_url, f"Incremental backup successful: {path}"
+                    )
+                return path
+            if mode != "full":
+                raise ValueError("Unsupported backup mode. Choose 'full' or 'incremental'.")
+            counts = None
+            if record_counts:
+                with metrics.stage("count"):
+                    counts = self.object_counts(include, exclude)
+                logger.info(f"Counted the rows of {len(counts)} tables")
+
+            if dump_format == "directory":
+                if stream:
+                    raise ValueError("The directory format cannot be streamed.")
+                backup_dir = self._backup_directory(
+                    compress, encrypt, path, logger, jobs, codec, level, threads,
+                    include, exclude, metrics,
+                )
+                self._handle_storage(
+                    backup_dir, storage, provider, bucket, logger, metrics=metrics,
+                    counts=counts,
+                )
+                if notify_slack and slack_webhook_url:
+                    send_slack_notification(
+                        slack_webhook_url, f"Backup successful: {backup_dir}"
+                    )
+                return backup_dir
+            if dump_format == "objects":
+                backup_dir = self._backup_objects(
+                    compress, encrypt, path, logger, jobs, codec, level, include, exclude,
+                    metrics,
+                )
+                self._handle_storage(
+                    backup_dir, storage, provider, bucket, logger, metrics=metrics,
+                    counts=counts,
+                )
+                if notify_slack and slack_webhook_url:
+                    send_slack_notification(
+                        slack_webhook_url, f"Backup successful: {backup_dir}"
+                    )
+                return backup_dir
+            if dump_format != "custom":
+                raise ValueError(
+                    "Unsupported dump format. Choose 'custom', 'directory' or 'objects'."
+                )
+
+            if destinations or stream or storage == "repository":
+                # The repository chunks the uncompressed dump stream.
+                backup_file = self._backup_stream(
+                    compress,
+                    encrypt,
+                    storage,
+                    path,
+                    provider,
+                    bucket,
+                    logger,
+                    codec=codec,
+                    level=level,
+                    threads=threads,
+                    repository=repository,
+                    include=include,
+                    exclude=exclude,
+                    metrics=metrics,
+                    destinations=destinations,
+                    counts=counts,
+                    throttle=throttle,
+                )
+                if notify_slack and slack_webhook_url:
+                    send_slack_notification(
+                        slack_webhook_url, f"Backup successful: {backup_file}"
+                    )
+                return backup_file
+
             # Generate pg_dump command
             command = [
                 "pg_dump",
@@ -86,25 +407,64 @@ class PostgresHandler:
                 "--large-objects",
                 "-F",
                 "c",
-            ]
+            ] + self._filter_args(include, exclude)
+            if compress:
+                # The codec stage (compress_backup or pack_container) compresses
+                # the dump; pg_dump's own zlib pass would be wasted.
+                command.extend(["-Z", "0"])
 
             # Execute pg_dump
-            with open(path, "w") as backup_file:
-                subprocess.run(command, stdout=backup_file, check=True)
+            with metrics.stage("dump") as stage:
+                subprocess.run(self.priority + command, check=True, env=self._pg_env())
+                stage.bytes_out = os.path.getsize(path)
             # print(f"Backup successful. File saved to {path}")
 
+            if container:
+                with metrics.stage("pack", os.path.getsize(path)) as stage:
+                    backup_file = pack_container(
+                        path,
+                        f"{path}{CONTAINER_EXTENSION}",
+                        codec if compress else None,
+                        level,
+                        encrypt,
+                        threads,
+                    )
+                    stage.bytes_out = os.path.getsize(backup_file)
+                os.remove(path)
+                logger.info(f"Backup packed into {backup_file}")
+                self._handle_storage(
+                    backup_file, storage, provider, bucket, logger, metrics=metrics,
+                    counts=counts,
+                )
+                if notify_slack and slack_webhook_url:
+                    send_slack_notification(slack_webhook_url, f"Backup successful: {backup_file}")
+                return backup_file
+
             # Handle compression if enabled
             backup_file = path
             if compress:
-                backup_file = compress_backup_tar_file(path, f"{path}.gz")
+                with metrics.stage("compress", os.path.getsize(path)) as stage:
+                    backup_file = compress_backup_tar_file(
+                        path,
+                        f"{path}.tar{get_codec(codec).extension}",
+                        codec,
+                        level,
+                        threads,
+                    )
+                    stage.bytes_out = os.path.getsize(backup_file)
 
             # Encrypt the backup file
             if encrypt:
-                encrypted_file = encrypt_file(backup_file)
+                with metrics.stage("encrypt", os.path.getsize(backup_file)) as stage:
+                    encrypted_file = encrypt_file(backup_file)
+                    stage.bytes_out = os.path.getsize(encrypted_file)
             logger.info(f"Encrypted file saved to {encrypted_file}")
 
             # Handle storage
-            self._handle_storage(encrypted_file, storage, provider, bucket, logger)
+            self._handle_storage(
+                encrypted_file, storage, provider, bucket, logger, metrics=metrics,
+                counts=counts,
+            )
 
             # Notify Slack
             if notify_slack and slack_webhook_url:
@@ -121,29 +481,491 @@ class PostgresHandler:
         except Exception as e:
             logger.error(f"An error occurred during backup: {e}")
             raise RuntimeError(f"An error occurred during backup: {e}")
+        finally:
+            if throttle_token:
+                Throttle.deactivate(throttle_token)
+
+    def _backup_stream(
+        self,
+        compress,
+        encrypt,
+        storage,
+        path,
+        provider,
+        bucket,
+        logger,
+        codec="gzip",
+        level=None,
+        threads=None,
+        repository=None,
+        include=None,
+        exclude=None,
+        metrics=None,
+        destinations=None,
+        counts=None,
+        throttle=None,
+    ):
+        """
+        Stream pg_dump output through the compress/encrypt stages to storage.
+
+        Args:
+            compress (bool): Whether to compress the stream.
+            encrypt (bool): Whether to encrypt the stream.
+            storage (str): Storage type ('local', 'cloud' or 'repository').
+            path (str): Backup file path; the object name for cloud storage.
+            provider (str, optional): Cloud provider ('aws', 'gcp', 'azure').
+            bucket (str, optional): Cloud bucket name.
+            codec (str): Compression codec (gzip, zstd, lz4, xz).
+            level (int, optional): Compression level.
+            threads (int, optional): Compression threads.
+            repository (ChunkRepository, optional): Repository receiving the
+                uncompressed dump for repository storage.
+            include (list, optional): Only dump tables matching these patterns.
+            exclude (list, optional): Skip tables matching these patterns.
+            metrics (RunMetrics, optional): Collects per-stage metrics.
+            destinations (list, optional): ``Destination`` objects the stream is teed
+                to instead of ``storage``.
+            counts (dict, optional): Row counts of the tables for the manifest.
+            throttle (Throttle, optional): Paces the stored stream.
+
+        Returns:
+            str: Location of the stored backup, or a list of locations with
+            ``destinations``.
+        """
+        metrics = metrics or RunMetrics("backup")
+        command = [
+            "pg_dump",
+            "-h",
+            self.config["host"],
+            "-p",
+            str(self.config["port"]),
+            "-U",
+            self.config["user"],
+            "-d",
+            self.config["dbname"],
+            "-b",
+            "--large-objects",
+            "-F",
+            "c",
+        ] + self._filter_args(include, exclude)
+        if compress or storage == "repository":
+            # Custom format is compressed by pg_dump itself unless told otherwise.
+            command.extend(["-Z", "0"])
+        chunks = metrics.meter(
+            "dump", stream_command_output(self.priority + command, env=self._pg_env())
+        )
+        if storage == "repository":
+            with metrics.sink("store", chunks):
+                snapshot = repository.store(chunks, os.path.basename(path), logger)
+            repository.close()
+            return snapshot
+        # Hashed inline: the dump before compression and encryption, and the
+        # stored stream for the sidecar manifest.
+        content = Checksums()
+        chunks = metrics.meter("hash", content.wrap(chunks), upstream=chunks)
+        if compress:
+            chunks = metrics.meter("compress", compress_stream(chunks, codec, level, threads))
+            path = f"{path}{get_codec(codec).extension}"
+        if encrypt:
+            chunks = metrics.meter("encrypt", encrypt_stream(chunks))
+            path = f"{path}.enc"
+        if throttle:
+            # Back-pressure through the pipe slows pg_dump down as well.
+            chunks = metrics.meter("throttle", throttle.wrap(chunks), upstream=chunks)
+
+        if destinations:
+            providers = [item.provider.name for item in destinations if item.provider]
+        else:
+            providers = [provider] if storage == "cloud" and provider else []
+        stored = checksums_for(*providers)
+        chunks = metrics.meter("hash", stored.wrap(chunks), upstream=chunks)
+
+        if destinations:
+            with metrics.sink("upload", chunks):
+                report = fan_out(
+                    chunks,
+                    destinations,
+                    os.path.basename(path),
+                    logger,
+                )
+            written = [entry["location"] for entry in report if entry["status"] == "success"]
+            save_stream_manifest(
+                stored, content, os.path.basename(path), written, logger, counts
+            )
+            return written_locations(report)
+        if storage == "local":
+            with metrics.sink("store", chunks):
+                size = write_stream(chunks, path)
+            logger.info(f"Backup streamed to {path} ({size} bytes)")
+            save_stream_manifest(
+                stored, content, os.path.basename(path), [path], logger, counts
+            )
+            return path
+        if storage == "cloud":
+            if not provider or not bucket:
+                raise ValueError(
+                    "Cloud provider and bucket name are required for cloud storage."
+                )
+            with metrics.sink("upload", chunks):
+                self._stream_to_cloud(
+                    chunks, os.path.basename(path), provider, bucket, logger
+                )
+            location = f"{provider}://{bucket}/{os.path.basename(path)}"
+            save_stream_manifest(
+                stored, content, os.path.basename(path), [location], logger, counts
+            )
+            return location
+        raise ValueError(
+            "Unsupported storage type. Choose 'local', 'cloud' or 'repository'."
+        )
+
+    def _backup_directory(
+        self,
+        compress,
+        encrypt,
+        path,
+        logger,
+        jobs=None,
+        codec="gzip",
+        level=None,
+        threads=None,
+        include=None,
+        exclude=None,
+        metrics=None,
+    ):
+        """
+        Dump the database in directory format with parallel pg_dump jobs, then
+        compress and encrypt each table file in parallel.
+
+        Args:
+            compress (bool): Whether to compress each file.
+            encrypt (bool): Whether to encrypt each file.
+            path (str): Directory to create for the dump.
+            jobs (int, optional): Parallel jobs; the CPU count if None.
+            codec (str): Compression codec (gzip, zstd, lz4, xz).
+            level (int, optional): Compression level.
+            threads (int, optional): Compression threads per file.
+            include (list, optional): Only dump tables matching these patterns.
+            exclude (list, optional): Skip tables matching these patterns.
+            metrics (RunMetrics, optional): Collects per-stage metrics.
+
+        Returns:
+            str: The backup directory.
+        """
+        metrics = metrics or RunMetrics("backup")
+        jobs = jobs or os.cpu_count() or 1
+        command = [
+            "pg_dump",
+            "-h",
+            self.config["host"],
+            "-p",
+            str(self.config["port"]),
+            "-U",
+            self.config["user"],
+            "-d",
+            self.config["dbname"],
+            "-f",
+            path,
+            "-b",
+            "-v",
+            "--large-objects",
+            "-F",
+            "d",
+            "-j",
+            str(jobs),
+        ] + self._filter_args(include, exclude)
+        if compress:
+            # Files are compressed below with the selected codec instead.
+            command.extend(["-Z", "0"])
+        with metrics.stage("dump") as stage:
+            subprocess.run(self.priority + command, check=True, env=self._pg_env())
+            stage.bytes_out = path_size(path)
+        logger.info(f"Directory-format dump saved to {path}")
+
+        # Split the cores between files being processed at the same time.
+        threads = threads or max(1, (os.cpu_count() or 1) // jobs)
+        members = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+        with metrics.stage("pack", path_size(path)) as stage:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                list(
+                    executor.map(
+                        lambda member: pack_file(
+                            member, compress, encrypt, codec, level, threads
+                        ),
+                        members,
+                    )
+                )
+            stage.bytes_out = path_size(path)
+        logger.info(f"Processed {len(members)} files in {path}")
+        return path
+
+    def _backup_objects(
+        self,
+        compress,
+        encrypt,
+        path,
+        logger,
+        jobs=None,
+        codec="gzip",
+        level=None,
+        include=None,
+        exclude=None,
+        metrics=None,
+    ):
+        """
+        Dump every table into its own member with concurrent pg_dump
+        processes, plus a member holding the schema, large objects and
+        sequence values.
+
+        The pg_dump processes share a snapshot exported by one open
+        transaction, so the tables are as consistent as in a single dump.
+
+        Args:
+            compress (bool): Whether to compress each member.
+            encrypt (bool): Whether to encrypt each member.
+            path (str): Directory to create for the backup.
+            jobs (int, optional): Tables dumped at once; the CPU count if None.
+            codec (str): Compression codec (gzip, zstd, lz4, xz).
+            level (int, optional): Compression level.
+            include (list, optional): Only dump tables matching these patterns.
+            exclude (list, optional): Skip tables matching these patterns.
+            metrics (RunMetrics, optional): Collects per-stage metrics.
+
+        Returns:
+            str: The backup directory.
+        """
+        snapshot_connection = psycopg2.connect(**self.config)
+        try:
+            with snapshot_connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+                cursor.execute("SELECT pg_export_snapshot()")
+                snapshot = cursor.fetchone()[0]
+                tables = select_objects(
+                    self._list_tables(cursor), _qualify(include), _qualify(exclude)
+                )
+            if not tables:
+                raise ValueError("No tables match the filters.")
 
-    def _handle_storage(self, file_path, storage, provider, bucket, logger):
+            command = [
+                "pg_dump",
+                "-h",
+                self.config["host"],
+                "-p",
+                str(self.config["port"]),
+                "-U",
+                self.config["user"],
+                "-d",
+                self.config["dbname"],
+                "-F",
+                "c",
+                "--snapshot",
+                snapshot,
+            ]
+            if compress:
+                # Members are compressed with the selected codec instead.
+                command.extend(["-Z", "0"])
+
+            def dump(name, kind):
+                if kind == "schema":
+                    # Everything but table data: the schema, large objects and
+                    # the values of sequences no dumped table owns.
+                    args = [
+                        "--large-objects", "--exclude-table-data=*.*"
+                    ] + self._filter_args(include, exclude)
+                else:
+                    args = ["-t", _quote_table(name)]
+                return stream_command_output(
+                    self.priority + command + args, env=self._pg_env()
+                )
+
+            objects = [("schema", "schema", ".dump")]
+            objects += [(table, "table", ".dump") for table in tables]
+            return dump_objects(
+                path,
+                objects,
+                dump,
+                compress,
+                encrypt,
+                logger,
+                codec,
+                level,
+                jobs,
+                metadata={"db_type": "postgres", "database": self.config["dbname"]},
+                metrics=metrics,
+            )
+        finally:
+            snapshot_connection.rollback()
+            snapshot_connection.close()
+
+    def _backup_incremental(
+        self, compress, encrypt, path, logger, codec="gzip", level=None, threads=None,
+        new_base=False,
+    ):
+        """
+        Ship the WAL written since the previous run into an archive directory.
+
+        The first run creates a physical replication slot and takes a base
+        backup with pg_basebackup. Every run then switches WAL, receives the
+        completed segments through the slot with pg_receivewal and packs them.
+        The slot and the WAL it retains cover the whole cluster.
+
+        A new base backup is taken when ``new_base`` is set, or when the
+        latest one is older than ``rebase_after_days`` or more than
+        ``rebase_after_mb`` of WAL has been archived since it (the config's
+        ``incremental`` section). Point-in-time recovery starts from the
+        latest base before the target, so this bounds the WAL it replays.
+
+        Args:
+            compress (bool): Whether to compress the archived files.
+            encrypt (bool): Whether to encrypt the archived files.
+            path (str): Archive directory holding the catalog.
+            codec (str): Compression codec (gzip, zstd, lz4, xz).
+            level (int, optional): Compression level.
+            threads (int, optional): Compression threads.
+            new_base (bool): Take a new base backup regardless of the policy.
+
+        Returns:
+            list: Files added to the archive, relative to ``path``, including
+            the updated catalog.
+        """
+        for tool in ("pg_basebackup", "pg_receivewal"):
+            if not shutil.which(tool):
+                raise FileNotFoundError(
+                    f"{tool} command not found. Ensure it is installed and in your PATH."
+                )
+        catalog = WalCatalog(path)
+        catalog.slot = catalog.slot or slot_name(self.config["dbname"])
+        ensure_slot(self.connection, catalog.slot)
+
+        connection_args = [
+            "-h",
+            self.config["host"],
+            "-p",
+            str(self.config["port"]),
+            "-U",
+            self.config["user"],
+        ]
+
+        def pack(file_path):
+            packed = pack_file(file_path, compress, encrypt, codec, level, threads)
+            return os.path.relpath(packed, path)
+
+        new_files = []
+
+        policy = load_config().get("incremental", {})
+        max_wal_mb = policy.get("rebase_after_mb")
+        reason = "requested" if new_base else catalog.base_due(
+            datetime.now(timezone.utc),
+            policy.get("rebase_after_days"),
+            max_wal_mb * 1024 * 1024 if max_wal_mb is not None else None,
+        )
+        if reason:
+            logger.info(f"Taking a new base backup: {reason}")
+            label = "base-" + datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+            if os.path.exists(os.path.join(path, label)):
+                # A forced rebase within the same second as the previous one.
+                label = f"{label}-{len(catalog.chain)}"
+            base_dir = os.path.join(path, label)
+            run_pg_basebackup(
+                self.priority + ["pg_basebackup"] + connection_args, base_dir, self._pg_env()
+            )
+            members = [os.path.join(base_dir, name) for name in sorted(os.listdir(base_dir))]
+            with ThreadPoolExecutor() as executor:
+                files = list(executor.map(pack, members))
+            catalog.add("base", files, label=label)
+            new_files.extend(files)
+            logger.info(f"Base backup {label} saved to {base_dir}")
+
+        end_lsn = switch_wal(self.connection)
+        incoming_dir = os.path.join(path, INCOMING_WAL_DIR)
+        run_pg_receivewal(
+            self.priority + ["pg_receivewal"] + connection_args,
+            incoming_dir,
+            catalog.slot,
+            end_lsn,
+            self._pg_env(),
+        )
+
+        wal_dir = os.path.join(path, "wal")
+        os.makedirs(wal_dir, exist_ok=True)
+        segments = []
+        for name in completed_segments(incoming_dir):
+            shutil.move(os.path.join(incoming_dir, name), os.path.join(wal_dir, name))
+            segments.append(os.path.join(wal_dir, name))
+        with ThreadPoolExecutor() as executor:
+            files = list(executor.map(pack, segments))
+        if files:
+            size = sum(os.path.getsize(os.path.join(path, name)) for name in files)
+            catalog.add("wal", files, end_lsn=end_lsn, bytes=size)
+        new_files.extend(files)
+        logger.info(f"Shipped {len(files)} WAL segments up to {end_lsn}")
+
+        return new_files + [CATALOG_FILE]
+
+    def _handle_storage(
+        self, file_path, storage, provider, bucket, logger, metrics=None, counts=None
+    ):
         """
         Handle the storage of the backup file.
 
         Args:
-            file_path (str): The file path to store.
+            file_path (str): The file path to store. A directory is uploaded
+                file by file under a prefix named after it.
             storage (str): Storage type ('local' or 'cloud').
             provider (str, optional): Cloud provider ('aws', 'gcp', 'azure').
             bucket (str, optional): Cloud bucket name.
+            metrics (RunMetrics, optional): Collects per-stage metrics.
+            counts (dict, optional): Row counts of the tables for the manifest.
         """
+        metrics = metrics or RunMetrics("backup")
         if storage == "cloud":
             if not provider or not bucket:
                 raise ValueError(
                     "Cloud provider and bucket name are required for cloud storage."
                 )
-            self._upload_to_cloud(file_path, provider, bucket, logger)
+            size = path_size(file_path)
+            with metrics.stage("upload", size) as stage:
+                if os.path.isdir(file_path):
+                    prefix = os.path.basename(os.path.normpath(file_path))
+                    self._upload_files(
+                        [
+                            (os.path.join(file_path, name), f"{prefix}/{name}")
+                            for name in sorted(os.listdir(file_path))
+                        ],
+                        provider,
+                        bucket,
+                        logger,
+                    )
+                else:
+                    self._upload_to_cloud(file_path, provider, bucket, logger)
+                stage.bytes_out = size
+            self._write_manifest(
+                file_path, storage, provider, bucket, logger, metrics, counts
+            )
         elif storage == "local":
+            # The backup was written at its destination already.
             logger.info(f"Backup stored locally at {file_path}")
+            self._write_manifest(
+                file_path, storage, provider, bucket, logger, metrics, counts
+            )
         else:
             raise ValueError("Unsupported storage type. Choose 'local' or 'cloud'.")
 
-    def _upload_to_cloud(self, file_path, provider, bucket, logger):
+    def _write_manifest(
+        self, file_path, storage, provider, bucket, logger, metrics, counts=None
+    ):
+        """
+        Hash the stored backup file or directory and write its sidecar
+        manifest next to it, and next to its upload for cloud storage.
+        """
+        size = path_size(file_path)
+        with metrics.stage("hash", size) as stage:
+            write_backup_manifest(
+                file_path, storage, provider, bucket, logger, counts=counts
+            )
+            stage.bytes_out = size
+
+    def _upload_to_cloud(self, file_path, provider, bucket, logger, object_name=None):
         """
         Upload the backup file to the cloud.
 
@@ -151,86 +973,107 @@ class PostgresHandler:
             file_path (str): Path to the file to upload.
             provider (str): Cloud provider ('aws', 'gcp', 'azure').
             bucket (str): Cloud bucket name.
+            object_name (str, optional): Object name; the file name if None.
+        """
+        self._upload_files(
+            [(file_path, object_name or os.path.basename(file_path))],
+            provider,
+            bucket,
+            logger,
+        )
+
+    def _upload_files(self, files, provider, bucket, logger):
+        """
+        Upload files to the cloud concurrently on one event loop.
+
+        Args:
+            files (list): ``(file_path, object_name)`` pairs.
+            provider (str): Cloud provider ('aws', 'gcp', 'azure').
+            bucket (str): Cloud bucket name.
         """
         try:
-            if provider == "aws":
-                store_on_s3(file_path, bucket, logger)
-            elif provider == "gcp":
-                store_on_gcp(file_path, bucket, logger)
-            elif provider == "azure":
-                store_on_azure(file_path, bucket, logger)
-            else:
-                raise ValueError("Unsupported cloud provider.")
-            logger.info(f"Backup uploaded to {provider} bucket '{bucket}'")
+            upload_files(get_backend(provider, bucket, logger=logger), files)
+            logger.info(f"Uploaded {len(files)} files to {provider} bucket '{bucket}'")
 
         except Exception as e:
             logger.error(f"Failed to upload backup to cloud: {e}")
             raise RuntimeError(f"Error uploading to cloud: {e}")
 
-    def restore(self, backup_file, logger):
+    def _stream_to_cloud(self, chunks, object_name, provider, bucket, logger):
+        """
+        Stream the backup to the cloud.
+
+        Args:
+            chunks (iterable): Iterator yielding the backup bytes.
+            object_name (str): Name of the object to create.
+            provider (str): Cloud provider ('aws', 'gcp', 'azure').
+            bucket (str): Cloud bucket name.
+        """
+        try:
+            get_provider(provider).stream(chunks, bucket, object_name, logger)
+            logger.info(f"Backup streamed to {provider} bucket '{bucket}'")
+
+        except Exception as e:
+            logger.error(f"Failed to stream backup to cloud: {e}")
+            raise RuntimeError(f"Error streaming to cloud: {e}")
+
+    def restore(
+        self, backup_file, logger, jobs=None, include=None, exclude=None, metrics=None,
+        no_owner=False,
+    ):
         """
         Restore the PostgreSQL database from a backup file.
 
+        Backups are streamed from storage through decryption and
+        decompression straight into pg_restore or psql, without temporary
+        copies.
+
         Args:
-            backup_file (str): The path to the backup file.
+            backup_file (str): The path or cloud location (``s3://``,
+                ``gs://``, ``az://``) of the backup file, the directory of a
+                directory-format or objects-format backup (or its
+                ``index.json``), a ``.dbk`` container, or a repository
+                snapshot manifest.
+            jobs (int, optional): Parallel pg_restore jobs for a
+                directory-format or objects-format backup; the CPU count if None.
+            include (list, optional): Only restore tables matching these
+                patterns from an objects-format backup.
+            exclude (list, optional): Skip tables matching these patterns.
+            metrics (RunMetrics, optional): Collects per-stage metrics of
+                the run.
+            no_owner (bool): Skip restoring object ownership and privileges,
+                for servers that lack the backed-up database's roles.
         """
+        metrics = metrics or RunMetrics("restore")
+        options = ["--no-owner", "--no-privileges"] if no_owner else []
         try:
             logger.info("Starting restore...")
 
-            # Decrypt the backup file
-            logger.info("Decrypting the backup file...")
-            backup_file = decrypt_file(backup_file)
-            logger.info(f"Decrypted file available at {backup_file}")
+            index = index_location(backup_file)
+            if index:
+                self._restore_objects(
+                    index, logger, jobs, include, exclude, metrics, options
+                )
+                logger.info("Restore successful.")
+                return
+            if include or exclude:
+                raise ValueError("Table filters need an objects-format backup.")
 
-            # Decompress the backup file
-            decompressed_file = decompress_backup_file(backup_file)
+            if os.path.isdir(backup_file):
+                self._restore_directory(backup_file, logger, jobs, options)
+                logger.info("Restore successful.")
+                return
 
-            # Ensure pg_restore is available
-            if not shutil.which("pg_restore"):
-                raise FileNotFoundError(
-                    "pg_restore command not found. Ensure it is installed and in your PATH."
-                )
-
-            # Determine the appropriate command based on file extension
-            if decompressed_file.endswith(".sql"):
-                # Restore plain SQL file using psql
-                command = [
-                    "psql",
-                    "-h",
-                    self.config["host"],
-                    "-p",
-                    str(self.config["port"]),
-                    "-U",
-                    self.config["user"],
-                    "-d",
-                    self.config["dbname"],
-                    "-f",
-                    decompressed_file,
-                ]
-            elif decompressed_file.endswith(".dump") or decompressed_file.endswith(
-                ".backup"
-            ):
-                # Restore custom format file using pg_restore
-                command = [
-                    "pg_restore",
-                    "-h",
-                    self.config["host"],
-                    "-p",
-                    str(self.config["port"]),
-                    "-U",
-                    self.config["user"],
-                    "-d",
-                    self.config["dbname"],
-                    "-v",
-                    decompressed_file,
-                ]
+            if is_snapshot(backup_file):
+                chunks = read_snapshot(backup_file)
+            elif is_container(backup_file):
+                chunks = read_container_member(backup_file)
             else:
-                raise ValueError(
-                    "Unsupported backup file format. Use .sql, .dump, or .backup files."
-                )
-
-            # Run the restore command
-            subprocess.run(command, check=True)
+                chunks = open_location(backup_file)
+            source = "download" if parse_location(backup_file) else "read"
+            self._restore_stream(
+                metrics.meter(source, chunks), logger, options, metrics=metrics
+            )
             logger.info("Restore successful.")
         except subprocess.CalledProcessError as e:
             logger.error(f"Restore failed with error code {e.returncode}.")
@@ -238,3 +1081,154 @@ class PostgresHandler:
         except Exception as e:
             logger.error(f"An error occurred: {e}")
             raise RuntimeError(f"An error occurred during restore: {e}")
+
+    def _restore_stream(self, chunks, logger, options=None, metrics=None):
+        """
+        Decrypt and decompress a stored backup on the fly and pipe it into
+        pg_restore (custom format) or psql (plain SQL).
+
+        Args:
+            chunks (iterable): Iterator yielding the stored backup bytes.
+            options (list, optional): Extra pg_restore arguments.
+            metrics (RunMetrics, optional): Collects per-stage metrics.
+        """
+        metrics = metrics or RunMetrics("restore")
+        source = chunks if isinstance(chunks, Meter) else None
+        chunks = unpack_stream(chunks)
+        head, chunks = peek(chunks, 512)
+        if is_tar_header(head):
+            # Backups compressed with tar hold the dump as their only file.
+            chunks = tar_member_stream(chunks)
+            head, chunks = peek(chunks, 5)
+
+        if head.startswith(b"PGDMP"):
+            # Restore custom format file using pg_restore
+            tool = "pg_restore"
+            extra_args = ["-v"] + (options or [])
+        else:
+            # Restore plain SQL file using psql
+            tool = "psql"
+            extra_args = []
+        if not shutil.which(tool):
+            raise FileNotFoundError(
+                f"{tool} command not found. Ensure it is installed and in your PATH."
+            )
+        command = [
+            tool,
+            "-h",
+            self.config["host"],
+            "-p",
+            str(self.config["port"]),
+            "-U",
+            self.config["user"],
+            "-d",
+            self.config["dbname"],
+        ] + extra_args
+        logger.info(f"Streaming backup into {tool}...")
+        chunks = metrics.meter("unpack", chunks, upstream=source)
+        with metrics.sink("restore", chunks):
+            feed_command(command, chunks, env=self._pg_env())
+
+    def _restore_objects(
+        self, location, logger, jobs=None, include=None, exclude=None, metrics=None,
+        options=None,
+    ):
+        """
+        Restore an objects-format backup by streaming its members into
+        pg_restore.
+
+        A full restore creates the schema and loads the large objects and
+        sequence values, loads all tables in parallel and then builds indexes
+        and constraints. With filters only the members of
+        the matching tables are read; those tables are restored with their
+        indexes and constraints and must not exist in the database yet.
+
+        Args:
+            location (str): Location of the backup's index.
+            jobs (int, optional): Tables loaded at once; the CPU count if None.
+            include (list, optional): Only restore tables matching these patterns.
+            exclude (list, optional): Skip tables matching these patterns.
+            metrics (RunMetrics, optional): Collects per-stage metrics.
+            options (list, optional): Extra pg_restore arguments.
+        """
+        metrics = metrics or RunMetrics("restore")
+        source = "download" if parse_location(location) else "read"
+        index = read_index(location)
+        tables = [member for member in index["members"] if member["kind"] == "table"]
+        names = set(
+            select_objects(
+                [member["name"] for member in tables], _qualify(include), _qualify(exclude)
+            )
+        )
+        selected = [member for member in tables if member["name"] in names]
+        if not selected:
+            raise ValueError("No tables in the backup match the filters.")
+
+        def restore_member(member, sections):
+            self._restore_stream(
+                metrics.meter(source, open_location(member["location"])),
+                logger,
+                [f"--section={section}" for section in sections] + (options or []),
+                metrics,
+            )
+
+        if include or exclude:
+            data_sections, finishing = ["pre-data", "data"], selected
+        else:
+            schema = next(m for m in index["members"] if m["kind"] == "schema")
+            restore_member(schema, ["pre-data"])
+            restore_member(schema, ["data"])
+            data_sections, finishing = ["data"], [schema]
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+            list(executor.map(lambda member: restore_member(member, data_sections), selected))
+        # Indexes and foreign keys once all referenced tables are loaded.
+        for member in finishing:
+            restore_member(member, ["post-data"])
+        logger.info(f"Restored {len(selected)} tables from {location}")
+
+    def _restore_directory(self, backup_dir, logger, jobs=None, options=None):
+        """
+        Restore a directory-format backup with parallel pg_restore jobs.
+
+        Files are decrypted and decompressed in parallel next to the encrypted
+        ones; the plaintext copies are removed once pg_restore has finished.
+
+        Args:
+            backup_dir (str): The backup directory.
+            jobs (int, optional): Parallel jobs; the CPU count if None.
+            options (list, optional): Extra pg_restore arguments.
+        """
+        if not shutil.which("pg_restore"):
+            raise FileNotFoundError(
+                "pg_restore command not found. Ensure it is installed and in your PATH."
+            )
+        jobs = jobs or os.cpu_count() or 1
+        members = [
+            os.path.join(backup_dir, name) for name in sorted(os.listdir(backup_dir))
+        ]
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            restored = list(executor.map(unpack_file, members))
+        logger.info(f"Prepared {len(restored)} files in {backup_dir}")
+
+        try:
+            command = [
+                "pg_restore",
+                "-h",
+                self.config["host"],
+                "-p",
+                str(self.config["port"]),
+                "-U",
+                self.config["user"],
+                "-d",
+                self.config["dbname"],
+                "-v",
+                "-F",
+                "d",
+                "-j",
+                str(jobs),
+            ] + (options or []) + [backup_dir]
+            subprocess.run(command, check=True, env=self._pg_env())
+        finally:
+            for file_path in restored:
+                if file_path not in members:
+                    os.remove(file_path)
@@ -0,0 +1,259 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import tarfile
+from datetime import datetime, timezone
+from utils.packing import unpack_file
+
+CATALOG_FILE = "catalog.json"
+INCOMING_WAL_DIR = "wal_incoming"
+WAL_SEGMENT_PATTERN = re.compile(r"^[0-9A-F]{24}$")
+
+
+class WalCatalog:
+    """
+    Record of the base backups and WAL increments in an archive directory.
+
+    The catalog is a JSON file holding the replication slot name and the
+    chain of entries, oldest first. Base entries list the files of a
+    ``pg_basebackup``; WAL entries list the segments shipped by one run.
+    """
+
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        self.path = os.path.join(archive_dir, CATALOG_FILE)
+        self.slot = None
+        self.chain = []
+        if os.path.exists(self.path):
+            with open(self.path, "r") as file:
+                state = json.load(file)
+            self.slot = state["slot"]
+            self.chain = state["chain"]
+
+    def save(self):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"slot": self.slot, "chain": self.chain}, file, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add(self, entry_type, files, **fields):
+        entry = {
+            "type": entry_type,
+            "time": datetime.now(timezone.utc).isoformat(),
+            "files": files,
+        }
+        entry.update(fields)
+        self.chain.append(entry)
+        self.save()
+        return entry
+
+    def _entry_bytes(self, entry):
+        if "bytes" in entry:
+            return entry["bytes"]
+        # Entries written before sizes were recorded; files shipped to the
+        # cloud and removed locally are not counted.
+        paths = [os.path.join(self.archive_dir, name) for name in entry["files"]]
+        return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+    def base_due(self, now, max_age_days=None, max_wal_bytes=None):
+        """
+        Why a new base backup should be taken, so that recovery does not
+        replay an ever longer WAL chain.
+
+        Args:
+            now (datetime): Current time, timezone-aware.
+            max_age_days (float, optional): Maximum age of the latest base.
+            max_wal_bytes (int, optional): Maximum size of the archived WAL
+                since the latest base.
+
+        Returns:
+            str: The reason, or None if the latest base is still current.
+        """
+        bases = [index for index, entry in enumerate(self.chain) if entry["type"] == "base"]
+        if not bases:
+            return "no base backup yet"
+        latest = self.chain[bases[-1]]
+        age = now - _parse_time(latest["time"])
+        if max_age_days is not None and age.total_seconds() > max_age_days * 86400:
+            return f"base backup {latest.get('label')} is {age.days} days old"
+        if max_wal_bytes is not None:
+            wal_bytes = sum(self._entry_bytes(entry) for entry in self.chain[bases[-1] + 1 :])
+            if wal_bytes > max_wal_bytes:
+                return f"{wal_bytes} bytes of WAL archived since base backup {latest.get('label')}"
+        return None
+
+    def entries_for(self, target_time):
+        """
+        Select the entries needed to recover to ``target_time``: the latest
+        base taken before it and the WAL increments that follow, up to and
+        including the first one recorded after the target.
+
+        Raises:
+            ValueError: If no base backup precedes the target time.
+        """
+        base_index = None
+        for index, entry in enumerate(self.chain):
+            if entry["type"] == "base" and _parse_time(entry["time"]) <= target_time:
+                base_index = index
+        if base_index is None:
+            raise ValueError("No base backup was taken before the requested time.")
+
+        selected = [self.chain[base_index]]
+        for entry in self.chain[base_index + 1 :]:
+            if entry["type"] == "base":
+                continue
+            selected.append(entry)
+            if _parse_time(entry["time"]) >= target_time:
+                break
+        return selected
+
+
+def _parse_time(value):
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def slot_name(dbname):
+    """
+    Replication slot name used for an archive of ``dbname``.
+    """
+    return "dbbackup_" + re.sub(r"[^a-z0-9_]", "_", dbname.lower())
+
+
+def ensure_slot(connection, slot):
+    """
+    Create the physical replication slot if it does not exist yet.
+
+    The slot reserves WAL immediately, so nothing written after the base
+    backup starts can be recycled before it has been shipped.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_replication_slots WHERE slot_name = %s", (slot,)
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(
+                "SELECT pg_create_physical_replication_slot(%s, true)", (slot,)
+            )
+    connection.commit()
+
+
+def switch_wal(connection):
+    """
+    Close the current WAL segment so it can be shipped.
+
+    Returns:
+        str: The current WAL insert position after the switch.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_switch_wal()")
+        cursor.execute("SELECT pg_current_wal_lsn()")
+        lsn = cursor.fetchone()[0]
+    connection.commit()
+    return lsn
+
+
+def completed_segments(wal_dir):
+    """
+    List completed WAL segment files received into ``wal_dir``.
+    """
+    if not os.path.isdir(wal_dir):
+        return []
+    return sorted(name for name in os.listdir(wal_dir) if WAL_SEGMENT_PATTERN.match(name))
+
+
+def restore_point_in_time(archive_dir, target_time, data_dir, logger):
+    """
+    Prepare a data directory that recovers to ``target_time`` when started.
+
+    The base backup is extracted into ``data_dir``, the WAL segments of the
+    following increments are unpacked into ``data_dir/wal_restore`` and
+    recovery is configured with ``recovery_target_time``.
+
+    Args:
+        archive_dir (str): Directory holding the catalog and backup files.
+        target_time (str): ISO 8601 timestamp to recover to.
+        data_dir (str): Empty or missing directory for the restored cluster.
+        logger: Logger instance for logging.
+    """
+    catalog = WalCatalog(archive_dir)
+    if not catalog.chain:
+        raise FileNotFoundError(f"No WAL backup catalog found in {archive_dir}.")
+    if os.path.isdir(data_dir) and os.listdir(data_dir):
+        raise ValueError(f"Data directory '{data_dir}' is not empty.")
+
+    target = _parse_time(target_time)
+    base, *increments = catalog.entries_for(target)
+    os.makedirs(data_dir, mode=0o700, exist_ok=True)
+
+    for name in base["files"]:
+        tar_path = unpack_file(os.path.join(archive_dir, name))
+        try:
+            # pg_wal.tar and tablespace archives are not produced with -X none.
+            if os.path.basename(tar_path) == "base.tar":
+                with tarfile.open(tar_path, "r") as tar:
+                    tar.extractall(path=data_dir)
+        finally:
+            if tar_path != os.path.join(archive_dir, name):
+                os.remove(tar_path)
+    logger.info(f"Base backup from {base['time']} extracted to {data_dir}")
+
+    wal_dir = os.path.join(os.path.abspath(data_dir), "wal_restore")
+    os.makedirs(wal_dir, exist_ok=True)
+    segments = 0
+    for entry in increments:
+        for name in entry["files"]:
+            archived = os.path.join(archive_dir, name)
+            segment = unpack_file(archived)
+            target_path = os.path.join(wal_dir, os.path.basename(segment))
+            if segment == archived:
+                # Stored as is: copy it, the archive must keep its segment.
+                shutil.copyfile(segment, target_path)
+            else:
+                shutil.move(segment, target_path)
+            segments += 1
+    logger.info(f"Unpacked {segments} WAL segments to {wal_dir}")
+
+    with open(os.path.join(data_dir, "postgresql.auto.conf"), "a") as conf:
+        conf.write(f"restore_command = 'cp \"{wal_dir}/%f\" \"%p\"'\n")
+        conf.write(f"recovery_target_time = '{target.isoformat()}'\n")
+        conf.write("recovery_target_action = 'promote'\n")
+    open(os.path.join(data_dir, "recovery.signal"), "w").close()
+    logger.info(
+        f"Recovery to {target.isoformat()} configured. Start PostgreSQL on {data_dir} to replay WAL."
+    )
+    return data_dir
+
+
+def run_pg_basebackup(command_prefix, base_dir, env):
+    """
+    Take a tar-format base backup without WAL into ``base_dir``.
+    """
+    command = command_prefix + ["-D", base_dir, "-F", "t", "-X", "none", "-c", "fast", "-v"]
+    subprocess.run(command, check=True, env=env)
+
+
+def run_pg_receivewal(command_prefix, wal_dir, slot, end_lsn, env):
+    """
+    Receive WAL from the slot up to ``end_lsn`` into ``wal_dir``.
+
+    With an empty directory pg_receivewal starts at the slot's restart
+    position (PostgreSQL 15+), so shipped segments can be removed locally.
+    """
+    os.makedirs(wal_dir, exist_ok=True)
+    command = command_prefix + [
+        "-D",
+        wal_dir,
+        "-S",
+        slot,
+        "--endpos",
+        end_lsn,
+        "--no-loop",
+        "-v",
+    ]
+    subprocess.run(command, check=True, env=env)
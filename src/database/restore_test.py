@@ -0,0 +1,174 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from database.ephemeral import ephemeral_server
+from storage.manifest import load_manifest
+from storage.providers import parse_location
+from utils.metrics import RunMetrics
+
+# Restore tests run at once; each starts its own server.
+DEFAULT_RESTORE_TEST_PARALLEL = 2
+
+
+def compare_counts(expected, actual, tolerance=0.0):
+    """
+    Compare the object counts of a restored database with those recorded at
+    backup time.
+
+    Args:
+        expected (dict): Recorded count of each table or collection.
+        actual (dict): Count of each table or collection after the restore.
+        tolerance (float): Allowed relative difference, e.g. 0.01 for 1%,
+            for backups of databases written to while they were dumped.
+
+    Returns:
+        list: One ``{"name", "expected", "actual"}`` entry per object whose
+        count is off or that is missing, sorted by name.
+    """
+    mismatches = []
+    for name, count in sorted(expected.items()):
+        restored = actual.get(name)
+        if restored is None or abs(restored - count) > tolerance * count:
+            mismatches.append({"name": name, "expected": count, "actual": restored})
+    return mismatches
+
+
+def pick_location(locations):
+    """
+    The copy of a backup to restore from: a local one that still exists,
+    otherwise the first cloud copy, or None.
+    """
+    for location in locations:
+        if not parse_location(location) and os.path.exists(location):
+            return location
+    return next((location for location in locations if parse_location(location)), None)
+
+
+def run_restore_test(
+    db_type, location, database, logger, jobs=None, tolerance=0.0, bin_dir=None,
+    host=None,
+):
+    """
+    Restore a backup into a throwaway local server and check it.
+
+    The backup is restored with the handler's streaming and parallel restore
+    path. The restore time, without the server start, is reported as the
+    recovery time objective. If the backup's manifest recorded object counts,
+    the restored tables or collections are counted and compared with them.
+
+    Args:
+        db_type (str): 'postgres' or 'mongo'.
+        location (str): Path or cloud location of the backup.
+        database (str): Name of the backed-up database.
+        logger: Logger instance for logging.
+        jobs (int, optional): Parallel restore jobs; the CPU count if None.
+        tolerance (float): See ``compare_counts``.
+        bin_dir (str, optional): Directory holding the server binaries.
+        host (str, optional): Host the backup was taken from, for the report.
+
+    Returns:
+        dict: The report, with ``status`` 'passed', 'failed' (counts differ)
+        or 'error', ``rto_seconds``, the number of objects ``checked``, the
+        ``mismatches``, the restore ``stages`` and any ``error``.
+    """
+    report = {
+        "db_type": db_type,
+        "host": host,
+        "database": database,
+        "location": location,
+        "status": "passed",
+        "rto_seconds": None,
+        "checked": 0,
+        "mismatches": [],
+        "stages": [],
+        "error": None,
+    }
+    try:
+        if not location:
+            raise RuntimeError("No copy of the backup is left.")
+        try:
+            expected = load_manifest(location).get("counts")
+        except RuntimeError:
+            expected = None
+        if expected is None:
+            logger.warning(f"No object counts recorded for {location}; only restoring it.")
+        metrics = RunMetrics("restore", {"db_type": db_type, "database": database})
+        with ephemeral_server(db_type, database, bin_dir) as handler:
+            options = {"no_owner": True} if db_type == "postgres" else {}
+            started = time.perf_counter()
+            handler.restore(location, logger, jobs=jobs, metrics=metrics, **options)
+            report["rto_seconds"] = round(time.perf_counter() - started, 3)
+            metrics.finish("success", location)
+            report["stages"] = metrics.report()["stages"]
+            handler.connect(logger)
+            try:
+                actual = handler.object_counts()
+            finally:
+                handler.close(logger)
+        if expected is not None:
+            report["checked"] = len(expected)
+            report["mismatches"] = compare_counts(expected, actual, tolerance)
+            if report["mismatches"]:
+                report["status"] = "failed"
+        logger.info(
+            f"Restore test of {location} {report['status']}: restored in "
+            f"{report['rto_seconds']}s, {len(actual)} objects, "
+            f"{len(report['mismatches'])} count mismatches"
+        )
+    except Exception as e:
+        report.update(status="error", error=str(e))
+        logger.error(f"Restore test of {location} failed: {e}")
+    return report
+
+
+def run_restore_tests(
+    targets, logger, parallel=DEFAULT_RESTORE_TEST_PARALLEL, jobs=None, tolerance=0.0,
+    bin_dir=None,
+):
+    """
+    Run restore tests on a worker pool.
+
+    Args:
+        targets (list): Dicts with the ``db_type``, ``database``,
+            ``location`` and optionally ``host`` of each backup to test.
+        logger: Logger instance for logging.
+        parallel (int): Tests run at once.
+        jobs (int, optional): Parallel restore jobs of each test.
+        tolerance (float): See ``compare_counts``.
+        bin_dir (str, optional): Directory holding the server binaries.
+
+    Returns:
+        list: One ``run_restore_test`` report per target, in input order.
+    """
+
+    def test(target):
+        return run_restore_test(
+            target["db_type"],
+            target["location"],
+            target["database"],
+            logger,
+            jobs,
+            tolerance,
+            bin_dir,
+            target.get("host"),
+        )
+
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        return list(executor.map(test, targets))
+
+
+def catalog_targets(catalog, database=None, db_type=None):
+    """
+    Restore test targets for the latest backup of every database in the
+    catalog, each with its ``backup_id``.
+    """
+    return [
+        {
+            "backup_id": backup["id"],
+            "db_type": backup["db_type"],
+            "host": backup["host"],
+            "database": backup["database"],
+            "location": pick_location(backup["locations"]),
+        }
+        for backup in catalog.latest_per_database(database, db_type)
+    ]
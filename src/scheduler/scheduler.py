@@ -0,0 +1,345 @@
+import json
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from database.jobs import run_backup_job
+from utils.profiles import connection_profile, resolve_connection
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_PER_HOST = 1
+DEFAULT_POLL_INTERVAL = 30
+
+_FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+_MONTH_NAMES = ["jan", "feb", "mar", "apr", "may", "jun",
+                "jul", "aug", "sep", "oct", "nov", "dec"]
+_DAY_NAMES = ["sun", "mon", "tue", "wed", "thu", "fri", "sat"]
+_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+}
+
+
+def _parse_value(value, index):
+    value = value.lower()
+    if index == 3 and value in _MONTH_NAMES:
+        return _MONTH_NAMES.index(value) + 1
+    if index == 4 and value in _DAY_NAMES:
+        return _DAY_NAMES.index(value)
+    return int(value)
+
+
+def _parse_field(field, index):
+    low, high = _FIELD_RANGES[index]
+    values = set()
+    for part in field.split(","):
+        part, _, step = part.partition("/")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (_parse_value(v, index) for v in part.split("-", 1))
+        else:
+            start = _parse_value(part, index)
+            end = high if step else start
+        if not (low <= start <= end <= high):
+            raise ValueError(f"Cron field '{field}' is out of range {low}-{high}.")
+        values.update(range(start, end + 1, int(step) if step else 1))
+    if index == 4 and 7 in values:
+        # Sunday may be written as 0 or 7.
+        values.discard(7)
+        values.add(0)
+    return values
+
+
+class CronSchedule:
+    """
+    A standard five-field cron expression (minute, hour, day of month,
+    month, day of week), including ranges, steps, lists, month and day names,
+    and the ``@daily``-style aliases.
+
+    As in cron, when both day fields are restricted a day matches if either
+    of them does; a day field starting with ``*``, such as ``*/2``, is
+    unrestricted.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = _ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Invalid cron expression '{expression}'.")
+        try:
+            (
+                self.minutes,
+                self.hours,
+                self.days,
+                self.months,
+                self.weekdays,
+            ) = (_parse_field(field, i) for i, field in enumerate(fields))
+        except ValueError as e:
+            raise ValueError(f"Invalid cron expression '{expression}': {e}")
+        self._any_day = fields[2].startswith("*")
+        self._any_weekday = fields[4].startswith("*")
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        # datetime counts Monday as 0, cron counts Sunday as 0.
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment):
+        """
+        First matching minute strictly after ``moment``.
+
+        Raises:
+            ValueError: If nothing matches within five years (e.g. 30 February).
+        """
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=5 * 366)
+        while moment < limit:
+            if moment.month not in self.months:
+                year, month = divmod(moment.month, 12)
+                moment = moment.replace(
+                    year=moment.year + year, month=month + 1, day=1, hour=0, minute=0
+                )
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression '{self.expression}' never matches.")
+
+
+class JobState:
+    """
+    Persisted run state of the scheduled jobs, keyed by job name.
+
+    Each entry holds the next planned run, so runs that fell due while the
+    scheduler was stopped can be detected on restart, and the outcome of the
+    last run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.jobs = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                self.jobs = json.load(file)
+
+    def get(self, name):
+        return self.jobs.setdefault(name, {})
+
+    def update(self, name, **fields):
+        with self._lock:
+            self.jobs.setdefault(name, {}).update(fields)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(self.jobs, file, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+class Job:
+    """
+    A scheduled backup job from the jobs file.
+
+    Args:
+        spec (dict): Job definition with ``name``, ``schedule`` (a cron
+            expression), ``db_type``, ``connection`` (handler parameters)
+            and ``backup`` (keyword arguments for the handler's ``backup``).
+            ``profile`` names a connection profile that supplies defaults
+            for ``db_type``, ``connection`` and ``backup``; its secrets are
+            resolved once, when the job is loaded. ``host_group`` optionally
+            overrides the connection host for the per-host limit, e.g. for
+            several ports on one server.
+    """
+
+    def __init__(self, spec):
+        profile = {"db_type": None, "connection": {}, "backup": {}}
+        if spec.get("profile"):
+            profile = connection_profile(spec["profile"])
+        required = ("name", "schedule") if spec.get("profile") else (
+            "name", "schedule", "db_type", "connection"
+        )
+        for key in required:
+            if key not in spec:
+                raise ValueError(f"Job {spec.get('name', '?')} is missing '{key}'.")
+        self.name = spec["name"]
+        self.schedule = CronSchedule(spec["schedule"])
+        self.db_type = spec.get("db_type", profile["db_type"])
+        if not self.db_type:
+            raise ValueError(f"Job {self.name} is missing 'db_type'.")
+        self.connection = resolve_connection(
+            dict(profile["connection"], **spec.get("connection", {}))
+        )
+        self.options = dict(profile["backup"], **spec.get("backup", {}))
+        self.host = spec.get("host_group", self.connection.get("host"))
+
+
+class Scheduler:
+    """
+    Long-running scheduler that takes backups according to a jobs file.
+
+    Due jobs run on a bounded worker pool. At most ``max_per_host`` jobs run
+    against the same database host at once; further due jobs for that host
+    wait in the queue without holding a worker. A job that is still running
+    when it falls due again is not started twice.
+
+    The next planned run of every job is persisted to the state file. On
+    restart, a job whose planned run passed while the scheduler was stopped
+    runs once immediately if ``catch_up`` is true (the default); otherwise
+    its missed runs are skipped.
+
+    Args:
+        jobs_file (str): Path to the JSON jobs file.
+        logger: Logger instance for logging.
+        run_job (callable, optional): ``(db_type, connection, options, logger)``
+            function running one backup.
+    """
+
+    def __init__(self, jobs_file, logger, run_job=run_backup_job):
+        with open(jobs_file, "r") as file:
+            config = json.load(file)
+        self.logger = logger
+        self.run_job = run_job
+        self.jobs = [Job(spec) for spec in config["jobs"]]
+        names = [job.name for job in self.jobs]
+        if len(set(names)) != len(names):
+            raise ValueError("Job names in the jobs file must be unique.")
+        self.max_workers = config.get("max_workers", DEFAULT_MAX_WORKERS)
+        self.max_per_host = config.get("max_per_host", DEFAULT_MAX_PER_HOST)
+        self.catch_up = config.get("catch_up", True)
+        state_file = config.get(
+            "state_file", os.path.splitext(jobs_file)[0] + ".state.json"
+        )
+        self.state = JobState(state_file)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._queue = []
+        self._running = set()
+        self._host_load = {}
+        self._next_run = {}
+
+    def _plan(self, now):
+        """
+        Work out each job's next run, queueing missed runs for catch-up.
+        """
+        for job in self.jobs:
+            planned = self.state.get(job.name).get("next_run")
+            if planned and datetime.fromisoformat(planned) <= now:
+                if self.catch_up:
+                    self.logger.info(f"Job {job.name} missed its run at {planned}; running it now.")
+                    self._queue.append(job)
+                else:
+                    self.logger.info(f"Job {job.name} missed its run at {planned}; skipping it.")
+            self._schedule_next(job, now)
+
+    def _schedule_next(self, job, now):
+        next_run = job.schedule.next_after(now)
+        self._next_run[job.name] = next_run
+        self.state.update(job.name, next_run=next_run.isoformat())
+
+    def _enqueue_due(self, now):
+        for job in self.jobs:
+            if self._next_run[job.name] > now:
+                continue
+            with self._lock:
+                busy = job in self._queue or job.name in self._running
+                if not busy:
+                    self._queue.append(job)
+            if busy:
+                self.logger.warning(
+                    f"Job {job.name} is still queued or running; skipping this run."
+                )
+            self._schedule_next(job, now)
+
+    def _dispatch(self, executor):
+        """
+        Start queued jobs while workers and host slots are free.
+        """
+        with self._lock:
+            for job in list(self._queue):
+                if len(self._running) >= self.max_workers:
+                    break
+                if self._host_load.get(job.host, 0) >= self.max_per_host:
+                    continue
+                self._queue.remove(job)
+                self._running.add(job.name)
+                self._host_load[job.host] = self._host_load.get(job.host, 0) + 1
+                executor.submit(self._run, job)
+
+    def _run(self, job):
+        started = datetime.now()
+        self.logger.info(f"Job {job.name} started.")
+        try:
+            location = self.run_job(job.db_type, job.connection, job.options, self.logger)
+            self.state.update(
+                job.name,
+                last_run=started.isoformat(),
+                last_status="success",
+                last_location=location,
+                last_error=None,
+            )
+            self.logger.info(f"Job {job.name} finished: {location}")
+        except Exception as e:
+            self.state.update(
+                job.name,
+                last_run=started.isoformat(),
+                last_status="failed",
+                last_error=str(e),
+            )
+            self.logger.error(f"Job {job.name} failed: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(job.name)
+                self._host_load[job.host] -= 1
+            self._wakeup.set()
+
+    def stop(self, *args):
+        """
+        Stop starting new jobs; running jobs are allowed to finish.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+
+    def run(self, poll_interval=DEFAULT_POLL_INTERVAL):
+        """
+        Run until stopped by SIGINT or SIGTERM.
+
+        Args:
+            poll_interval (int): Maximum seconds between checks for due jobs.
+        """
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        self._plan(datetime.now())
+        self.logger.info(
+            f"Scheduler started with {len(self.jobs)} jobs, "
+            f"{self.max_workers} workers and {self.max_per_host} per host."
+        )
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while not self._stopping.is_set():
+                now = datetime.now()
+                self._enqueue_due(now)
+                self._dispatch(executor)
+                next_due = min(self._next_run.values(), default=None)
+                timeout = poll_interval
+                if next_due is not None:
+                    timeout = min(poll_interval, max(0, (next_due - now).total_seconds()))
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+            self.logger.info("Scheduler stopping; waiting for running jobs to finish.")
+        self.logger.info("Scheduler stopped.")
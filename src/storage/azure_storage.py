@@ -1,18 +1,140 @@
-import json
 from azure.storage.blob import BlobServiceClient # type: ignore
+from azure.core.pipeline.transport import RequestsTransport # type: ignore
 import os
+import requests
+from utils.checksums import base64_to_hex
+from utils.config import load_config
+from storage.clients import cached_client, max_connections
+from storage.multipart import AzureBlockUploader, upload_settings
+from utils.profiles import resolve_secret
+from utils.throttle import current_throttle
 
-config_path = "/Users/toheed/Projects/Database Backup Utility/src/config.json" 
-with open(config_path, 'r') as file:
-    config = json.load(file)
 
-def store_on_azure(file_path: str, bucket_name: str, logger):
+def _service_client():
+    config = load_config()
+    # A connection string can also point at a local Azurite emulator.
+    # It may be a secret reference such as env:AZURE_STORAGE_CONNECTION_STRING.
+    connection_string = resolve_secret(config['azure']['connection_string'])
+
+    def create():
+        size = max_connections(config)
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=size, pool_maxsize=size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return BlobServiceClient.from_connection_string(
+            connection_string, transport=RequestsTransport(session=session)
+        )
+
+    return cached_client('azure', (connection_string,), create)
+
+def _container_client(bucket_name: str):
+    return _service_client().get_container_client(bucket_name)
+
+def _blob_client(bucket_name: str, blob_name: str):
+    return _container_client(bucket_name).get_blob_client(blob_name)
+
+def store_on_azure(file_path: str, bucket_name: str, logger, object_name: str = None):
     try:
-        connection_string = config['azure']['connection_string']
-        blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-        blob_client = blob_service_client.get_blob_client(container=bucket_name, blob=file_path.split('/')[-1])
-        with open(file_path, "rb") as data:
-            blob_client.upload_blob(data)
+        object_name = object_name or file_path.split('/')[-1]
+        settings = upload_settings(load_config())
+        if os.path.getsize(file_path) > settings["part_size"]:
+            AzureBlockUploader(_container_client(bucket_name), **settings).upload(
+                file_path, bucket_name, object_name, logger
+            )
+        else:
+            throttle = current_throttle()
+            with open(file_path, "rb") as data:
+                if throttle:
+                    data = throttle.reader(data)
+                _blob_client(bucket_name, object_name).upload_blob(
+                    data, length=os.path.getsize(file_path)
+                )
         logger.info(f"Backup uploaded to Azure Blob Storage {bucket_name}")
     except Exception as e:
-        raise RuntimeError(f"Error uploading backup to Azure Blob Storage: {e}")
\ No newline at end of file
+        raise RuntimeError(f"Error uploading backup to Azure Blob Storage: {e}")
+
+def stream_to_azure(chunks, bucket_name: str, object_name: str, logger):
+    """
+    Upload a stream of chunks to Azure Blob Storage as staged blocks.
+    """
+    try:
+        settings = upload_settings(load_config())
+        blob_client = _blob_client(bucket_name, object_name)
+        blob_client.upload_blob(chunks, max_concurrency=settings["concurrency"])
+        logger.info(f"Backup streamed to Azure Blob Storage {bucket_name} as {object_name}")
+    except Exception as e:
+        raise RuntimeError(f"Error streaming backup to Azure Blob Storage: {e}")
+
+def fetch_from_azure(bucket_name: str, object_name: str) -> bytes:
+    """
+    Download a small blob from Azure Blob Storage into memory.
+    """
+    try:
+        return _blob_client(bucket_name, object_name).download_blob().readall()
+    except Exception as e:
+        raise RuntimeError(f"Error downloading {object_name} from Azure Blob Storage: {e}")
+
+def read_range_from_azure(bucket_name: str, object_name: str, offset: int, length: int = None) -> bytes:
+    """
+    Read a byte range of a blob. A negative offset reads the last
+    ``-offset`` bytes; Azure needs the blob size for that.
+    """
+    try:
+        blob = _blob_client(bucket_name, object_name)
+        if offset < 0:
+            size = blob.get_blob_properties().size
+            offset, length = max(0, size + offset), None
+        return blob.download_blob(offset=offset, length=length).readall()
+    except Exception as e:
+        raise RuntimeError(f"Error reading {object_name} from Azure Blob Storage: {e}")
+
+def download_from_azure(bucket_name: str, object_name: str):
+    """
+    Yield a blob from Azure Blob Storage in chunks as it downloads.
+    """
+    try:
+        settings = upload_settings(load_config())
+        downloader = _blob_client(bucket_name, object_name).download_blob(
+            max_concurrency=settings["concurrency"]
+        )
+    except Exception as e:
+        raise RuntimeError(f"Error downloading {object_name} from Azure Blob Storage: {e}")
+    yield from downloader.chunks()
+
+def list_azure_objects(bucket_name: str, prefix: str = ""):
+    """
+    List the names of the blobs under a prefix.
+    """
+    try:
+        return [
+            blob.name
+            for blob in _container_client(bucket_name).list_blobs(name_starts_with=prefix or None)
+        ]
+    except Exception as e:
+        raise RuntimeError(f"Error listing Azure container {bucket_name}: {e}")
+
+def delete_from_azure(bucket_name: str, object_name: str):
+    """
+    Delete a blob from Azure Blob Storage.
+    """
+    try:
+        _blob_client(bucket_name, object_name).delete_blob()
+    except Exception as e:
+        raise RuntimeError(f"Error deleting {object_name} from Azure Blob Storage: {e}")
+
+def stat_azure_object(bucket_name: str, object_name: str):
+    """
+    Size of a blob and its Content-MD5, which Azure only keeps for blobs
+    uploaded in a single request, without downloading it.
+    """
+    try:
+        properties = _blob_client(bucket_name, object_name).get_blob_properties()
+    except Exception as e:
+        raise RuntimeError(f"Error reading {object_name} from Azure Blob Storage: {e}")
+    return {
+        "size": properties.size,
+        "etag": properties.etag,
+        "md5": base64_to_hex(properties.content_settings.content_md5),
+        "crc32c": None,
+    }
@@ -0,0 +1,251 @@
+import asyncio
+import contextvars
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from storage.clients import max_connections
+from storage.providers import get_provider
+from utils.config import load_config
+from utils.pipeline import read_chunks, write_stream
+
+# Local transfers need no connection pool; this bounds open files.
+LOCAL_TRANSFERS = 32
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _executor(name, workers):
+    # One pool per kind of backend for the whole process: the cloud SDKs
+    # block, so a bounded set of threads carries the transfers while any
+    # number of them are scheduled on the event loop.
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = _executors[name] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix=f"storage-{name}"
+            )
+        return executor
+
+
+class StorageBackend:
+    """
+    Asynchronous object storage.
+
+    Every backend stores named objects under one root (a bucket, or a local
+    directory) with the same coroutine interface, so transfers to any of
+    them can be overlapped on one event loop with ``asyncio.gather``.
+    """
+
+    concurrency = LOCAL_TRANSFERS
+
+    async def put(self, object_name, file_path):
+        """
+        Store a file as an object.
+
+        Returns:
+            str: Location of the stored object.
+        """
+        raise NotImplementedError
+
+    async def get(self, object_name, file_path):
+        """
+        Download an object into a file.
+
+        Returns:
+            int: Number of bytes written.
+        """
+        raise NotImplementedError
+
+    async def read_range(self, object_name, offset, length=None):
+        """
+        Read a byte range of an object. A negative offset reads the last
+        ``-offset`` bytes.
+        """
+        raise NotImplementedError
+
+    async def list(self, prefix=""):
+        """
+        List the names of the objects under a prefix.
+        """
+        raise NotImplementedError
+
+    async def delete(self, object_name):
+        """
+        Delete an object.
+        """
+        raise NotImplementedError
+
+    def location(self, object_name):
+        """
+        Location of an object, as accepted by ``restore``.
+        """
+        raise NotImplementedError
+
+    async def _run(self, function, *args):
+        # The caller's context travels along, so transfers are paced by the
+        # throttle of the job that started them.
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _executor(self.kind, self.concurrency),
+            contextvars.copy_context().run,
+            function,
+            *args,
+        )
+
+
+class LocalBackend(StorageBackend):
+    """
+    Objects stored as files below a local directory; object names may
+    contain ``/`` to create subdirectories.
+
+    Args:
+        root (str): Directory holding the objects.
+    """
+
+    kind = "local"
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, object_name):
+        path = os.path.join(self.root, object_name)
+        if not os.path.abspath(path).startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(f"Object name {object_name} points outside {self.root}.")
+        return path
+
+    def location(self, object_name):
+        return self._path(object_name)
+
+    def _put(self, object_name, file_path):
+        path = self._path(object_name)
+        if os.path.abspath(path) == os.path.abspath(file_path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Readers never see a half-copied file.
+        shutil.copyfile(file_path, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        return path
+
+    def _get(self, object_name, file_path):
+        with open(self._path(object_name), "rb") as file:
+            return write_stream(read_chunks(file), file_path)
+
+    def _read_range(self, object_name, offset, length):
+        with open(self._path(object_name), "rb") as file:
+            file.seek(offset, os.SEEK_END if offset < 0 else os.SEEK_SET)
+            return file.read() if length is None else file.read(length)
+
+    def _list(self, prefix):
+        if not os.path.isdir(self.root):
+            return []
+        names = (
+            os.path.relpath(os.path.join(root, name), self.root).replace(os.sep, "/")
+            for root, _, files in os.walk(self.root)
+            for name in files
+        )
+        return sorted(name for name in names if name.startswith(prefix))
+
+    async def put(self, object_name, file_path):
+        return await self._run(self._put, object_name, file_path)
+
+    async def get(self, object_name, file_path):
+        return await self._run(self._get, object_name, file_path)
+
+    async def read_range(self, object_name, offset, length=None):
+        return await self._run(self._read_range, object_name, offset, length)
+
+    async def list(self, prefix=""):
+        return await self._run(self._list, prefix)
+
+    async def delete(self, object_name):
+        await self._run(os.remove, self._path(object_name))
+
+
+class CloudBackend(StorageBackend):
+    """
+    Objects in a cloud bucket, through the provider's shared client.
+
+    The provider SDKs are blocking, so each transfer runs on a process-wide
+    thread pool sized like the client's connection pool; hundreds of
+    transfers can be awaited at once and are carried by that many threads.
+
+    Args:
+        provider (str): Cloud provider ('aws', 'gcp', 'azure').
+        bucket (str): Bucket or container name.
+        logger: Logger instance for logging.
+    """
+
+    def __init__(self, provider, bucket, logger=None):
+        self.provider = get_provider(provider)
+        self.kind = self.provider.name
+        self.bucket = bucket
+        self.logger = logger or logging.getLogger("BackupUtilityLogger")
+        self.concurrency = max_connections(load_config())
+
+    def location(self, object_name):
+        return f"{self.provider.scheme}://{self.bucket}/{object_name}"
+
+    def _get(self, object_name, file_path):
+        return write_stream(self.provider.download(self.bucket, object_name), file_path)
+
+    async def put(self, object_name, file_path):
+        await self._run(self.provider.store, file_path, self.bucket, self.logger, object_name)
+        return self.location(object_name)
+
+    async def get(self, object_name, file_path):
+        return await self._run(self._get, object_name, file_path)
+
+    async def read_range(self, object_name, offset, length=None):
+        return await self._run(
+            self.provider.read_range, self.bucket, object_name, offset, length
+        )
+
+    async def list(self, prefix=""):
+        return await self._run(self.provider.list_objects, self.bucket, prefix)
+
+    async def delete(self, object_name):
+        await self._run(self.provider.delete, self.bucket, object_name)
+
+
+def get_backend(provider=None, bucket=None, root=None, logger=None):
+    """
+    Build the backend for a cloud bucket, or for a local directory when no
+    provider is given.
+    """
+    if provider:
+        if not bucket:
+            raise ValueError("Cloud provider and bucket name are required for cloud storage.")
+        return CloudBackend(provider, bucket, logger)
+    return LocalBackend(root or ".")
+
+
+async def put_files(backend, files, concurrency=None):
+    """
+    Store many files at once.
+
+    Args:
+        backend (StorageBackend): Destination.
+        files (list): ``(file_path, object_name)`` pairs.
+        concurrency (int, optional): Transfers in flight; the backend's
+            pool size if None.
+
+    Returns:
+        list: Locations of the stored objects, in input order.
+    """
+    limit = asyncio.Semaphore(concurrency or backend.concurrency)
+
+    async def put(file_path, object_name):
+        async with limit:
+            return await backend.put(object_name, file_path)
+
+    return await asyncio.gather(*(put(path, name) for path, name in files))
+
+
+def upload_files(backend, files, concurrency=None):
+    """
+    Blocking wrapper around ``put_files`` for synchronous callers.
+    """
+    return asyncio.run(put_files(backend, files, concurrency))
@@ -0,0 +1,396 @@
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+from storage.providers import get_provider, parse_location
+from utils.compression import get_codec
+
+DEFAULT_CATALOG_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "database-backup-utility", "catalog.sqlite"
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    id INTEGER PRIMARY KEY,
+    db_type TEXT NOT NULL,
+    host TEXT,
+    database TEXT NOT NULL,
+    created TEXT NOT NULL,
+    size INTEGER,
+    sha256 TEXT,
+    codec TEXT,
+    encrypted INTEGER NOT NULL,
+    format TEXT,
+    status TEXT NOT NULL DEFAULT 'available'
+);
+CREATE INDEX IF NOT EXISTS backups_by_database ON backups (database, created);
+CREATE INDEX IF NOT EXISTS backups_by_created ON backups (created);
+CREATE TABLE IF NOT EXISTS locations (
+    backup_id INTEGER NOT NULL REFERENCES backups (id) ON DELETE CASCADE,
+    location TEXT NOT NULL,
+    deleted TEXT,
+    PRIMARY KEY (backup_id, location)
+);
+CREATE TABLE IF NOT EXISTS restore_tests (
+    id INTEGER PRIMARY KEY,
+    backup_id INTEGER NOT NULL REFERENCES backups (id) ON DELETE CASCADE,
+    tested TEXT NOT NULL,
+    status TEXT NOT NULL,
+    rto_seconds REAL,
+    report TEXT
+);
+CREATE INDEX IF NOT EXISTS restore_tests_by_backup ON restore_tests (backup_id, tested);
+"""
+
+
+def catalog_path(path=None):
+    """
+    Path of the catalog: ``path``, the BACKUP_CATALOG environment variable,
+    or a file in the user's cache directory.
+    """
+    return path or os.getenv("BACKUP_CATALOG", DEFAULT_CATALOG_PATH)
+
+
+def _utc(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.astimezone()
+    # One fixed format, so text comparisons in SQL order by time.
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class BackupCatalog:
+    """
+    Local SQLite index of the backups taken on this machine.
+
+    Every backup is recorded with its database, time, size, checksum, codec
+    and the locations it was stored at, so lookups such as the latest backup
+    of a database are indexed queries instead of bucket listings. The
+    catalog is opened per use and runs in WAL mode, so concurrent jobs and
+    processes can record backups at the same time.
+
+    Args:
+        path (str, optional): Catalog file; see ``catalog_path``.
+    """
+
+    def __init__(self, path=None):
+        self.path = catalog_path(path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    def record(
+        self,
+        db_type,
+        database,
+        locations,
+        host=None,
+        created=None,
+        size=None,
+        sha256=None,
+        codec=None,
+        encrypted=False,
+        backup_format=None,
+    ):
+        """
+        Add a backup to the catalog.
+
+        Args:
+            db_type (str): 'postgres' or 'mongo'.
+            database (str): Database name.
+            locations (list): Local paths and cloud locations of the copies.
+            host (str, optional): Database host.
+            created (datetime, optional): Backup time; now if None.
+            size (int, optional): Stored size in bytes.
+            sha256 (str, optional): Checksum of the stored artifact.
+            codec (str, optional): Compression codec, or None if uncompressed.
+            encrypted (bool): Whether the backup is encrypted.
+            backup_format (str, optional): e.g. 'custom', 'directory',
+                'objects', 'container', 'archive', 'repository'.
+
+        Returns:
+            int: The backup's id.
+        """
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT INTO backups (db_type, host, database, created, size, sha256, "
+                "codec, encrypted, format) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    db_type,
+                    host,
+                    database,
+                    _utc(created or datetime.now(timezone.utc)),
+                    size,
+                    sha256,
+                    codec,
+                    int(bool(encrypted)),
+                    backup_format,
+                ),
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO locations (backup_id, location) VALUES (?, ?)",
+                [(cursor.lastrowid, location) for location in locations],
+            )
+        return cursor.lastrowid
+
+    def _rows(self, where, params, limit=None):
+        query = f"SELECT * FROM backups WHERE {' AND '.join(where) or '1'} ORDER BY created DESC"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        backups = [dict(row) for row in self._db.execute(query, params)]
+        for backup in backups:
+            backup["locations"] = [
+                row["location"]
+                for row in self._db.execute(
+                    "SELECT location FROM locations WHERE backup_id = ? AND deleted IS NULL",
+                    (backup["id"],),
+                )
+            ]
+        return backups
+
+    def find(
+        self, database=None, db_type=None, host=None, since=None, until=None,
+        status="available", limit=None,
+    ):
+        """
+        List backups, newest first.
+
+        Args:
+            database (str, optional): Only backups of this database.
+            db_type (str, optional): Only backups of this database type.
+            host (str, optional): Only backups from this host.
+            since (datetime or str, optional): Only backups taken at or after this time.
+            until (datetime or str, optional): Only backups taken before this time.
+            status (str, optional): Only backups with this status
+                ('available' or 'pruned'); all if None.
+            limit (int, optional): Return at most this many backups.
+
+        Returns:
+            list: Backups as dicts, each with its remaining ``locations``.
+        """
+        where, params = [], []
+        for column, value in (("database", database), ("db_type", db_type), ("host", host), ("status", status)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            where.append("created >= ?")
+            params.append(_utc(since))
+        if until is not None:
+            where.append("created < ?")
+            params.append(_utc(until))
+        return self._rows(where, params, limit=limit)
+
+    def get(self, backup_id):
+        """
+        A backup by id, or None.
+        """
+        backups = self._rows(["id = ?"], [backup_id])
+        return backups[0] if backups else None
+
+    def latest(self, database, db_type=None, host=None, before=None):
+        """
+        The most recent available backup of a database, or None.
+
+        Args:
+            before (datetime or str, optional): Latest backup taken before this time.
+        """
+        backups = self.find(database, db_type, host, until=before, limit=1)
+        return backups[0] if backups else None
+
+    def latest_per_database(self, database=None, db_type=None):
+        """
+        The most recent available backup of every database and host, newest
+        first. Incremental archives are left out, as they are restored to a
+        point in time rather than as a whole.
+
+        Args:
+            database (str, optional): Only backups of this database.
+            db_type (str, optional): Only backups of this database type.
+        """
+        where = [
+            "status = 'available'",
+            "COALESCE(format, '') != 'incremental'",
+            "created = (SELECT MAX(created) FROM backups AS newer "
+            "WHERE newer.db_type = backups.db_type AND newer.database = backups.database "
+            "AND newer.host IS backups.host AND newer.status = 'available' "
+            "AND COALESCE(newer.format, '') != 'incremental')",
+        ]
+        params = []
+        for column, value in (("database", database), ("db_type", db_type)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        return self._rows(where, params)
+
+    def record_restore_test(self, backup_id, report):
+        """
+        Record the outcome of a restore test of a backup.
+
+        Args:
+            backup_id (int): The tested backup.
+            report (dict): The test report, with its ``status`` and
+                ``rto_seconds``.
+
+        Returns:
+            int: The test's id.
+        """
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT INTO restore_tests (backup_id, tested, status, rto_seconds, report) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    backup_id,
+                    _utc(datetime.now(timezone.utc)),
+                    report["status"],
+                    report.get("rto_seconds"),
+                    json.dumps(report),
+                ),
+            )
+        return cursor.lastrowid
+
+    def mark_deleted(self, backup_id, location):
+        """
+        Record that one copy of a backup is gone; the backup is marked
+        'pruned' once no copy is left. Pass ``location=None`` to only
+        update the status.
+        """
+        with self._db:
+            self._db.execute(
+                "UPDATE locations SET deleted = ? WHERE backup_id = ? AND location = ?",
+                (_utc(datetime.now(timezone.utc)), backup_id, location),
+            )
+            self._db.execute(
+                "UPDATE backups SET status = 'pruned' WHERE id = ? AND NOT EXISTS "
+                "(SELECT 1 FROM locations WHERE backup_id = ? AND deleted IS NULL)",
+                (backup_id, backup_id),
+            )
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def backup_locations(location, options):
+    """
+    Every location a backup was stored at, from what ``backup`` returned and
+    its options. Backups uploaded from a local file or directory were stored
+    both locally and under the same name in the bucket; a directory's
+    objects share a prefix, recorded with a trailing ``/``.
+    """
+    locations = list(location) if isinstance(location, list) else [location]
+    if options.get("storage") == "repository" and options.get("provider"):
+        # The snapshot manifest is uploaded next to the repository's chunks.
+        provider = get_provider(options["provider"])
+        prefix = os.path.basename(os.path.normpath(options["repository"]))
+        locations.append(
+            f"{provider.scheme}://{options['bucket']}/{prefix}/snapshots/"
+            f"{os.path.basename(location)}"
+        )
+    elif options.get("storage") == "cloud" and not options.get("destinations"):
+        provider = get_provider(options["provider"])
+        for local in list(locations):
+            if parse_location(local) or not os.path.exists(local):
+                continue
+            if options.get("mode") == "incremental":
+                continue
+            name = os.path.basename(os.path.normpath(local))
+            suffix = "/" if os.path.isdir(local) else ""
+            locations.append(f"{provider.scheme}://{options['bucket']}/{name}{suffix}")
+    return locations
+
+
+def backup_format(options):
+    """
+    Name of a backup's format, from the options it was taken with.
+    """
+    if options.get("storage") == "repository":
+        return "repository"
+    if options.get("mode") == "incremental":
+        return "incremental"
+    if options.get("container"):
+        return "container"
+    return options.get("dump_format") or "custom"
+
+
+def record_backup(db_type, connection, options, location, metrics=None, path=None):
+    """
+    Record a finished backup in the catalog.
+
+    The size is the bytes written to storage as measured by ``metrics``, or
+    the size of the local copy. The checksum of a single-file backup is
+    taken from its sidecar manifest, or computed from a local copy.
+
+    Args:
+        db_type (str): The type of the database (postgres, mongo).
+        connection (dict): Connection parameters of the handler.
+        options (dict): Keyword arguments the handler's ``backup`` ran with.
+        location (str or list): What ``backup`` returned.
+        metrics (RunMetrics, optional): Metrics of the run.
+        path (str, optional): Catalog file.
+
+    Returns:
+        int: The backup's id.
+    """
+    from storage.manifest import load_manifest
+    from utils.metrics import path_size
+
+    locations = backup_locations(location, options)
+    local = next(
+        (item for item in locations if not parse_location(item) and os.path.exists(item)), None
+    )
+    size = sha256 = None
+    if metrics is not None:
+        stored = {stage.name: stage for stage in metrics.stages()}
+        for name in ("upload", "store"):
+            if name in stored and stored[name].bytes_in:
+                size = stored[name].bytes_in
+                break
+    if local:
+        size = size or path_size(local)
+    for item in locations:
+        try:
+            objects = load_manifest(item)["objects"]
+        except RuntimeError:
+            continue
+        if len(objects) == 1:
+            (entry,) = objects.values()
+            sha256 = entry["sha256"]
+        break
+    if sha256 is None and local and os.path.isfile(local):
+        sha256 = _file_sha256(local)
+    compress = options.get("compress", True) and options.get("storage") != "repository"
+    with BackupCatalog(path) as catalog:
+        return catalog.record(
+            db_type,
+            connection.get("database"),
+            locations,
+            host=connection.get("host"),
+            size=size,
+            sha256=sha256,
+            codec=get_codec(options.get("codec", "gzip")).name if compress else None,
+            encrypted=options.get("encrypt", True),
+            backup_format=backup_format(options),
+        )
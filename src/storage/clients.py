@@ -0,0 +1,97 @@
+import hashlib
+import threading
+from storage.multipart import upload_settings
+
+# Connections kept per client when the config does not set
+# ``upload.max_connections``: enough for a few concurrent multipart uploads.
+MIN_CONNECTIONS = 32
+
+
+class ClientCache:
+    """
+    Process-wide cache of storage clients, safe to share between threads.
+
+    Each client is created once per key, so credentials are resolved and
+    connections opened once and then reused by every upload and download of
+    every job in the process. Concurrent first requests for the same key wait
+    for one creation instead of racing; different keys are created in
+    parallel.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        """
+        Return the client cached under ``key``, creating it with ``factory()``
+        on first use.
+        """
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = factory()
+            return client
+
+    def clear(self):
+        """
+        Drop every cached client, e.g. after the config changed.
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._locks.clear()
+        for client in clients:
+            close = getattr(client, "close", None)
+            if close:
+                close()
+
+
+_CACHE = ClientCache()
+
+
+def cached_client(provider, identity, factory):
+    """
+    Get a shared client for a provider.
+
+    Args:
+        provider (str): Provider name, e.g. 'aws'.
+        identity (tuple): Everything that selects the client: credentials,
+            region, endpoint. Strings are hashed, so no secret is kept in
+            the key.
+        factory (callable): Creates the client.
+
+    Returns:
+        The cached client.
+    """
+    key = (provider,) + tuple(
+        hashlib.sha256(value.encode()).hexdigest() if isinstance(value, str) else value
+        for value in identity
+    )
+    return _CACHE.get(key, factory)
+
+
+def clear_clients():
+    """
+    Drop all cached storage clients.
+    """
+    _CACHE.clear()
+
+
+def max_connections(config):
+    """
+    Size of each client's HTTP connection pool.
+
+    Read from ``upload.max_connections``; by default twice the upload
+    concurrency, so two multipart transfers can run at full speed at once.
+    """
+    section = config.get("upload", {})
+    if "max_connections" in section:
+        return int(section["max_connections"])
+    return max(MIN_CONNECTIONS, 2 * upload_settings(config)["concurrency"])
@@ -0,0 +1,293 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from storage.providers import parse_location
+from utils.compression import BLOCK_SIZE, decompress_stream, get_codec
+from utils.encryption import derive_key
+from utils.pipeline import read_chunks
+
+# Layout: HEADER (magic + 8-byte nonce prefix), frames, TOC, FOOTER.
+# Each frame is one block of a member, compressed on its own and encrypted
+# with AES-GCM under the nonce prefix + 4-byte frame number, so any frame
+# can be read and authenticated alone. The TOC is compressed and encrypted
+# JSON listing every member's frames; the fixed-size footer at the very end
+# gives the TOC's offset and length, so the TOC is found with one tail read.
+CONTAINER_MAGIC = b"DBKPACK\x01"
+CONTAINER_EXTENSION = ".dbk"
+_NONCE_PREFIX_SIZE = 8
+_HEADER_SIZE = len(CONTAINER_MAGIC) + _NONCE_PREFIX_SIZE
+_FOOTER = struct.Struct(">QQB8s")
+_ENCRYPTED = 0x01
+_TOC_FRAME = 0xFFFFFFFF
+# Cloud reads fetch this much of the tail at once, enough for the footer and
+# the TOC of most backups.
+_TAIL_READ_SIZE = 256 * 1024
+
+
+def _cipher():
+    return AESGCM(derive_key(b"container v1"))
+
+
+def _nonce(prefix, frame):
+    return prefix + struct.pack(">I", frame)
+
+
+def write_container(
+    members, output_file, codec="gzip", level=None, encrypt=True, threads=None
+):
+    """
+    Write members into a backup container.
+
+    Frames are compressed and encrypted on a thread pool while the file is
+    written in order.
+
+    Args:
+        members (iterable): ``(name, chunks)`` pairs; ``chunks`` yields the
+            member's bytes.
+        output_file (str): Path of the container to write.
+        codec (str): Compression codec of the frames, or None to store them
+            uncompressed.
+        level (int, optional): Compression level.
+        encrypt (bool): Whether to encrypt the frames and the TOC.
+        threads (int, optional): Frames packed at once; the CPU count if None.
+
+    Returns:
+        str: The output file.
+    """
+    codec = get_codec(codec) if codec else None
+    level = codec.default_level if codec and level is None else level
+    aead = _cipher() if encrypt else None
+    prefix = os.urandom(_NONCE_PREFIX_SIZE)
+    header = CONTAINER_MAGIC + prefix
+    threads = threads or os.cpu_count() or 1
+
+    def pack(frame, data):
+        packed = codec.compress_block(data, level) if codec else data
+        if aead:
+            packed = aead.encrypt(_nonce(prefix, frame), packed, header)
+        return packed
+
+    toc = []
+    frame = 0
+    offset = len(header)
+    try:
+        with open(output_file, "wb") as file, ThreadPoolExecutor(threads) as executor:
+            file.write(header)
+            for name, chunks in members:
+                entry = {"name": name, "size": 0, "first_frame": frame, "frames": []}
+                digest = hashlib.sha256()
+                pending = deque()
+
+                def flush(limit):
+                    nonlocal offset
+                    while len(pending) > limit:
+                        size, future = pending.popleft()
+                        packed = future.result()
+                        file.write(packed)
+                        entry["frames"].append([offset, len(packed), size])
+                        offset += len(packed)
+
+                buffer = bytearray()
+                for chunk in chunks:
+                    buffer += chunk
+                    while len(buffer) >= BLOCK_SIZE:
+                        data = bytes(buffer[:BLOCK_SIZE])
+                        del buffer[:BLOCK_SIZE]
+                        digest.update(data)
+                        entry["size"] += len(data)
+                        pending.append((len(data), executor.submit(pack, frame, data)))
+                        frame += 1
+                        flush(2 * threads)
+                if buffer or not entry["frames"] and not pending:
+                    data = bytes(buffer)
+                    digest.update(data)
+                    entry["size"] += len(data)
+                    pending.append((len(data), executor.submit(pack, frame, data)))
+                    frame += 1
+                flush(0)
+                entry["stored_size"] = sum(stored for _, stored, _ in entry["frames"])
+                entry["sha256"] = digest.hexdigest()
+                toc.append(entry)
+
+            index = json.dumps(
+                {
+                    "created": datetime.now(timezone.utc).isoformat(),
+                    "codec": codec.name if codec else None,
+                    "encrypted": encrypt,
+                    "members": toc,
+                }
+            ).encode()
+            index = get_codec("gzip").compress_block(index, 6)
+            if aead:
+                index = aead.encrypt(_nonce(prefix, _TOC_FRAME), index, header)
+            file.write(index)
+            file.write(
+                _FOOTER.pack(offset, len(index), _ENCRYPTED if encrypt else 0, CONTAINER_MAGIC)
+            )
+    except BaseException:
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        raise
+    return output_file
+
+
+def pack_container(path, output_file, codec="gzip", level=None, encrypt=True, threads=None):
+    """
+    Pack a file, or every file below a directory, into a container. Members
+    are named by their path relative to ``path``'s parent directory.
+
+    Returns:
+        str: The output file.
+    """
+    base = os.path.dirname(os.path.normpath(path))
+    if os.path.isdir(path):
+        files = sorted(
+            os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+        )
+    else:
+        files = [path]
+
+    def members():
+        for file_path in files:
+            with open(file_path, "rb") as file:
+                yield os.path.relpath(file_path, base), read_chunks(file)
+
+    return write_container(members(), output_file, codec, level, encrypt, threads)
+
+
+def is_container(location):
+    """
+    Check whether a location holds a container: by its magic bytes for a
+    local file, and by its extension in the cloud.
+    """
+    if parse_location(location):
+        return location.endswith(CONTAINER_EXTENSION)
+    if not os.path.isfile(location):
+        return False
+    with open(location, "rb") as file:
+        return file.read(len(CONTAINER_MAGIC)) == CONTAINER_MAGIC
+
+
+class ContainerReader:
+    """
+    Random access to a container in a local file (memory-mapped) or in the
+    cloud (ranged reads). Listing needs only the header and the tail of the
+    container, and reading a member touches only that member's frames.
+
+    Args:
+        location (str): Local path or cloud location of the container.
+    """
+
+    def __init__(self, location):
+        self.location = location
+        self._cloud = parse_location(location)
+        self._file = self._map = None
+        if not self._cloud:
+            self._file = open(location, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = self._read(0, _HEADER_SIZE)
+        if not header.startswith(CONTAINER_MAGIC):
+            raise ValueError(f"{location} is not a backup container.")
+        self._header = header
+        self._prefix = header[len(CONTAINER_MAGIC):]
+
+        tail = self._read(-_TAIL_READ_SIZE)
+        toc_offset, toc_length, flags, magic = _FOOTER.unpack(tail[-_FOOTER.size:])
+        if magic != CONTAINER_MAGIC:
+            raise ValueError(f"{location} is truncated: the container footer is missing.")
+        if toc_length + _FOOTER.size <= len(tail):
+            index = tail[-_FOOTER.size - toc_length : -_FOOTER.size]
+        else:
+            index = self._read(toc_offset, toc_length)
+        self._aead = _cipher() if flags & _ENCRYPTED else None
+        if self._aead:
+            index = self._aead.decrypt(_nonce(self._prefix, _TOC_FRAME), index, header)
+        self.toc = json.loads(b"".join(decompress_stream([index])))
+        self.members = {member["name"]: member for member in self.toc["members"]}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map:
+            self._map.close()
+            self._file.close()
+
+    def _read(self, offset, length=None):
+        if self._cloud:
+            provider, bucket, object_name = self._cloud
+            return provider.read_range(bucket, object_name, offset, length)
+        if offset < 0:
+            return self._map[max(0, len(self._map) + offset):]
+        end = len(self._map) if length is None else offset + length
+        return self._map[offset:end]
+
+    def read_member(self, name):
+        """
+        Yield a member's bytes frame by frame, checking its checksum at the end.
+
+        Raises:
+            KeyError: If the container has no such member.
+            ValueError: If the member fails its checksum.
+            cryptography.exceptions.InvalidTag: If a frame fails authentication.
+        """
+        member = self.members[name]
+        digest = hashlib.sha256()
+        for number, (offset, stored, size) in enumerate(member["frames"]):
+            packed = self._read(offset, stored)
+            if self._aead:
+                packed = self._aead.decrypt(
+                    _nonce(self._prefix, member["first_frame"] + number),
+                    packed,
+                    self._header,
+                )
+            data = b"".join(decompress_stream([packed])) if self.toc["codec"] else packed
+            if len(data) != size:
+                raise ValueError(f"Frame {number} of {name} has the wrong size.")
+            digest.update(data)
+            yield data
+        if digest.hexdigest() != member["sha256"]:
+            raise ValueError(f"Member {name} failed its checksum.")
+
+    def extract(self, name, output_dir):
+        """
+        Write one member below ``output_dir``, keeping its relative path.
+
+        Returns:
+            str: Path of the extracted file.
+        """
+        output_file = os.path.join(output_dir, name)
+        if not os.path.abspath(output_file).startswith(os.path.abspath(output_dir) + os.sep):
+            raise ValueError(f"Member name {name} points outside the output directory.")
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        with open(output_file, "wb") as file:
+            for data in self.read_member(name):
+                file.write(data)
+        return output_file
+
+
+def read_container_member(location, name=None):
+    """
+    Yield one member of a container.
+
+    Args:
+        location (str): Local path or cloud location of the container.
+        name (str, optional): Member to read; the container must hold
+            exactly one member if None.
+    """
+    with ContainerReader(location) as reader:
+        if name is None:
+            if len(reader.members) != 1:
+                raise ValueError(f"{location} holds {len(reader.members)} members, expected one.")
+            name = next(iter(reader.members))
+        yield from reader.read_member(name)
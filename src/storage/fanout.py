@@ -0,0 +1,135 @@
+import os
+import time
+from storage.providers import parse_location
+from utils.pipeline import tee_stream, write_stream
+
+# Chunks buffered per destination; the slowest one sets the pace.
+DEFAULT_QUEUE_SIZE = 4
+
+
+class Destination:
+    """
+    One place a streamed backup is written to: a local directory, or a
+    bucket and optional prefix in the cloud.
+
+    Args:
+        spec (str): ``local:/dir``, a plain directory path, or a cloud
+            location such as ``s3://bucket/prefix``, ``gs://bucket`` or
+            ``az://container/prefix``.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        cloud = parse_location(spec)
+        if cloud:
+            self.provider, self.bucket, prefix = cloud
+            self.prefix = prefix.strip("/")
+            if not self.bucket:
+                raise ValueError(f"Destination {spec} has no bucket.")
+            self.root = None
+        else:
+            self.provider = self.bucket = None
+            self.prefix = ""
+            self.root = spec[len("local:"):] if spec.startswith("local:") else spec
+
+    def location(self, file_name):
+        if self.provider:
+            object_name = f"{self.prefix}/{file_name}" if self.prefix else file_name
+            return f"{self.provider.scheme}://{self.bucket}/{object_name}"
+        return os.path.join(self.root, file_name)
+
+    def write(self, chunks, file_name, logger):
+        """
+        Write a stream to this destination.
+
+        Returns:
+            int: Number of bytes written.
+        """
+        if not self.provider:
+            os.makedirs(self.root, exist_ok=True)
+            return write_stream(chunks, self.location(file_name))
+        size = 0
+
+        def counted():
+            nonlocal size
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+
+        object_name = f"{self.prefix}/{file_name}" if self.prefix else file_name
+        self.provider.stream(counted(), self.bucket, object_name, logger)
+        return size
+
+
+def fan_out(chunks, destinations, file_name, logger, queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Write one stream to several destinations concurrently.
+
+    The stream is produced once and teed through bounded queues, so memory
+    stays bounded and the slowest destination sets the pace. A failing
+    destination does not stop the others.
+
+    Args:
+        chunks (iterable): Iterator yielding the backup bytes.
+        destinations (list): ``Destination`` objects.
+        file_name (str): Name of the backup file in every destination.
+        logger: Logger instance for logging.
+        queue_size (int): Chunks buffered per destination.
+
+    Returns:
+        list: One report entry per destination, in order, with the
+        destination, location, status, bytes, seconds and error.
+    """
+    started = {}
+    report = []
+
+    def consumer(destination):
+        def consume(stream):
+            started[destination.spec] = time.monotonic()
+            size = destination.write(stream, file_name, logger)
+            return size, time.monotonic()
+
+        return consume
+
+    outcomes = tee_stream(
+        chunks, [consumer(destination) for destination in destinations], queue_size
+    )
+    for destination, (result, error) in zip(destinations, outcomes):
+        entry = {
+            "destination": destination.spec,
+            "location": destination.location(file_name),
+            "status": "failed" if error else "success",
+            "bytes": result[0] if result else None,
+            "seconds": (
+                round(result[1] - started[destination.spec], 3) if result else None
+            ),
+            "error": str(error) if error else None,
+        }
+        if error:
+            logger.error(f"Backup to {entry['location']} failed: {error}")
+        else:
+            logger.info(
+                f"Backup written to {entry['location']} "
+                f"({entry['bytes']} bytes, {entry['seconds']}s)"
+            )
+        report.append(entry)
+    return report
+
+
+def written_locations(report):
+    """
+    Locations written by ``fan_out``.
+
+    Raises:
+        RuntimeError: If any destination failed, naming each failure and
+            the copies that were written.
+    """
+    failed = [entry for entry in report if entry["status"] != "success"]
+    if failed:
+        written = [entry["location"] for entry in report if entry["status"] == "success"]
+        errors = "; ".join(f"{entry['destination']}: {entry['error']}" for entry in failed)
+        raise RuntimeError(
+            f"{len(failed)} of {len(report)} destinations failed ({errors}). "
+            f"Written: {', '.join(written) or 'none'}"
+        )
+    return [entry["location"] for entry in report]
@@ -1,26 +1,137 @@
-import json
 from google.cloud import storage as gcs
 import os
-import json
+import requests
+from utils.checksums import base64_to_hex
+from utils.config import load_config
+from storage.clients import cached_client, max_connections
+from storage.multipart import GCSCompositeUploader, upload_settings
+from utils.pipeline import CHUNK_SIZE, as_file, read_chunks
+from utils.throttle import current_throttle
 
-config_path = "/Users/toheed/Projects/Database Backup Utility/src/config.json" 
-with open(config_path, 'r') as file:
-    config = json.load(file)
 
-def store_on_gcp(file_path: str, bucket_name: str, logger):
+def _gcs_client():
+    config = load_config()
+    service_account_key = config['gcs']['service_account_key']
+    emulator = os.getenv("STORAGE_EMULATOR_HOST")
+
+    def create():
+        # The client honours STORAGE_EMULATOR_HOST, e.g. for fake-gcs-server,
+        # which needs no credentials.
+        if service_account_key and not emulator:
+            client = gcs.Client.from_service_account_json(service_account_key)
+        else:
+            client = gcs.Client()
+        size = max_connections(config)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=size, pool_maxsize=size)
+        client._http.mount("https://", adapter)
+        client._http.mount("http://", adapter)
+        return client
+
+    return cached_client('gcp', (service_account_key, emulator), create)
+
+def _gcs_bucket(bucket_name: str):
+    # Bucket handles are cheap; the client and its connections are shared.
+    return _gcs_client().bucket(bucket_name)
+
+def store_on_gcp(file_path: str, bucket_name: str, logger, object_name: str = None):
     """
     Upload a file to a Google Cloud Storage bucket.
     """
     try:
-        service_account_key = config['gcs']['service_account_key']
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = service_account_key
-        client = gcs.Client()
-        bucket = client.get_bucket(bucket_name)
-        blob = bucket.blob(file_path.split('/')[-1])
-        blob.upload_from_filename(file_path)
+        bucket = _gcs_bucket(bucket_name)
+        object_name = object_name or file_path.split('/')[-1]
+        settings = upload_settings(load_config())
+        if os.path.getsize(file_path) > settings["part_size"]:
+            GCSCompositeUploader(bucket, **settings).upload(file_path, bucket_name, object_name, logger)
+        else:
+            throttle = current_throttle()
+            if throttle:
+                with open(file_path, "rb") as file:
+                    bucket.blob(object_name).upload_from_file(
+                        throttle.reader(file), size=os.path.getsize(file_path)
+                    )
+            else:
+                bucket.blob(object_name).upload_from_filename(file_path)
         logger.info(f"Backup uploaded to Google Cloud bucket {bucket_name}")
     except Exception as e:
         raise RuntimeError(f"Error uploading backup to Google Cloud Storage: {e}")
     
+def stream_to_gcp(chunks, bucket_name: str, object_name: str, logger):
+    """
+    Upload a stream of chunks to Google Cloud Storage using a resumable upload.
+    """
+    try:
+        bucket = _gcs_bucket(bucket_name)
+        # A chunk size forces a chunked resumable upload of unknown length.
+        blob = bucket.blob(object_name, chunk_size=8 * CHUNK_SIZE)
+        blob.upload_from_file(as_file(chunks))
+        logger.info(f"Backup streamed to Google Cloud bucket {bucket_name} as {object_name}")
+    except Exception as e:
+        raise RuntimeError(f"Error streaming backup to Google Cloud Storage: {e}")
+
+def fetch_from_gcp(bucket_name: str, object_name: str) -> bytes:
+    """
+    Download a small object from Google Cloud Storage into memory.
+    """
+    try:
+        return _gcs_bucket(bucket_name).blob(object_name).download_as_bytes()
+    except Exception as e:
+        raise RuntimeError(f"Error downloading {object_name} from Google Cloud Storage: {e}")
+
+def read_range_from_gcp(bucket_name: str, object_name: str, offset: int, length: int = None) -> bytes:
+    """
+    Read a byte range of an object with one ranged download. A negative
+    offset reads the last ``-offset`` bytes.
+    """
+    end = None if offset < 0 or length is None else offset + length - 1
+    try:
+        return _gcs_bucket(bucket_name).blob(object_name).download_as_bytes(start=offset, end=end)
+    except Exception as e:
+        raise RuntimeError(f"Error reading {object_name} from Google Cloud Storage: {e}")
 
+def download_from_gcp(bucket_name: str, object_name: str):
+    """
+    Yield an object from Google Cloud Storage in chunks as it downloads.
+    """
+    try:
+        reader = _gcs_bucket(bucket_name).blob(object_name).open("rb", chunk_size=8 * CHUNK_SIZE)
+    except Exception as e:
+        raise RuntimeError(f"Error downloading {object_name} from Google Cloud Storage: {e}")
+    with reader:
+        yield from read_chunks(reader)
+
+def list_gcp_objects(bucket_name: str, prefix: str = ""):
+    """
+    List the names of the objects under a prefix.
+    """
+    try:
+        return [blob.name for blob in _gcs_client().list_blobs(bucket_name, prefix=prefix)]
+    except Exception as e:
+        raise RuntimeError(f"Error listing Google Cloud bucket {bucket_name}: {e}")
 
+def delete_from_gcp(bucket_name: str, object_name: str):
+    """
+    Delete an object from Google Cloud Storage.
+    """
+    try:
+        _gcs_bucket(bucket_name).blob(object_name).delete()
+    except Exception as e:
+        raise RuntimeError(f"Error deleting {object_name} from Google Cloud Storage: {e}")
+
+def stat_gcp_object(bucket_name: str, object_name: str):
+    """
+    Size, CRC32C and MD5 (absent for composite objects) of an object,
+    without downloading it.
+    """
+    try:
+        blob = _gcs_bucket(bucket_name).get_blob(object_name)
+    except Exception as e:
+        raise RuntimeError(f"Error reading {object_name} from Google Cloud Storage: {e}")
+    if blob is None:
+        raise RuntimeError(f"{object_name} not found in Google Cloud bucket {bucket_name}")
+    return {
+        "size": blob.size,
+        "etag": blob.etag,
+        "md5": base64_to_hex(blob.md5_hash),
+        "crc32c": base64_to_hex(blob.crc32c),
+    }
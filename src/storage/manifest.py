@@ -0,0 +1,283 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from storage.multipart import upload_settings
+from storage.providers import get_provider, open_location, parse_location
+from utils.checksums import AUDIT_HASH, FAST_HASHES, Checksums, available, s3_etag
+from utils.config import load_config
+from utils.pipeline import read_chunks
+
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 1
+
+# Objects hashed or verified at once.
+DEFAULT_VERIFY_WORKERS = 8
+
+
+def manifest_location(location):
+    """
+    Location of the sidecar manifest of a backup file, directory or cloud
+    object or prefix: next to it, with ``.manifest.json`` appended.
+    """
+    return location.rstrip("/") + MANIFEST_SUFFIX
+
+
+def checksums_for(*providers):
+    """
+    New ``Checksums`` for data stored with the named cloud providers (or
+    only locally if none), including the checksums they keep.
+    """
+    if not providers:
+        return Checksums()
+    return Checksums.for_providers(
+        [get_provider(provider) for provider in providers],
+        upload_settings(load_config())["part_size"],
+    )
+
+
+def build_manifest(objects, content=None, counts=None):
+    """
+    Build a sidecar manifest.
+
+    Args:
+        objects (dict): Checksums of each stored object, by name relative
+            to the backup (its file name for a single-file backup).
+        content (dict, optional): Checksums of the uncompressed,
+            unencrypted dump.
+        counts (dict, optional): Row or document count of each table or
+            collection when the backup was taken.
+
+    Returns:
+        dict: The manifest.
+    """
+    return {
+        "version": MANIFEST_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "objects": objects,
+        "content": content,
+        "counts": counts,
+    }
+
+
+def save_manifest(manifest, location, logger):
+    """
+    Write the sidecar manifest of a backup next to it, locally or in the cloud.
+
+    Returns:
+        str: Location of the manifest.
+    """
+    target = manifest_location(location)
+    data = json.dumps(manifest, indent=2).encode()
+    cloud = parse_location(target)
+    if cloud:
+        provider, bucket, object_name = cloud
+        provider.stream(iter([data]), bucket, object_name, logger)
+    else:
+        with open(f"{target}.tmp", "wb") as file:
+            file.write(data)
+        os.replace(f"{target}.tmp", target)
+    return target
+
+
+def load_manifest(location):
+    """
+    Read the sidecar manifest of a backup.
+
+    Raises:
+        RuntimeError: If the backup has no manifest.
+    """
+    target = manifest_location(location)
+    try:
+        cloud = parse_location(target)
+        if cloud:
+            provider, bucket, object_name = cloud
+            data = provider.fetch(bucket, object_name)
+        else:
+            with open(target, "rb") as file:
+                data = file.read()
+    except (OSError, RuntimeError) as e:
+        raise RuntimeError(f"No manifest found for {location}: {e}")
+    return json.loads(data)
+
+
+def save_stream_manifest(stored, content, file_name, locations, logger, counts=None):
+    """
+    Write the manifest of a streamed backup next to each of its copies.
+
+    Args:
+        stored (Checksums): Checksums of the stored stream.
+        content (Checksums): Checksums of the dump before compression and
+            encryption.
+        file_name (str): Name of the backup file.
+        locations (list): Locations the stream was written to.
+        logger: Logger instance for logging.
+        counts (dict, optional): Object counts; see ``build_manifest``.
+    """
+    manifest = build_manifest({file_name: stored.result()}, content.result(), counts)
+    for location in locations:
+        save_manifest(manifest, location, logger)
+
+
+def _hash_file(path, provider):
+    checksums = checksums_for(*[provider] if provider else [])
+    with open(path, "rb") as file:
+        for chunk in read_chunks(file):
+            checksums.update(chunk)
+    return checksums.result()
+
+
+def hash_backup(path, provider=None, workers=DEFAULT_VERIFY_WORKERS):
+    """
+    Hash a backup file, or every file of a backup directory in parallel.
+
+    Args:
+        path (str): Backup file or directory.
+        provider (str, optional): Cloud provider the backup is uploaded to.
+        workers (int): Files hashed at once.
+
+    Returns:
+        dict: Checksums of each file, by name relative to the backup.
+    """
+    if not os.path.isdir(path):
+        return {os.path.basename(path): _hash_file(path, provider)}
+    names = sorted(
+        name for name in os.listdir(path) if os.path.isfile(os.path.join(path, name))
+    )
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            lambda name: _hash_file(os.path.join(path, name), provider), names
+        )
+        return dict(zip(names, results))
+
+
+def write_backup_manifest(path, storage, provider, bucket, logger, content=None,
+                          counts=None):
+    """
+    Hash a finished backup file or directory and write its manifest next to
+    it, and next to its upload for cloud storage.
+
+    Returns:
+        dict: The manifest.
+    """
+    manifest = build_manifest(
+        hash_backup(path, provider if storage == "cloud" else None), content, counts
+    )
+    save_manifest(manifest, path, logger)
+    if storage == "cloud":
+        name = os.path.basename(os.path.normpath(path))
+        scheme = get_provider(provider).scheme
+        save_manifest(manifest, f"{scheme}://{bucket}/{name}", logger)
+    return manifest
+
+
+def _object_locations(location, manifest):
+    # A manifest of one object describes the location itself; otherwise the
+    # location is a directory or prefix holding the named objects.
+    objects = manifest["objects"]
+    if len(objects) == 1 and not location.endswith("/") and not os.path.isdir(location):
+        (entry,) = objects.values()
+        return [(location, entry)]
+    base = location.rstrip("/")
+    return [(f"{base}/{name}", entry) for name, entry in sorted(objects.items())]
+
+
+def _provider_check(location, entry):
+    # Compare with the checksum the provider keeps. True if it matches,
+    # False on a size mismatch, None if it cannot tell: the provider keeps
+    # no usable checksum, or it differs in a way a re-hash must confirm
+    # (e.g. ETags of KMS-encrypted objects are not MD5s).
+    provider, bucket, object_name = parse_location(location)
+    stat = provider.stat(bucket, object_name)
+    if stat["size"] != entry["size"]:
+        return False, f"size {stat['size']} != {entry['size']}"
+    if stat["crc32c"] and entry.get("crc32c"):
+        if stat["crc32c"] == entry["crc32c"]:
+            return True, "crc32c"
+        return None, "crc32c differs"
+    parts = entry.get("md5_parts") or []
+    if stat["md5"] and len(parts) == 1:
+        if stat["md5"] == parts[0]:
+            return True, "md5"
+        return None, "md5 differs"
+    if provider.name == "aws" and s3_etag(entry):
+        if stat["etag"] == s3_etag(entry):
+            return True, "etag"
+        return None, "etag differs"
+    return None, "no provider checksum"
+
+
+def _rehash(location, entry, audit):
+    # The fast hash if it is installed here too, SHA-256 otherwise.
+    names = [name for name in FAST_HASHES if name in entry and available(name)][:1]
+    if audit or not names:
+        names.append(AUDIT_HASH)
+    checksums = Checksums(names)
+    for chunk in open_location(location):
+        checksums.update(chunk)
+    result = checksums.result()
+    if result["size"] != entry["size"]:
+        return False, f"size {result['size']} != {entry['size']}"
+    for name in names:
+        if result[name] != entry[name]:
+            return False, f"{name} mismatch"
+    return True, "+".join(names)
+
+
+def verify_object(location, entry, quick=False, audit=False):
+    """
+    Verify one stored object against its manifest entry.
+
+    Args:
+        location (str): Local path or cloud location of the object.
+        entry (dict): The object's checksums from the manifest.
+        quick (bool): Compare cloud objects with the checksum the provider
+            keeps first, and only download them if that is inconclusive.
+        audit (bool): Also re-hash with SHA-256.
+
+    Returns:
+        dict: The location, status ('ok', 'corrupt' or 'error'), the
+        method that decided and a detail message.
+    """
+    result = {"location": location, "status": "ok", "method": None, "detail": None}
+    try:
+        if quick and not audit and parse_location(location):
+            matched, detail = _provider_check(location, entry)
+            if matched is not None:
+                result.update(status="ok" if matched else "corrupt", method="provider")
+                result["detail"] = detail
+                return result
+            result["detail"] = f"{detail}, re-hashed"
+        matched, method = _rehash(location, entry, audit)
+        result["status"] = "ok" if matched else "corrupt"
+        result["method"] = "rehash"
+        result["detail"] = ", ".join(item for item in (result["detail"], method) if item)
+    except Exception as e:
+        result.update(status="error", detail=str(e))
+    return result
+
+
+def verify_backup(location, quick=False, audit=False, workers=DEFAULT_VERIFY_WORKERS):
+    """
+    Verify a backup against its sidecar manifest, checking its objects in
+    parallel with streaming reads.
+
+    Args:
+        location (str): Backup file, directory, cloud object or prefix.
+        quick (bool): See ``verify_object``.
+        audit (bool): See ``verify_object``.
+        workers (int): Objects verified at once.
+
+    Returns:
+        list: One ``verify_object`` result per object.
+
+    Raises:
+        RuntimeError: If the backup has no manifest.
+    """
+    targets = _object_locations(location, load_manifest(location))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(
+            executor.map(
+                lambda target: verify_object(target[0], target[1], quick, audit), targets
+            )
+        )
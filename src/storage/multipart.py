@@ -0,0 +1,342 @@
+import base64
+import hashlib
+import json
+import math
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from utils.throttle import current_throttle
+
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+DEFAULT_CONCURRENCY = 8
+DEFAULT_MANIFEST_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "database-backup-utility", "uploads"
+)
+
+
+def upload_settings(config):
+    """
+    Read uploader settings from the ``upload`` section of the config.
+
+    Returns:
+        dict: Keyword arguments for a ``MultipartUploader``.
+    """
+    section = config.get("upload", {})
+    return {
+        "part_size": int(section.get("part_size_mb", DEFAULT_PART_SIZE // 2**20)) * 2**20,
+        "concurrency": int(section.get("concurrency", DEFAULT_CONCURRENCY)),
+        "manifest_dir": section.get("manifest_dir", DEFAULT_MANIFEST_DIR),
+    }
+
+
+class ResumeManifest:
+    """
+    Local record of an in-progress multipart upload.
+
+    The manifest is keyed by destination and source file, and is discarded if
+    the source file or part size changes between attempts.
+    """
+
+    def __init__(self, manifest_dir, provider, bucket, object_name, file_path, part_size):
+        stat = os.stat(file_path)
+        self.identity = {
+            "provider": provider,
+            "bucket": bucket,
+            "object_name": object_name,
+            "file_path": os.path.abspath(file_path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "part_size": part_size,
+        }
+        digest = hashlib.sha1(
+            json.dumps(self.identity, sort_keys=True).encode()
+        ).hexdigest()
+        self.path = os.path.join(manifest_dir, f"{digest}.json")
+        self.upload_id = None
+        self.parts = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            with open(self.path, "r") as file:
+                state = json.load(file)
+            if state.get("identity") == self.identity:
+                self.upload_id = state["upload_id"]
+                self.parts = {int(k): v for k, v in state["parts"].items()}
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(
+                    {
+                        "identity": self.identity,
+                        "upload_id": self.upload_id,
+                        "parts": self.parts,
+                    },
+                    file,
+                )
+            os.replace(tmp_path, self.path)
+
+    def record_part(self, number, info):
+        with self._lock:
+            self.parts[number] = info
+        self.save()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class MultipartUploader:
+    """
+    Concurrent, resumable upload of a file in fixed-size parts.
+
+    Subclasses implement the provider calls; this class handles splitting,
+    the worker pool and the resume manifest. An interrupted upload continues
+    with the parts that are still missing the next time the same file is
+    uploaded to the same destination.
+
+    Args:
+        part_size (int): Size of each part in bytes.
+        concurrency (int): Number of parts uploaded at the same time.
+        manifest_dir (str): Directory holding resume manifests.
+    """
+
+    provider = None
+    max_parts = 10000
+
+    def __init__(
+        self,
+        part_size=DEFAULT_PART_SIZE,
+        concurrency=DEFAULT_CONCURRENCY,
+        manifest_dir=DEFAULT_MANIFEST_DIR,
+    ):
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.manifest_dir = manifest_dir
+
+    def start(self, bucket, object_name):
+        """Begin an upload and return its id."""
+        raise NotImplementedError
+
+    def existing_parts(self, bucket, object_name, upload_id):
+        """
+        Return the part numbers the provider already holds for the upload,
+        or None if the upload no longer exists.
+        """
+        raise NotImplementedError
+
+    def upload_part(self, bucket, object_name, upload_id, number, data):
+        """Upload one part and return the info needed to complete the upload."""
+        raise NotImplementedError
+
+    def complete(self, bucket, object_name, upload_id, parts):
+        """Assemble the uploaded parts, given as ``[(number, info), ...]``."""
+        raise NotImplementedError
+
+    def upload(self, file_path, bucket, object_name, logger):
+        """
+        Upload a file, resuming a previous attempt if one was interrupted.
+
+        Args:
+            file_path (str): Path to the file to upload.
+            bucket (str): Destination bucket or container.
+            object_name (str): Destination object name.
+            logger: Logger instance for logging.
+        """
+        size = os.path.getsize(file_path)
+        part_size = max(self.part_size, math.ceil(size / self.max_parts))
+        part_count = max(1, math.ceil(size / part_size))
+        manifest = ResumeManifest(
+            self.manifest_dir, self.provider, bucket, object_name, file_path, part_size
+        )
+
+        if manifest.upload_id:
+            known = self.existing_parts(bucket, object_name, manifest.upload_id)
+            if known is None:
+                manifest.upload_id, manifest.parts = None, {}
+            else:
+                manifest.parts = {
+                    n: info for n, info in manifest.parts.items() if n in known
+                }
+                logger.info(
+                    f"Resuming upload of {object_name}: "
+                    f"{len(manifest.parts)}/{part_count} parts already uploaded"
+                )
+        if not manifest.upload_id:
+            manifest.upload_id = self.start(bucket, object_name)
+            manifest.parts = {}
+        manifest.save()
+
+        # Parts are read at the pace of the job's throttle, if any.
+        throttle = current_throttle()
+
+        def send(number):
+            with open(file_path, "rb") as file:
+                file.seek((number - 1) * part_size)
+                data = (throttle.reader(file) if throttle else file).read(part_size)
+            info = self.upload_part(bucket, object_name, manifest.upload_id, number, data)
+            manifest.record_part(number, info)
+
+        missing = [n for n in range(1, part_count + 1) if n not in manifest.parts]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(send, missing))
+
+        self.complete(
+            bucket, object_name, manifest.upload_id, sorted(manifest.parts.items())
+        )
+        manifest.remove()
+        logger.info(f"Uploaded {object_name} in {part_count} parts")
+
+
+class S3MultipartUploader(MultipartUploader):
+    """
+    S3 multipart upload. Works with S3-compatible endpoints such as moto.
+    """
+
+    provider = "aws"
+
+    def __init__(self, client, **kwargs):
+        super().__init__(**kwargs)
+        # S3 rejects parts under 5 MiB, except the last one.
+        self.part_size = max(self.part_size, 5 * 2**20)
+        self.client = client
+
+    def start(self, bucket, object_name):
+        response = self.client.create_multipart_upload(Bucket=bucket, Key=object_name)
+        return response["UploadId"]
+
+    def existing_parts(self, bucket, object_name, upload_id):
+        parts = set()
+        try:
+            paginator = self.client.get_paginator("list_parts")
+            for page in paginator.paginate(
+                Bucket=bucket, Key=object_name, UploadId=upload_id
+            ):
+                parts.update(part["PartNumber"] for part in page.get("Parts", []))
+        except self.client.exceptions.NoSuchUpload:
+            return None
+        return parts
+
+    def upload_part(self, bucket, object_name, upload_id, number, data):
+        response = self.client.upload_part(
+            Bucket=bucket,
+            Key=object_name,
+            UploadId=upload_id,
+            PartNumber=number,
+            Body=data,
+        )
+        return response["ETag"]
+
+    def complete(self, bucket, object_name, upload_id, parts):
+        self.client.complete_multipart_upload(
+            Bucket=bucket,
+            Key=object_name,
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [{"PartNumber": n, "ETag": etag} for n, etag in parts]
+            },
+        )
+
+
+class GCSCompositeUploader(MultipartUploader):
+    """
+    GCS parallel composite upload: parts are uploaded as temporary objects
+    and composed into the destination. Works with fake-gcs-server.
+    """
+
+    provider = "gcp"
+    compose_limit = 32
+
+    def __init__(self, bucket, **kwargs):
+        super().__init__(**kwargs)
+        self.bucket = bucket
+
+    def _part_name(self, object_name, upload_id, number):
+        return f"{object_name}.parts/{upload_id}/{number:05d}"
+
+    def start(self, bucket, object_name):
+        return uuid.uuid4().hex
+
+    def existing_parts(self, bucket, object_name, upload_id):
+        prefix = f"{object_name}.parts/{upload_id}/"
+        return {
+            int(blob.name[len(prefix):])
+            for blob in self.bucket.list_blobs(prefix=prefix)
+            if blob.name[len(prefix):].isdigit()
+        }
+
+    def upload_part(self, bucket, object_name, upload_id, number, data):
+        part_name = self._part_name(object_name, upload_id, number)
+        self.bucket.blob(part_name).upload_from_string(data)
+        return part_name
+
+    def complete(self, bucket, object_name, upload_id, parts):
+        sources = [self.bucket.blob(name) for _, name in parts]
+        temporary = []
+        # compose() accepts at most 32 sources, so build the object in rounds.
+        while len(sources) > self.compose_limit:
+            grouped = []
+            for i in range(0, len(sources), self.compose_limit):
+                name = f"{object_name}.parts/{upload_id}/compose-{len(temporary):05d}"
+                target = self.bucket.blob(name)
+                target.compose(sources[i : i + self.compose_limit])
+                temporary.append(target)
+                grouped.append(target)
+            sources = grouped
+        self.bucket.blob(object_name).compose(sources)
+
+        for _, name in parts:
+            self.bucket.blob(name).delete()
+        for blob in temporary:
+            blob.delete()
+
+
+class AzureBlockUploader(MultipartUploader):
+    """
+    Azure block blob upload with staged blocks. Works with Azurite.
+    """
+
+    provider = "azure"
+    max_parts = 50000
+
+    def __init__(self, container_client, **kwargs):
+        super().__init__(**kwargs)
+        self.container_client = container_client
+
+    def _block_id(self, upload_id, number):
+        return base64.b64encode(f"{upload_id}-{number:06d}".encode()).decode()
+
+    def start(self, bucket, object_name):
+        return uuid.uuid4().hex
+
+    def existing_parts(self, bucket, object_name, upload_id):
+        from azure.core.exceptions import ResourceNotFoundError  # type: ignore
+
+        blob_client = self.container_client.get_blob_client(object_name)
+        try:
+            _, uncommitted = blob_client.get_block_list("uncommitted")
+        except ResourceNotFoundError:
+            # No blob and no staged blocks: nothing was uploaded yet. Other
+            # errors propagate rather than silently restaging every block.
+            return set()
+        parts = set()
+        for block in uncommitted:
+            decoded = base64.b64decode(block.id).decode()
+            if decoded.startswith(f"{upload_id}-"):
+                parts.add(int(decoded.rsplit("-", 1)[1]))
+        return parts
+
+    def upload_part(self, bucket, object_name, upload_id, number, data):
+        block_id = self._block_id(upload_id, number)
+        self.container_client.get_blob_client(object_name).stage_block(block_id, data)
+        return block_id
+
+    def complete(self, bucket, object_name, upload_id, parts):
+        from azure.storage.blob import BlobBlock  # type: ignore
+
+        self.container_client.get_blob_client(object_name).commit_block_list(
+            [BlobBlock(block_id=block_id) for _, block_id in parts]
+        )
@@ -0,0 +1,188 @@
+from importlib import import_module
+from urllib.parse import urlparse
+from utils.pipeline import read_chunks
+
+
+class StorageProvider:
+    """
+    A cloud storage backend whose SDK is only imported on first use.
+
+    Args:
+        name (str): Provider name used on the command line.
+        module (str): Module implementing the provider.
+        store (str): Function uploading a file:
+            ``(file_path, bucket, logger, object_name=None)``.
+        stream (str): Function uploading a stream of chunks:
+            ``(chunks, bucket, object_name, logger)``.
+        fetch (str): Function downloading a small object into memory:
+            ``(bucket, object_name) -> bytes``.
+        download (str): Generator function yielding an object in chunks:
+            ``(bucket, object_name)``.
+        read_range (str): Function reading a byte range of an object:
+            ``(bucket, object_name, offset, length=None) -> bytes``, where a
+            negative offset reads the last ``-offset`` bytes.
+        list_objects (str): Function listing object names under a prefix:
+            ``(bucket, prefix="") -> list``.
+        delete (str): Function deleting an object: ``(bucket, object_name)``.
+        stat (str): Function returning an object's size and the checksums
+            the provider keeps: ``(bucket, object_name) -> dict`` with
+            ``size``, ``etag``, ``md5`` and ``crc32c`` (hex, or None).
+        scheme (str): URL scheme of the provider's locations, e.g. ``s3``.
+        checksum (str, optional): Checksum the provider keeps for every
+            object and that ``Checksums`` can predict: ``md5`` (S3 ETags,
+            Azure Content-MD5) or ``crc32c``.
+    """
+
+    def __init__(
+        self, name, module, store, stream, fetch, download, read_range, list_objects, delete,
+        stat, scheme, checksum=None,
+    ):
+        self.name = name
+        self.module = module
+        self.scheme = scheme
+        self.checksum = checksum
+        self._functions = {
+            "store": store,
+            "stream": stream,
+            "fetch": fetch,
+            "download": download,
+            "read_range": read_range,
+            "list_objects": list_objects,
+            "delete": delete,
+            "stat": stat,
+        }
+
+    def _function(self, role):
+        return getattr(import_module(self.module), self._functions[role])
+
+    def store(self, file_path, bucket, logger, object_name=None):
+        return self._function("store")(file_path, bucket, logger, object_name)
+
+    def stream(self, chunks, bucket, object_name, logger):
+        return self._function("stream")(chunks, bucket, object_name, logger)
+
+    def fetch(self, bucket, object_name):
+        return self._function("fetch")(bucket, object_name)
+
+    def download(self, bucket, object_name):
+        return self._function("download")(bucket, object_name)
+
+    def read_range(self, bucket, object_name, offset, length=None):
+        return self._function("read_range")(bucket, object_name, offset, length)
+
+    def list_objects(self, bucket, prefix=""):
+        return self._function("list_objects")(bucket, prefix)
+
+    def delete(self, bucket, object_name):
+        return self._function("delete")(bucket, object_name)
+
+    def stat(self, bucket, object_name):
+        return self._function("stat")(bucket, object_name)
+
+
+PROVIDERS = {}
+
+
+def register_provider(provider):
+    """
+    Add a storage provider to the registry, replacing any with the same name.
+    """
+    PROVIDERS[provider.name] = provider
+    return provider
+
+
+def get_provider(name):
+    """
+    Look up a registered storage provider by name.
+
+    Raises:
+        ValueError: If the provider is unknown.
+    """
+    try:
+        return PROVIDERS[name]
+    except KeyError:
+        raise ValueError("Unsupported cloud provider.")
+
+
+def parse_location(location):
+    """
+    Split a cloud location such as ``s3://bucket/key`` into its parts.
+
+    Both the provider's URL scheme (``s3``, ``gs``, ``az``) and its name
+    (``aws``, ``gcp``, ``azure``), as returned by streamed backups, are
+    accepted.
+
+    Returns:
+        tuple: ``(provider, bucket, object_name)``, or None for a local path.
+    """
+    parsed = urlparse(location)
+    for provider in PROVIDERS.values():
+        if parsed.scheme in (provider.name, provider.scheme):
+            return provider, parsed.netloc, parsed.path.lstrip("/")
+    return None
+
+
+def open_location(location):
+    """
+    Read a backup from a local path or a cloud location in chunks.
+
+    Yields:
+        bytes: The stored backup.
+    """
+    cloud = parse_location(location)
+    if cloud:
+        provider, bucket, object_name = cloud
+        yield from provider.download(bucket, object_name)
+        return
+    with open(location, "rb") as file:
+        yield from read_chunks(file)
+
+
+register_provider(
+    StorageProvider(
+        "aws",
+        "storage.s3_storage",
+        "store_on_s3",
+        "stream_to_s3",
+        "fetch_from_s3",
+        "download_from_s3",
+        "read_range_from_s3",
+        "list_s3_objects",
+        "delete_from_s3",
+        "stat_s3_object",
+        "s3",
+        checksum="md5",
+    )
+)
+register_provider(
+    StorageProvider(
+        "gcp",
+        "storage.gcp_storage",
+        "store_on_gcp",
+        "stream_to_gcp",
+        "fetch_from_gcp",
+        "download_from_gcp",
+        "read_range_from_gcp",
+        "list_gcp_objects",
+        "delete_from_gcp",
+        "stat_gcp_object",
+        "gs",
+        checksum="crc32c",
+    )
+)
+register_provider(
+    StorageProvider(
+        "azure",
+        "storage.azure_storage",
+        "store_on_azure",
+        "stream_to_azure",
+        "fetch_from_azure",
+        "download_from_azure",
+        "read_range_from_azure",
+        "list_azure_objects",
+        "delete_from_azure",
+        "stat_azure_object",
+        "az",
+        checksum="md5",
+    )
+)
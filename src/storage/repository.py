@@ -0,0 +1,367 @@
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import sqlite3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from storage.providers import get_provider
+from utils.compression import decompress_stream, get_codec
+from utils.encryption import decrypt_stream, derive_key, encrypt_stream
+
+MIN_CHUNK_SIZE = 256 * 1024
+AVG_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+try:
+    import fcntl
+except ImportError:  # Windows: repository locking is not available.
+    fcntl = None
+
+
+def split_chunks(
+    chunks, min_size=MIN_CHUNK_SIZE, avg_size=AVG_CHUNK_SIZE, max_size=MAX_CHUNK_SIZE
+):
+    """
+    Split a stream into content-defined chunks with FastCDC.
+
+    Boundaries depend only on nearby content, so an insertion early in a
+    dump only changes the chunks around it.
+
+    Args:
+        chunks (iterable): Iterator yielding bytes.
+        min_size (int): Smallest chunk size.
+        avg_size (int): Target average chunk size.
+        max_size (int): Largest chunk size.
+
+    Yields:
+        bytes: Content-defined chunks.
+    """
+    from fastcdc import fastcdc
+
+    window = 4 * max_size
+    buffer = bytearray()
+
+    def cut(final):
+        data = bytes(buffer)
+        offset = 0
+        for chunk in fastcdc(data, min_size, avg_size, max_size):
+            end = chunk.offset + chunk.length
+            # The last chunk may have been cut short by the end of the buffer.
+            if not final and end == len(data):
+                break
+            yield data[chunk.offset : end]
+            offset = end
+        del buffer[:offset]
+
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= window:
+            yield from cut(final=False)
+    if buffer:
+        yield from cut(final=True)
+
+
+class ChunkRepository:
+    """
+    Deduplicating backup repository.
+
+    Backups are split into content-defined chunks, each stored once under its
+    content id as an independently compressed and encrypted object. A backup
+    is a snapshot manifest listing its chunk ids. A local SQLite index of
+    stored chunks means known chunks are never packed or uploaded again.
+
+    Chunk objects and manifests live in the repository directory, or in a
+    cloud bucket under a prefix named after it when ``provider`` and
+    ``bucket`` are given. The index always stays local.
+
+    Args:
+        root (str): Local repository directory.
+        provider (str, optional): Cloud provider ('aws', 'gcp', 'azure').
+        bucket (str, optional): Cloud bucket name.
+        codec (str): Codec used for each chunk.
+        level (int, optional): Compression level.
+        encrypt (bool): Whether to encrypt chunks.
+        workers (int, optional): Threads packing and uploading new chunks.
+    """
+
+    def __init__(
+        self, root, provider=None, bucket=None, codec="gzip", level=None, encrypt=True, workers=None
+    ):
+        if provider:
+            get_provider(provider)
+        self.root = root
+        self.provider = provider
+        self.bucket = bucket
+        self.prefix = os.path.basename(os.path.normpath(root))
+        self.codec = get_codec(codec)
+        self.level = self.codec.default_level if level is None else level
+        self.encrypt = encrypt
+        self.workers = workers or os.cpu_count() or 1
+        # Keyed ids keep content hashes of encrypted data from leaking.
+        self._id_key = derive_key(b"repository chunk id v1") if encrypt else None
+        # Per-chunk upload messages would flood the backup log.
+        self._quiet_logger = logging.getLogger("BackupUtilityLogger.repository")
+        self._quiet_logger.setLevel(logging.WARNING)
+
+        os.makedirs(os.path.join(root, "snapshots"), exist_ok=True)
+        self._index = sqlite3.connect(
+            os.path.join(root, "index.sqlite"), check_same_thread=False
+        )
+        self._index.execute(
+            "CREATE TABLE IF NOT EXISTS chunks "
+            "(id TEXT PRIMARY KEY, size INTEGER, stored_size INTEGER)"
+        )
+
+    def close(self):
+        self._index.close()
+
+    @contextmanager
+    def _lock(self, exclusive=False):
+        """
+        Hold the repository lock: shared while storing a snapshot, exclusive
+        while collecting garbage, so no chunk a running backup relies on is
+        swept.
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.root, "lock"), "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def chunk_id(self, data):
+        if self._id_key:
+            return hmac.new(self._id_key, data, hashlib.sha256).hexdigest()
+        return hashlib.sha256(data).hexdigest()
+
+    def _object_name(self, relative):
+        if self.provider:
+            return f"{self.prefix}/{relative}"
+        return os.path.join(self.root, relative)
+
+    def _chunk_path(self, chunk_id):
+        return f"chunks/{chunk_id[:2]}/{chunk_id}"
+
+    def _put(self, relative, data):
+        name = self._object_name(relative)
+        if self.provider:
+            get_provider(self.provider).stream(
+                iter([data]), self.bucket, name, self._quiet_logger
+            )
+            return
+        os.makedirs(os.path.dirname(name), exist_ok=True)
+        with open(f"{name}.tmp", "wb") as file:
+            file.write(data)
+        os.replace(f"{name}.tmp", name)
+
+    def _get(self, relative):
+        name = self._object_name(relative)
+        if self.provider:
+            return get_provider(self.provider).fetch(self.bucket, name)
+        with open(name, "rb") as file:
+            return file.read()
+
+    def _pack(self, data):
+        packed = self.codec.compress_block(data, self.level)
+        if self.encrypt:
+            packed = b"".join(encrypt_stream([packed]))
+        return packed
+
+    def _unpack(self, packed):
+        if self.encrypt:
+            packed = b"".join(decrypt_stream(io.BytesIO(packed)))
+        return b"".join(decompress_stream([packed]))
+
+    def _store_chunk(self, chunk_id, data):
+        packed = self._pack(data)
+        self._put(self._chunk_path(chunk_id), packed)
+        return chunk_id, len(data), len(packed)
+
+    def known(self, chunk_id):
+        row = self._index.execute(
+            "SELECT 1 FROM chunks WHERE id = ?", (chunk_id,)
+        ).fetchone()
+        return row is not None
+
+    def store(self, chunks, source_name, logger):
+        """
+        Store a stream as a new snapshot.
+
+        Args:
+            chunks (iterable): Iterator yielding the backup bytes.
+            source_name (str): Name of the backed up file, used in the
+                snapshot name and when restoring.
+            logger: Logger instance for logging.
+
+        Returns:
+            str: Path of the snapshot manifest in the local repository.
+        """
+        with self._lock():
+            return self._store(chunks, source_name, logger)
+
+    def _store(self, chunks, source_name, logger):
+        created = datetime.now(timezone.utc)
+        snapshot = f"{source_name}-{created.strftime('%Y%m%dT%H%M%SZ')}"
+        references = []
+        total_size = new_size = stored_size = new_chunks = 0
+        seen = set()
+        pending = deque()
+
+        def record(future):
+            nonlocal stored_size
+            chunk_id, size, packed_size = future.result()
+            self._index.execute(
+                "INSERT OR IGNORE INTO chunks VALUES (?, ?, ?)",
+                (chunk_id, size, packed_size),
+            )
+            stored_size += packed_size
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for data in split_chunks(chunks):
+                chunk_id = self.chunk_id(data)
+                references.append([chunk_id, len(data)])
+                total_size += len(data)
+                if chunk_id in seen or self.known(chunk_id):
+                    continue
+                seen.add(chunk_id)
+                new_chunks += 1
+                new_size += len(data)
+                pending.append(executor.submit(self._store_chunk, chunk_id, data))
+                while len(pending) >= 2 * self.workers:
+                    record(pending.popleft())
+            while pending:
+                record(pending.popleft())
+        self._index.commit()
+
+        manifest = {
+            "name": snapshot,
+            "source": source_name,
+            "created": created.isoformat(),
+            "size": total_size,
+            "codec": self.codec.name,
+            "encrypted": self.encrypt,
+            "provider": self.provider,
+            "bucket": self.bucket,
+            "chunks": references,
+        }
+        manifest_path = os.path.join(self.root, "snapshots", f"{snapshot}.json")
+        with open(manifest_path, "w") as file:
+            json.dump(manifest, file)
+        if self.provider:
+            with open(manifest_path, "rb") as file:
+                self._put(f"snapshots/{snapshot}.json", file.read())
+
+        logger.info(
+            f"Snapshot {snapshot}: {len(references)} chunks, {new_chunks} new "
+            f"({new_size} of {total_size} bytes new, {stored_size} bytes stored)"
+        )
+        return manifest_path
+
+    def collect_garbage(self, logger):
+        """
+        Delete the chunks no remaining snapshot references.
+
+        Chunks referenced by the snapshot manifests left in the local
+        ``snapshots`` directory are marked; every other chunk in the index
+        is deleted from storage and from the index. In the cloud, the copies
+        of manifests deleted locally are removed as well.
+
+        Returns:
+            tuple: Number of chunks deleted and their stored bytes.
+        """
+        with self._lock(exclusive=True):
+            snapshots_dir = os.path.join(self.root, "snapshots")
+            names = {name for name in os.listdir(snapshots_dir) if name.endswith(".json")}
+            referenced = set()
+            for name in names:
+                with open(os.path.join(snapshots_dir, name), "r") as file:
+                    referenced.update(chunk_id for chunk_id, _ in json.load(file)["chunks"])
+            unreferenced = [
+                (chunk_id, stored_size)
+                for chunk_id, stored_size in self._index.execute(
+                    "SELECT id, stored_size FROM chunks"
+                )
+                if chunk_id not in referenced
+            ]
+
+            def sweep(chunk_id):
+                name = self._object_name(self._chunk_path(chunk_id))
+                if self.provider:
+                    get_provider(self.provider).delete(self.bucket, name)
+                elif os.path.exists(name):
+                    os.remove(name)
+                # Committed per chunk, so an interrupted sweep leaves no
+                # index rows for deleted chunks.
+                self._index.execute("DELETE FROM chunks WHERE id = ?", (chunk_id,))
+                self._index.commit()
+
+            for chunk_id, _ in unreferenced:
+                sweep(chunk_id)
+            if self.provider:
+                provider = get_provider(self.provider)
+                prefix = self._object_name("snapshots/")
+                for name in provider.list_objects(self.bucket, prefix):
+                    if name[len(prefix):] not in names:
+                        provider.delete(self.bucket, name)
+        freed = sum(stored_size for _, stored_size in unreferenced)
+        logger.info(
+            f"Repository {self.root}: deleted {len(unreferenced)} unreferenced chunks "
+            f"({freed} bytes)"
+        )
+        return len(unreferenced), freed
+
+    def read(self, manifest_path):
+        """
+        Yield the contents of a snapshot chunk by chunk.
+
+        Args:
+            manifest_path (str): Path to the snapshot manifest.
+        """
+        with open(manifest_path, "r") as file:
+            manifest = json.load(file)
+        for chunk_id, size in manifest["chunks"]:
+            data = self._unpack(self._get(self._chunk_path(chunk_id)))
+            if len(data) != size or self.chunk_id(data) != chunk_id:
+                raise ValueError(f"Chunk {chunk_id} is corrupt.")
+            yield data
+
+
+def is_snapshot(path):
+    """
+    Check whether a path points at a repository snapshot manifest.
+    """
+    parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return path.endswith(".json") and parent == "snapshots"
+
+
+def read_snapshot(manifest_path):
+    """
+    Yield the contents of a snapshot, using the repository location, codec
+    and encryption setting recorded in its manifest.
+
+    Args:
+        manifest_path (str): Path to the snapshot manifest.
+    """
+    with open(manifest_path, "r") as file:
+        manifest = json.load(file)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(manifest_path)))
+    repository = ChunkRepository(
+        root,
+        manifest.get("provider"),
+        manifest.get("bucket"),
+        codec=manifest["codec"],
+        encrypt=manifest["encrypted"],
+    )
+    try:
+        yield from repository.read(manifest_path)
+    finally:
+        repository.close()
+
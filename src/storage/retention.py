@@ -0,0 +1,248 @@
+import asyncio
+import json
+import os
+import shutil
+from collections import defaultdict
+from datetime import datetime
+from storage.backend import get_backend
+from storage.manifest import manifest_location
+from storage.providers import parse_location
+from storage.repository import ChunkRepository, is_snapshot
+
+# Deletions in flight at once while pruning.
+DEFAULT_PRUNE_CONCURRENCY = 32
+
+# Period of a backup for each GFS rule, from its creation time.
+PERIODS = {
+    "hourly": lambda created: created.strftime("%Y-%m-%dT%H"),
+    "daily": lambda created: created.strftime("%Y-%m-%d"),
+    "weekly": lambda created: "{}-W{:02d}".format(*created.isocalendar()[:2]),
+    "monthly": lambda created: created.strftime("%Y-%m"),
+}
+
+# Incremental archives are one growing directory shared by every run, so
+# they are never pruned as a whole.
+UNPRUNABLE_FORMATS = {"incremental"}
+
+
+class RetentionPolicy:
+    """
+    Grandfather-father-son retention: keep the newest ``keep_last`` backups,
+    plus the newest backup of each of the last ``hourly`` hours, ``daily``
+    days, ``weekly`` ISO weeks and ``monthly`` months that have one. A
+    backup kept by any rule is kept. Periods are in local time.
+
+    Args:
+        keep_last (int): Most recent backups always kept.
+        hourly (int): Hours to keep one backup of.
+        daily (int): Days to keep one backup of.
+        weekly (int): Weeks to keep one backup of.
+        monthly (int): Months to keep one backup of.
+    """
+
+    def __init__(self, keep_last=0, hourly=0, daily=0, weekly=0, monthly=0):
+        self.keep_last = keep_last
+        self.rules = {"hourly": hourly, "daily": daily, "weekly": weekly, "monthly": monthly}
+        if any(count < 0 for count in (keep_last, *self.rules.values())):
+            raise ValueError("Retention counts cannot be negative.")
+        if not keep_last and not any(self.rules.values()):
+            # An empty policy would expire every backup.
+            raise ValueError("The retention policy keeps no backups.")
+
+    @classmethod
+    def from_config(cls, config, **overrides):
+        """
+        Build a policy from the config's ``retention`` section, with the
+        non-None ``overrides`` taking precedence.
+        """
+        settings = dict(config.get("retention", {}))
+        settings.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**settings)
+
+    def keep(self, backups):
+        """
+        Select the backups of one database to keep.
+
+        Args:
+            backups (list): Catalog entries of one database, newest first.
+
+        Returns:
+            set: Ids of the kept backups.
+        """
+        kept = {backup["id"] for backup in backups[: self.keep_last]}
+        for rule, count in self.rules.items():
+            periods = set()
+            for backup in backups:
+                if len(periods) >= count:
+                    break
+                created = datetime.fromisoformat(backup["created"].replace("Z", "+00:00"))
+                period = PERIODS[rule](created.astimezone())
+                if period not in periods:
+                    periods.add(period)
+                    kept.add(backup["id"])
+        return kept
+
+    def expired(self, backups):
+        """
+        Backups that no rule keeps, judged per database and host.
+
+        Args:
+            backups (list): Available catalog entries, newest first.
+
+        Returns:
+            list: The expired entries, newest first.
+        """
+        groups = defaultdict(list)
+        for backup in backups:
+            if backup["format"] not in UNPRUNABLE_FORMATS:
+                groups[(backup["db_type"], backup["host"], backup["database"])].append(backup)
+        expired = []
+        for group in groups.values():
+            kept = self.keep(group)
+            expired.extend(backup for backup in group if backup["id"] not in kept)
+        return sorted(expired, key=lambda backup: backup["created"], reverse=True)
+
+
+async def _delete_location(location, limit, logger):
+    # Cloud prefixes (directory backups) and local directories are removed
+    # object by object; everything else is one object or file. The sidecar
+    # manifest goes last, once nothing it describes is left.
+    cloud = parse_location(location)
+    if cloud:
+        provider, bucket, object_name = cloud
+        backend = get_backend(provider.name, bucket, logger=logger)
+        names = await backend.list(object_name) if object_name.endswith("/") else [object_name]
+
+        async def delete(name):
+            async with limit:
+                await backend.delete(name)
+
+        await asyncio.gather(*(delete(name) for name in names))
+        sidecar = manifest_location(object_name)
+        if sidecar in await backend.list(sidecar):
+            await delete(sidecar)
+        return len(names)
+    async with limit:
+        if os.path.isdir(location):
+            await asyncio.to_thread(shutil.rmtree, location)
+        elif os.path.exists(location):
+            await asyncio.to_thread(os.remove, location)
+        if os.path.exists(manifest_location(location)):
+            await asyncio.to_thread(os.remove, manifest_location(location))
+        return 1
+
+
+async def delete_locations(locations, logger, concurrency=DEFAULT_PRUNE_CONCURRENCY):
+    """
+    Delete backup copies concurrently.
+
+    Args:
+        locations (list): Local paths and cloud locations.
+        logger: Logger instance for logging.
+        concurrency (int): Deletions in flight at once.
+
+    Returns:
+        list: The exception raised for each location, or None if it was
+        deleted, in input order.
+    """
+    limit = asyncio.Semaphore(concurrency)
+
+    async def delete(location):
+        try:
+            count = await _delete_location(location, limit, logger)
+            logger.info(f"Deleted {location} ({count} objects)")
+        except Exception as e:
+            logger.error(f"Failed to delete {location}: {e}")
+            return e
+
+    return await asyncio.gather(*(delete(location) for location in locations))
+
+
+def _repositories(backups):
+    """
+    Root, provider and bucket of the repositories holding the snapshots of
+    ``backups``, read from their manifests before these are deleted.
+    """
+    repositories = {}
+    for backup in backups:
+        for location in backup["locations"]:
+            if parse_location(location) or not is_snapshot(location):
+                continue
+            if not os.path.exists(location):
+                continue
+            with open(location, "r") as file:
+                manifest = json.load(file)
+            root = os.path.dirname(os.path.dirname(os.path.abspath(location)))
+            repositories[root] = (manifest.get("provider"), manifest.get("bucket"))
+    return repositories
+
+
+def collect_garbage(repositories, logger):
+    """
+    Sweep the chunks of deleted snapshots from each repository.
+
+    Returns:
+        dict: The exception raised for each repository root that could not
+        be swept.
+    """
+    errors = {}
+    for root, (provider, bucket) in repositories.items():
+        # Sweeping computes no chunk ids, so no encryption key is needed.
+        repository = ChunkRepository(root, provider, bucket, encrypt=False)
+        try:
+            repository.collect_garbage(logger)
+        except Exception as e:
+            logger.error(f"Failed to collect garbage in repository {root}: {e}")
+            errors[root] = e
+        finally:
+            repository.close()
+    return errors
+
+
+def prune(catalog, policy, logger, database=None, db_type=None, dry_run=False,
+          concurrency=DEFAULT_PRUNE_CONCURRENCY):
+    """
+    Delete the backups a retention policy expires and mark them in the catalog.
+
+    Deleting a repository snapshot only deletes its manifest; the chunks no
+    remaining snapshot of the repository references are swept afterwards.
+
+    Args:
+        catalog (BackupCatalog): Catalog of the backups.
+        policy (RetentionPolicy): What to keep.
+        logger: Logger instance for logging.
+        database (str, optional): Only prune backups of this database.
+        db_type (str, optional): Only prune backups of this database type.
+        dry_run (bool): Report what would be deleted without deleting.
+        concurrency (int): Deletions in flight at once.
+
+    Returns:
+        list: The expired catalog entries, each with the ``errors`` of its
+        locations that could not be deleted.
+    """
+    expired = policy.expired(catalog.find(database, db_type))
+    if dry_run or not expired:
+        return expired
+    backup_repositories = {backup["id"]: _repositories([backup]) for backup in expired}
+    repositories = {}
+    for found in backup_repositories.values():
+        repositories.update(found)
+    targets = [(backup, location) for backup in expired for location in backup["locations"]]
+    errors = asyncio.run(
+        delete_locations([location for _, location in targets], logger, concurrency)
+    )
+    for backup in expired:
+        backup["errors"] = {}
+        if not backup["locations"]:
+            catalog.mark_deleted(backup["id"], None)
+    for (backup, location), error in zip(targets, errors):
+        if error is None:
+            catalog.mark_deleted(backup["id"], location)
+        else:
+            backup["errors"][location] = str(error)
+    sweep_errors = collect_garbage(repositories, logger)
+    for backup in expired:
+        for root in backup_repositories[backup["id"]]:
+            if root in sweep_errors:
+                backup["errors"][root] = f"chunks not swept: {sweep_errors[root]}"
+    return expired
@@ -1,29 +1,168 @@
-import json
 import boto3
 import os
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from utils.config import load_config
+from storage.clients import cached_client, max_connections
+from storage.multipart import S3MultipartUploader, upload_settings
+from utils.pipeline import CHUNK_SIZE, as_file
+from utils.profiles import resolve_secret
+from utils.throttle import current_throttle
 
-config_path = "/Users/toheed/Projects/Database Backup Utility/src/config.json" 
-with open(config_path, 'r') as file:
-    config = json.load(file)
-
-def store_on_s3(file_path: str, bucket_name: str, logger):
-    try:
-
-        aws_access_key = config['aws']['access_key']
-        aws_secret_key = config['aws']['secret_key']
-        aws_region = config['aws']['region']
 
+def _s3_client():
+    config = load_config()
+    # Keys may be secret references such as env:AWS_SECRET_ACCESS_KEY.
+    aws = dict(
+        config['aws'],
+        access_key=resolve_secret(config['aws']['access_key']),
+        secret_key=resolve_secret(config['aws']['secret_key']),
+    )
 
+    def create():
         session = boto3.Session(
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-            region_name=aws_region
+            aws_access_key_id=aws['access_key'],
+            aws_secret_access_key=aws['secret_key'],
+            region_name=aws['region']
+        )
+        # endpoint_url points the client at an S3-compatible service such as moto.
+        return session.client(
+            's3',
+            endpoint_url=aws.get('endpoint_url'),
+            config=Config(
+                max_pool_connections=max_connections(config),
+                tcp_keepalive=True,
+                retries={'mode': 'standard'},
+            ),
         )
-        s3 = session.client('s3')
+
+    # boto3 clients are thread-safe; sessions are not, so each is used once.
+    return cached_client(
+        'aws',
+        (aws['access_key'], aws['secret_key'], aws['region'], aws.get('endpoint_url')),
+        create,
+    )
+
+def store_on_s3(file_path: str, bucket_name: str, logger, object_name: str = None):
+    try:
+        s3 = _s3_client()
+        object_name = object_name or os.path.basename(file_path)
 
 
         logger.info("Uploading backup to S3...")
-        s3.upload_file(file_path, bucket_name, os.path.basename(file_path))
-        logger.info(f"Backup uploaded to S3 bucket '{bucket_name}' as {os.path.basename(file_path)}")
+        settings = upload_settings(load_config())
+        if os.path.getsize(file_path) > settings["part_size"]:
+            S3MultipartUploader(s3, **settings).upload(file_path, bucket_name, object_name, logger)
+        else:
+            # One part size for every upload keeps ETags predictable.
+            transfer_config = TransferConfig(
+                multipart_threshold=settings["part_size"],
+                multipart_chunksize=settings["part_size"],
+            )
+            throttle = current_throttle()
+            if throttle:
+                with open(file_path, "rb") as file:
+                    s3.upload_fileobj(
+                        throttle.reader(file), bucket_name, object_name, Config=transfer_config
+                    )
+            else:
+                s3.upload_file(file_path, bucket_name, object_name, Config=transfer_config)
+        logger.info(f"Backup uploaded to S3 bucket '{bucket_name}' as {object_name}")
     except Exception as e:
         raise RuntimeError(f"Error uploading backup to S3: {e}")
+
+def stream_to_s3(chunks, bucket_name: str, object_name: str, logger):
+    """
+    Upload a stream of chunks to S3 as a multipart upload without a local file.
+    """
+    try:
+        s3 = _s3_client()
+        logger.info(f"Streaming backup to S3 as {object_name}...")
+        settings = upload_settings(load_config())
+        transfer_config = TransferConfig(
+            multipart_threshold=settings["part_size"],
+            multipart_chunksize=settings["part_size"],
+            max_concurrency=settings["concurrency"],
+        )
+        s3.upload_fileobj(as_file(chunks), bucket_name, object_name, Config=transfer_config)
+        logger.info(f"Backup streamed to S3 bucket '{bucket_name}' as {object_name}")
+    except Exception as e:
+        raise RuntimeError(f"Error streaming backup to S3: {e}")
+
+def fetch_from_s3(bucket_name: str, object_name: str) -> bytes:
+    """
+    Download a small object from S3 into memory.
+    """
+    try:
+        return _s3_client().get_object(Bucket=bucket_name, Key=object_name)["Body"].read()
+    except Exception as e:
+        raise RuntimeError(f"Error downloading {object_name} from S3: {e}")
+
+def read_range_from_s3(bucket_name: str, object_name: str, offset: int, length: int = None) -> bytes:
+    """
+    Read a byte range of an object with one ranged GET. A negative offset
+    reads the last ``-offset`` bytes.
+    """
+    if offset < 0:
+        byte_range = f"bytes={offset}"
+    elif length is None:
+        byte_range = f"bytes={offset}-"
+    else:
+        byte_range = f"bytes={offset}-{offset + length - 1}"
+    try:
+        return _s3_client().get_object(
+            Bucket=bucket_name, Key=object_name, Range=byte_range
+        )["Body"].read()
+    except Exception as e:
+        raise RuntimeError(f"Error reading {object_name} from S3: {e}")
+
+def download_from_s3(bucket_name: str, object_name: str):
+    """
+    Yield an object from S3 in chunks as it downloads.
+    """
+    try:
+        body = _s3_client().get_object(Bucket=bucket_name, Key=object_name)["Body"]
+    except Exception as e:
+        raise RuntimeError(f"Error downloading {object_name} from S3: {e}")
+    try:
+        yield from body.iter_chunks(CHUNK_SIZE)
+    finally:
+        body.close()
+
+def list_s3_objects(bucket_name: str, prefix: str = ""):
+    """
+    List the names of the objects under a prefix.
+    """
+    try:
+        paginator = _s3_client().get_paginator("list_objects_v2")
+        return [
+            item["Key"]
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix)
+            for item in page.get("Contents", [])
+        ]
+    except Exception as e:
+        raise RuntimeError(f"Error listing S3 bucket '{bucket_name}': {e}")
+
+def delete_from_s3(bucket_name: str, object_name: str):
+    """
+    Delete an object from S3.
+    """
+    try:
+        _s3_client().delete_object(Bucket=bucket_name, Key=object_name)
+    except Exception as e:
+        raise RuntimeError(f"Error deleting {object_name} from S3: {e}")
+
+def stat_s3_object(bucket_name: str, object_name: str):
+    """
+    Size and ETag of an object, without downloading it.
+    """
+    try:
+        head = _s3_client().head_object(Bucket=bucket_name, Key=object_name)
+    except Exception as e:
+        raise RuntimeError(f"Error reading {object_name} from S3: {e}")
+    return {
+        "size": head["ContentLength"],
+        "etag": head["ETag"].strip('"'),
+        "md5": None,
+        "crc32c": None,
+    }
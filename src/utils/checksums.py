@@ -0,0 +1,196 @@
+import base64
+import hashlib
+from functools import lru_cache
+
+
+def _blake3():
+    from blake3 import blake3
+
+    return blake3(max_threads=blake3.AUTO)
+
+
+def _xxh3_128():
+    import xxhash
+
+    return xxhash.xxh3_128()
+
+
+# Fast non-cryptographic or tree hashes, fastest first; the first one that
+# imports is used. blake2b is in the standard library, so one always does.
+FAST_HASHES = {
+    "blake3": _blake3,
+    "xxh3_128": _xxh3_128,
+    "blake2b": hashlib.blake2b,
+}
+AUDIT_HASH = "sha256"
+
+
+@lru_cache(maxsize=None)
+def available(name):
+    """
+    Check whether a hash algorithm can be computed here.
+    """
+    if name == AUDIT_HASH:
+        return True
+    try:
+        FAST_HASHES[name]()
+        return True
+    except (ImportError, KeyError):
+        return False
+
+
+def fast_hash():
+    """
+    Name of the fastest hash available: blake3 or xxh3_128 if installed,
+    blake2b otherwise.
+    """
+    return next(name for name in FAST_HASHES if available(name))
+
+
+def new_hash(name):
+    if name == AUDIT_HASH:
+        return hashlib.sha256()
+    return FAST_HASHES[name]()
+
+
+class _PartMD5:
+    # MD5 of each ``part_size`` part, from which the S3 ETag of a single or
+    # multipart upload and the Content-MD5 of a single-put blob follow.
+    def __init__(self, part_size):
+        self.part_size = part_size
+        self.parts = []
+        self._current = hashlib.md5()
+        self._filled = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self.part_size - self._filled)
+            self._current.update(view[:take])
+            self._filled += take
+            view = view[take:]
+            if self._filled == self.part_size:
+                self.parts.append(self._current.hexdigest())
+                self._current, self._filled = hashlib.md5(), 0
+
+    def hexdigests(self):
+        if self._filled or not self.parts:
+            return self.parts + [self._current.hexdigest()]
+        return list(self.parts)
+
+
+class _CRC32C:
+    def __init__(self):
+        import google_crc32c
+
+        self._checksum = google_crc32c.Checksum()
+
+    def update(self, data):
+        self._checksum.update(bytes(data))
+
+    def hexdigest(self):
+        return self._checksum.digest().hex()
+
+
+class Checksums:
+    """
+    Hashes computed in one pass over a stream.
+
+    Always computes the fast hash and SHA-256; ``md5_part_size`` adds the
+    per-part MD5s that S3 ETags and Azure Content-MD5 are derived from, and
+    ``crc32c`` adds the CRC32C that Google Cloud Storage keeps. All of them
+    release the GIL on large chunks, so hashing overlaps with compression,
+    encryption and uploads running in other threads.
+
+    Args:
+        algorithms (list, optional): Hashes to compute; the fast hash and
+            SHA-256 if None.
+        md5_part_size (int, optional): Part size for per-part MD5s.
+        crc32c (bool): Whether to compute CRC32C.
+    """
+
+    def __init__(self, algorithms=None, md5_part_size=None, crc32c=False):
+        self.size = 0
+        self._hashes = {
+            name: new_hash(name) for name in algorithms or (fast_hash(), AUDIT_HASH)
+        }
+        self._md5 = _PartMD5(md5_part_size) if md5_part_size else None
+        self._crc32c = _CRC32C() if crc32c else None
+
+    @classmethod
+    def for_providers(cls, providers, part_size=None):
+        """
+        Checksums covering what the given storage providers report without a
+        download.
+
+        Args:
+            providers (list): ``StorageProvider`` objects receiving the data.
+            part_size (int, optional): Upload part size.
+        """
+        kinds = {provider.checksum for provider in providers}
+        return cls(
+            md5_part_size=part_size if "md5" in kinds else None,
+            crc32c="crc32c" in kinds,
+        )
+
+    def update(self, data):
+        self.size += len(data)
+        for digest in self._hashes.values():
+            digest.update(data)
+        if self._md5:
+            self._md5.update(data)
+        if self._crc32c:
+            self._crc32c.update(data)
+
+    def wrap(self, chunks):
+        """
+        Pass a stream through, hashing it on the way.
+        """
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+
+    def result(self):
+        """
+        Returns:
+            dict: The size and the hex digest of each hash.
+        """
+        result = {"size": self.size}
+        result.update({name: digest.hexdigest() for name, digest in self._hashes.items()})
+        if self._md5:
+            result["part_size"] = self._md5.part_size
+            result["md5_parts"] = self._md5.hexdigests()
+        if self._crc32c:
+            result["crc32c"] = self._crc32c.hexdigest()
+        return result
+
+
+def s3_etag(entry):
+    """
+    The ETag S3 gives an object uploaded in ``part_size`` parts: the MD5 of
+    a single-request upload, or the MD5 of the part MD5s and the part count.
+
+    Args:
+        entry (dict): Checksums of the object with ``md5_parts``.
+
+    Returns:
+        str: The expected ETag, or None if no part MD5s were recorded.
+    """
+    parts = entry.get("md5_parts")
+    if not parts:
+        return None
+    if entry["size"] < entry["part_size"]:
+        return parts[0]
+    combined = hashlib.md5(b"".join(bytes.fromhex(part) for part in parts))
+    return f"{combined.hexdigest()}-{len(parts)}"
+
+
+def base64_to_hex(value):
+    """
+    Convert a base64 checksum, as reported by GCS and Azure, to hex.
+    """
+    if not value:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).hex()
+    return base64.b64decode(value).hex()
@@ -1,44 +1,426 @@
 import tarfile
 import os
-import gzip
-import shutil
+import lzma
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from utils.pipeline import CHUNK_SIZE, as_file, read_chunks, write_stream
 
+# Input is split into independent blocks that are compressed concurrently and
+# concatenated. gzip members, xz streams, zstd frames and lz4 frames can all be
+# concatenated, so the result is one standard stream every decoder accepts.
+BLOCK_SIZE = 4 * CHUNK_SIZE
 
-def compress_backup(backup_file, output_file):
+
+class Codec:
+    """
+    A compression format that can compress independent blocks and decompress
+    concatenated blocks.
+
+    Args:
+        name (str): Codec name used on the command line.
+        extension (str): File extension, including the leading dot.
+        magic (bytes): Leading bytes identifying a compressed stream.
+        default_level (int): Level used when none is given.
+        compress_block (callable): ``(data, level) -> bytes``.
+        decompressobj (callable): Returns an object with ``decompress``,
+            ``eof`` and ``unused_data`` like ``zlib.decompressobj``.
+    """
+
+    def __init__(self, name, extension, magic, default_level, compress_block, decompressobj):
+        self.name = name
+        self.extension = extension
+        self.magic = magic
+        self.default_level = default_level
+        self.compress_block = compress_block
+        self.decompressobj = decompressobj
+
+
+CODECS = {}
+
+
+def register_codec(codec):
+    """
+    Add a codec to the registry, replacing any codec with the same name.
+    """
+    CODECS[codec.name] = codec
+    return codec
+
+
+def get_codec(name):
+    """
+    Look up a registered codec by name.
+
+    Raises:
+        ValueError: If the codec is unknown.
+    """
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unsupported codec '{name}'. Choose one of: {', '.join(CODECS)}."
+        )
+
+
+def detect_codec(header):
+    """
+    Identify the codec of a compressed stream from its leading bytes.
+
+    Returns:
+        Codec: The matching codec, or None if the data is not compressed.
+    """
+    for codec in CODECS.values():
+        if header.startswith(codec.magic):
+            return codec
+    return None
+
+
+def _gzip_block(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _zstd_block(data, level):
+    import zstandard
+
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _zstd_decompressobj():
+    import zstandard
+
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def _lz4_block(data, level):
+    import lz4.frame
+
+    return lz4.frame.compress(data, compression_level=level)
+
+
+def _lz4_decompressobj():
+    import lz4.frame
+
+    return lz4.frame.LZ4FrameDecompressor()
+
+
+register_codec(
+    Codec(
+        "gzip",
+        ".gz",
+        b"\x1f\x8b",
+        6,
+        _gzip_block,
+        lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+    )
+)
+register_codec(
+    Codec(
+        "zstd",
+        ".zst",
+        b"\x28\xb5\x2f\xfd",
+        3,
+        _zstd_block,
+        _zstd_decompressobj,
+    )
+)
+register_codec(
+    Codec(
+        "lz4",
+        ".lz4",
+        b"\x04\x22\x4d\x18",
+        0,
+        _lz4_block,
+        _lz4_decompressobj,
+    )
+)
+register_codec(
+    Codec(
+        "xz",
+        ".xz",
+        b"\xfd7zXZ\x00",
+        6,
+        lambda data, level: lzma.compress(data, format=lzma.FORMAT_XZ, preset=level),
+        lzma.LZMADecompressor,
+    )
+)
+
+
+class ParallelCompressor:
+    """
+    Block-parallel compressor with a ``zlib.compressobj``-like interface.
+
+    Blocks are compressed on a thread pool (the codec libraries release the
+    GIL) and returned in input order. At most ``2 * threads`` blocks are in
+    flight, which bounds memory use.
+
+    Args:
+        codec (str): Codec name.
+        level (int, optional): Compression level; the codec default if None.
+        threads (int, optional): Worker threads; the CPU count if None.
+        block_size (int): Uncompressed size of each independent block.
+    """
+
+    def __init__(self, codec="gzip", level=None, threads=None, block_size=BLOCK_SIZE):
+        self.codec = get_codec(codec)
+        self.level = self.codec.default_level if level is None else level
+        self.threads = threads or os.cpu_count() or 1
+        self.block_size = block_size
+        self._executor = ThreadPoolExecutor(max_workers=self.threads)
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._blocks = 0
+
+    def _submit(self, data):
+        self._pending.append(
+            self._executor.submit(self.codec.compress_block, data, self.level)
+        )
+        self._blocks += 1
+
+    def compress(self, data):
+        """
+        Add data and return any compressed blocks that are ready.
+
+        Returns:
+            list: Compressed blocks, in order.
+        """
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[: self.block_size]))
+            del self._buffer[: self.block_size]
+
+        ready = []
+        while self._pending and (
+            len(self._pending) >= 2 * self.threads or self._pending[0].done()
+        ):
+            ready.append(self._pending.popleft().result())
+        return ready
+
+    def flush(self):
+        """
+        Compress any buffered data and return all remaining blocks.
+
+        Returns:
+            list: Compressed blocks, in order.
+        """
+        if self._buffer or not self._blocks:
+            # Empty input still produces one valid (empty) member.
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        try:
+            return [future.result() for future in self._pending]
+        finally:
+            self._pending.clear()
+            self._executor.shutdown()
+
+    def cancel(self):
+        """
+        Drop pending blocks and stop the worker threads.
+        """
+        self._pending.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class CompressedWriter:
     """
-    Compress a backup file using gzip.
+    Writable file object that compresses into another file object.
+    """
+
+    def __init__(self, file_obj, codec="gzip", level=None, threads=None):
+        self._file = file_obj
+        self._compressor = ParallelCompressor(codec, level, threads)
+
+    def write(self, data):
+        for block in self._compressor.compress(data):
+            self._file.write(block)
+        return len(data)
+
+    def close(self):
+        for block in self._compressor.flush():
+            self._file.write(block)
+
+
+def compress_stream(chunks, codec="gzip", level=None, threads=None):
+    """
+    Compress a stream of chunks using the block-parallel compressor.
+
+    Args:
+        chunks (iterable): Iterator yielding bytes.
+        codec (str): Codec name (gzip, zstd, lz4, xz).
+        level (int, optional): Compression level.
+        threads (int, optional): Number of compression threads.
+
+    Yields:
+        bytes: Compressed data.
+    """
+    compressor = ParallelCompressor(codec, level, threads)
+    try:
+        for chunk in chunks:
+            yield from compressor.compress(chunk)
+    except BaseException:
+        compressor.cancel()
+        raise
+    yield from compressor.flush()
+
+
+def decompress_stream(chunks):
+    """
+    Decompress a stream, detecting the codec from its magic bytes.
+
+    Concatenated members are decoded one after another. Uncompressed input
+    is passed through unchanged.
+
+    Args:
+        chunks (iterable): Iterator yielding bytes.
+
+    Yields:
+        bytes: Decompressed data.
+
+    Raises:
+        EOFError: If the stream ends in the middle of a member.
+    """
+    chunks = iter(chunks)
+    first = b""
+    for first in chunks:
+        if first:
+            break
+    codec = detect_codec(first)
+    if codec is None:
+        if first:
+            yield first
+        yield from chunks
+        return
+
+    decompressor = codec.decompressobj()
+    pending = False
+    for chunk in _prepend(first, chunks):
+        while chunk:
+            pending = True
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            if not decompressor.eof:
+                break
+            chunk = decompressor.unused_data
+            decompressor = codec.decompressobj()
+            pending = False
+    if pending:
+        raise EOFError(f"Compressed {codec.name} stream ended before the end of a member.")
+
+
+def _prepend(first, chunks):
+    yield first
+    yield from chunks
+
+
+def is_tar_header(head):
+    """
+    Check whether leading bytes start a (POSIX or GNU) tar archive.
+    """
+    return len(head) >= 262 and head[257:262] == b"ustar"
+
+
+def tar_member_stream(chunks):
+    """
+    Yield the contents of the first regular file in a tar stream.
+
+    Raises:
+        ValueError: If the archive holds no regular file.
+    """
+    with tarfile.open(fileobj=as_file(chunks), mode="r|") as tar:
+        for member in tar:
+            if member.isfile():
+                yield from read_chunks(tar.extractfile(member))
+                return
+    raise ValueError("The tar archive contains no file.")
+
+
+def extract_tar_stream(chunks, path):
+    """
+    Extract a tar stream into a directory without writing the archive.
+    """
+    with tarfile.open(fileobj=as_file(chunks), mode="r|") as tar:
+        tar.extractall(path=path)
+    return path
+
+
+def split_compressed_name(backup_file):
+    """
+    Split a compressed backup name into its base name and tar flag.
+
+    Returns:
+        tuple: ``(base_name, is_tar)`` for a recognised extension such as
+        ``.tar.zst`` or ``.gz``, or ``(backup_file, None)`` otherwise.
+    """
+    for codec in CODECS.values():
+        if backup_file.endswith(f".tar{codec.extension}"):
+            return backup_file[: -len(f".tar{codec.extension}")], True
+        if backup_file.endswith(codec.extension):
+            return backup_file[: -len(codec.extension)], False
+    return backup_file, None
+
+
+def compress_backup(backup_file, output_file, codec="gzip", level=None, threads=None):
+    """
+    Compress a backup file.
 
     Args:
         backup_file (str): The path to the backup file.
         output_file (str): The path for the compressed output file.
+        codec (str): Codec name (gzip, zstd, lz4, xz).
+        level (int, optional): Compression level.
+        threads (int, optional): Number of compression threads.
     """
     with open(backup_file, "rb") as f_in:
-        with gzip.open(output_file, "wb") as f_out:
-            shutil.copyfileobj(f_in, f_out)
+        write_stream(compress_stream(read_chunks(f_in), codec, level, threads), output_file)
     print(f"Backup compressed successfully. File saved to {output_file}")
     return output_file
 
 
-def compress_backup_tar_file(backup_file, output_file):
+def decompress_backup(backup_file, output_file):
     """
-    Compress a backup file using tar and gzip.
+    Decompress a file compressed with any registered codec.
+
+    Args:
+        backup_file (str): The path to the compressed file.
+        output_file (str): The path for the decompressed output file.
+    """
+    with open(backup_file, "rb") as f_in:
+        write_stream(decompress_stream(read_chunks(f_in)), output_file)
+    return output_file
+
+
+def compress_backup_tar_file(backup_file, output_file, codec="gzip", level=None, threads=None):
+    """
+    Compress a backup file using tar and the selected codec.
     """
-    with tarfile.open(output_file, "w:gz") as tar:
-        tar.add(backup_file, arcname=os.path.basename(backup_file))
+    with open(output_file, "wb") as f_out:
+        writer = CompressedWriter(f_out, codec, level, threads)
+        # The name lets tarfile skip the archive if it lies inside backup_file.
+        with tarfile.open(output_file, mode="w|", fileobj=writer) as tar:
+            tar.add(backup_file, arcname=os.path.basename(backup_file))
+        writer.close()
     print(f"Backup compressed successfully. File saved to {output_file}")
     return output_file
 
 
-def compress_backup_tar_folder(backup_file, output_file):
+def compress_backup_tar_folder(backup_file, output_file, codec="gzip", level=None, threads=None):
     """
-    Compress a backup file using tar and gzip.
+    Compress a backup file using tar and the selected codec.
 
     Args:
         backup_file (str): Path to the folder or file to compress
-        output_file (str): Path where the compressed .tar.gz file will be saved
+        output_file (str): Path where the compressed tar file will be saved
+        codec (str): Codec name (gzip, zstd, lz4, xz).
+        level (int, optional): Compression level.
+        threads (int, optional): Number of compression threads.
     """
-    with tarfile.open(output_file, "w:gz") as tar:
-        tar.add(backup_file, arcname=os.path.basename(os.path.normpath(backup_file)))
+    with open(output_file, "wb") as f_out:
+        writer = CompressedWriter(f_out, codec, level, threads)
+        # The name lets tarfile skip the archive if it lies inside backup_file.
+        with tarfile.open(output_file, mode="w|", fileobj=writer) as tar:
+            tar.add(backup_file, arcname=os.path.basename(os.path.normpath(backup_file)))
+        writer.close()
     print(f"Backup compressed successfully. File saved to {output_file}")
     return output_file
 
@@ -47,49 +429,51 @@ def decompress_backup_file(backup_file):
     """
     Decompress a compressed backup file.
 
+    The codec is detected from the file's magic bytes; the extension decides
+    whether the content is a tar archive or a single file.
+
     :param backup_file: The path to the compressed backup file
     :return: The path to the decompressed SQL file
     """
-    if backup_file.endswith(".tar.gz"):
-        decompressed_file = backup_file[:-7]
-        with tarfile.open(backup_file, "r:gz") as tar:
-            tar.extractall(path=os.path.dirname(backup_file))
-        return decompressed_file
-
-    elif backup_file.endswith(".gz"):
-        decompressed_file = backup_file[:-3]
-        with gzip.open(backup_file, "rb") as f_in:
-            with open(decompressed_file, "wb") as f_out:
-                shutil.copyfileobj(f_in, f_out)
-        return decompressed_file
-
-    else:
+    decompressed_file, is_tar = split_compressed_name(backup_file)
+    if is_tar is None:
         return backup_file  # Not compressed, return the original file
 
+    with open(backup_file, "rb") as f_in:
+        chunks = decompress_stream(read_chunks(f_in))
+        if is_tar:
+            with tarfile.open(fileobj=as_file(chunks), mode="r|") as tar:
+                tar.extractall(path=os.path.dirname(backup_file))
+        else:
+            write_stream(chunks, decompressed_file)
+    return decompressed_file
+
 
 def decompress_backup_tar_folder(backup_file):
     """
-    Decompress a .gz tar file, preserving the original folder structure.
+    Decompress a compressed tar file, preserving the original folder structure.
 
     Args:
-        backup_file (str): Path to the .tar.gz file to decompress
+        backup_file (str): Path to the .tar.<codec> file to decompress
 
     Returns:
         str: Path to the decompressed folder
     """
-    if not backup_file.endswith(".tar.gz"):
-        raise ValueError("File must be a .tar.gz file")
+    base_name, is_tar = split_compressed_name(backup_file)
+    if not is_tar:
+        raise ValueError(
+            "File must be a compressed tar file (e.g. .tar.gz, .tar.zst)"
+        )
 
     extraction_path = os.path.dirname(backup_file)
 
-    with tarfile.open(backup_file, "r:gz") as tar:
+    with open(backup_file, "rb") as f_in:
+        chunks = decompress_stream(read_chunks(f_in))
+        with tarfile.open(fileobj=as_file(chunks), mode="r|") as tar:
 
-        tar.extractall(path=extraction_path)
+            tar.extractall(path=extraction_path)
 
-    decompressed_folder = os.path.join(
-        extraction_path,
-        os.path.splitext(os.path.splitext(os.path.basename(backup_file))[0])[0],
-    )
+    decompressed_folder = os.path.join(extraction_path, os.path.basename(base_name))
 
     print(f"Backup decompressed successfully. Extracted to {decompressed_folder}")
     return decompressed_folder
@@ -0,0 +1,26 @@
+import json
+import os
+from functools import lru_cache
+
+DEFAULT_CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.json"
+)
+
+
+@lru_cache(maxsize=None)
+def load_config(path=None):
+    """
+    Read the JSON config once and cache it.
+
+    The path is taken from the BACKUP_CONFIG environment variable, falling
+    back to ``config.json`` next to ``cli.py``.
+
+    Args:
+        path (str, optional): Config file to read instead.
+
+    Returns:
+        dict: The parsed config.
+    """
+    path = path or os.getenv("BACKUP_CONFIG", DEFAULT_CONFIG_PATH)
+    with open(path, "r") as file:
+        return json.load(file)
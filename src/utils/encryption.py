@@ -1,35 +1,202 @@
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+import base64
 import os
+import struct
+from functools import lru_cache
 from dotenv import load_dotenv
+from utils.pipeline import read_chunks, write_stream
 
 load_dotenv()
 
 
-key = os.getenv("ENCRYPTION_KEY")
-cipher = Fernet(key)
+@lru_cache(maxsize=None)
+def _master_key():
+    # Read on first use, so commands that never encrypt do not need the key.
+    key = os.getenv("ENCRYPTION_KEY")
+    if not key:
+        raise RuntimeError("ENCRYPTION_KEY is not set.")
+    return key
+
+
+def _fernet():
+    return Fernet(_master_key())
+
+
+# Streaming format: MAGIC + 7-byte nonce prefix, then frames of
+# [4-byte length | AES-GCM ciphertext]. The top bit of the length marks the
+# final frame; the nonce is prefix + 4-byte counter + final flag.
+STREAM_MAGIC = b"DBKENC\x00\x01"
+STREAM_CHUNK_SIZE = 1024 * 1024
+# Legacy whole-file Fernet tokens: base64 of version byte 0x80 and a timestamp.
+FERNET_PREFIX = b"gAAAAA"
+_NONCE_PREFIX_SIZE = 7
+_FINAL_FLAG = 0x80000000
+
+
+@lru_cache(maxsize=None)
+def derive_key(purpose):
+    """
+    Derive a 256-bit key for ``purpose`` from ENCRYPTION_KEY.
+
+    Args:
+        purpose (bytes): Label separating keys used for different things.
+
+    Returns:
+        bytes: The derived key.
+    """
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"database-backup-utility " + purpose,
+    ).derive(base64.urlsafe_b64decode(_master_key()))
+
+
+def _stream_cipher():
+    return AESGCM(derive_key(b"stream v1"))
+
+
+def _nonce(prefix, counter, final):
+    return prefix + struct.pack(">IB", counter, 1 if final else 0)
+
+
+def encrypt_stream(chunks, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Encrypt a stream of chunks into the framed AES-GCM format.
+
+    Memory use is bounded by ``chunk_size`` regardless of the stream length.
+
+    Args:
+        chunks (iterable): Iterator yielding plaintext bytes.
+        chunk_size (int): Plaintext size of each encrypted frame.
+
+    Yields:
+        bytes: Header followed by encrypted frames.
+    """
+    aead = _stream_cipher()
+    prefix = os.urandom(_NONCE_PREFIX_SIZE)
+    header = STREAM_MAGIC + prefix
+    yield header
+
+    counter = 0
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) > chunk_size:
+            frame = aead.encrypt(
+                _nonce(prefix, counter, False), bytes(buffer[:chunk_size]), header
+            )
+            del buffer[:chunk_size]
+            counter += 1
+            yield struct.pack(">I", len(frame)) + frame
+
+    frame = aead.encrypt(_nonce(prefix, counter, True), bytes(buffer), header)
+    yield struct.pack(">I", len(frame) | _FINAL_FLAG) + frame
+
+
+def _read_exact(file_obj, size):
+    data = file_obj.read(size)
+    if len(data) != size:
+        raise ValueError("Encrypted stream is truncated.")
+    return data
+
+
+def decrypt_stream(file_obj):
+    """
+    Decrypt a framed AES-GCM stream.
+
+    Args:
+        file_obj: Binary file object positioned at the stream header.
+
+    Yields:
+        bytes: Decrypted plaintext chunks.
+
+    Raises:
+        ValueError: If the stream is not in the expected format, has been
+            truncated or has trailing data.
+        cryptography.exceptions.InvalidTag: If a frame fails authentication.
+    """
+    header = _read_exact(file_obj, len(STREAM_MAGIC) + _NONCE_PREFIX_SIZE)
+    if not header.startswith(STREAM_MAGIC):
+        raise ValueError("Not an encrypted backup stream.")
+    prefix = header[len(STREAM_MAGIC):]
+    aead = _stream_cipher()
+
+    counter = 0
+    while True:
+        (length,) = struct.unpack(">I", _read_exact(file_obj, 4))
+        final = bool(length & _FINAL_FLAG)
+        frame = _read_exact(file_obj, length & ~_FINAL_FLAG)
+        yield aead.decrypt(_nonce(prefix, counter, final), frame, header)
+        if final:
+            break
+        counter += 1
+
+    if file_obj.read(1):
+        raise ValueError("Unexpected data after the end of the encrypted stream.")
 
 
 def encrypt_file(file_path):
-    with open(file_path, "rb") as file:
-        data = file.read()
-    encrypted_data = cipher.encrypt(data)
+    """
+    Encrypt a file with the streaming format, using constant memory.
+
+    Args:
+        file_path (str): Path to the file to encrypt.
 
+    Returns:
+        str: Path to the encrypted ``.enc`` file.
+    """
     encrypted_file_path = f"{file_path}.enc"
-    with open(encrypted_file_path, "wb") as file:
-        file.write(encrypted_data)
+    with open(file_path, "rb") as file:
+        write_stream(encrypt_stream(read_chunks(file)), encrypted_file_path)
 
     return encrypted_file_path
 
 
+def is_stream_encrypted(file_path):
+    """
+    Check whether a file uses the streaming format rather than legacy Fernet.
+    """
+    with open(file_path, "rb") as file:
+        return file.read(len(STREAM_MAGIC)) == STREAM_MAGIC
+
+
+def decrypt_token(token):
+    """
+    Decrypt a legacy whole-file Fernet token.
+    """
+    return _fernet().decrypt(token)
+
+
 def decrypt_file(file_path):
+    """
+    Decrypt an ``.enc`` file written by ``encrypt_file``.
+
+    Files in the streaming format are decrypted frame by frame; legacy
+    whole-file Fernet tokens are still accepted.
+
+    Args:
+        file_path (str): Path to the encrypted file.
+
+    Returns:
+        str: Path to the decrypted file.
+    """
     if not file_path.endswith(".enc"):
         raise ValueError("The file does not have the expected .enc extension.")
 
+    original_file_path = file_path[:-4]
+    if is_stream_encrypted(file_path):
+        with open(file_path, "rb") as file:
+            write_stream(decrypt_stream(file), original_file_path)
+        return original_file_path
+
     with open(file_path, "rb") as file:
         encrypted_data = file.read()
-    data = cipher.decrypt(encrypted_data)
+    data = decrypt_token(encrypted_data)
 
-    original_file_path = file_path[:-4]
     with open(original_file_path, "wb") as file:
         file.write(data)
 
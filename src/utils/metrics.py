@@ -0,0 +1,413 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Stages in pipeline order, so reports read like the data flow.
+STAGE_ORDER = [
+    "count",
+    "dump",
+    "download",
+    "read",
+    "compress",
+    "encrypt",
+    "pack",
+    "decrypt",
+    "decompress",
+    "unpack",
+    "throttle",
+    "store",
+    "upload",
+    "restore",
+]
+
+
+def _peak_rss(who):
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageMetrics:
+    """
+    Totals of one pipeline stage, summed over everything metered under its name.
+
+    ``seconds`` and ``cpu_seconds`` exclude the time spent waiting for the
+    previous stage. CPU time is the process's, so it includes helper threads
+    (e.g. parallel compression) but also any other work running in the
+    process at the same time.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.child_cpu_seconds = 0.0
+
+    def as_dict(self):
+        return {
+            "stage": self.name,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "seconds": round(self.seconds, 6),
+            "cpu_seconds": round(self.cpu_seconds, 6),
+            "child_cpu_seconds": round(self.child_cpu_seconds, 6),
+            "throughput_bytes_per_second": (
+                round(max(self.bytes_in, self.bytes_out) / self.seconds)
+                if self.seconds
+                else None
+            ),
+            "ratio": (
+                round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None
+            ),
+        }
+
+
+class Meter:
+    """
+    Iterator wrapper counting the bytes and time of one stage of a chunk
+    pipeline. Wrapping a ``Meter`` chains the stages: time spent inside the
+    upstream stage is subtracted, and its output counts as this stage's input.
+    ``upstream`` names the previous stage when other iterators sit in between.
+    """
+
+    def __init__(self, metrics, stage, chunks, upstream=None):
+        self._metrics = metrics
+        self._stage = stage
+        self._upstream = upstream or (chunks if isinstance(chunks, Meter) else None)
+        self._chunks = iter(chunks)
+        self.seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.bytes = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        upstream = self._upstream
+        if upstream:
+            before = (upstream.seconds, upstream.cpu_seconds, upstream.bytes)
+        chunk = b""
+        started, cpu_started = time.perf_counter(), time.process_time()
+        try:
+            chunk = next(self._chunks)
+            return chunk
+        finally:
+            seconds = time.perf_counter() - started
+            cpu_seconds = time.process_time() - cpu_started
+            self.seconds += seconds
+            self.cpu_seconds += cpu_seconds
+            self.bytes += len(chunk)
+            bytes_in = 0
+            if upstream:
+                seconds -= upstream.seconds - before[0]
+                cpu_seconds -= upstream.cpu_seconds - before[1]
+                bytes_in = upstream.bytes - before[2]
+            self._metrics.add(self._stage, bytes_in, len(chunk), seconds, cpu_seconds)
+
+
+class RunMetrics:
+    """
+    Per-stage metrics of one backup or restore run.
+
+    Chunk pipelines are wrapped with ``meter`` and drained inside ``sink``.
+    File-based steps are timed with ``stage``. The overhead is a few clock
+    reads per chunk, so metrics are always collected. ``report``,
+    ``write_json`` and ``write_prometheus`` export them.
+
+    Args:
+        operation (str): 'backup' or 'restore'.
+        labels (dict, optional): Labels identifying the run, e.g. ``db_type``
+            and ``database``.
+    """
+
+    def __init__(self, operation, labels=None):
+        self.operation = operation
+        self.labels = dict(labels or {})
+        self.started = datetime.now(timezone.utc)
+        self.status = None
+        self.location = None
+        self.seconds = None
+        self._clock = time.perf_counter()
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, bytes_in=0, bytes_out=0, seconds=0.0, cpu_seconds=0.0, child_cpu_seconds=0.0):
+        with self._lock:
+            totals = self._stages.get(stage)
+            if totals is None:
+                totals = self._stages[stage] = StageMetrics(stage)
+            totals.bytes_in += bytes_in
+            totals.bytes_out += bytes_out
+            totals.seconds += seconds
+            totals.cpu_seconds += cpu_seconds
+            totals.child_cpu_seconds += child_cpu_seconds
+
+    def meter(self, stage, chunks, upstream=None):
+        """
+        Count the bytes and time of a chunk pipeline stage.
+
+        Args:
+            stage (str): Stage name, e.g. 'compress'.
+            chunks (iterable): The stage's output.
+            upstream (Meter, optional): The previous stage, if ``chunks`` is
+                not itself a ``Meter``.
+
+        Returns:
+            Meter: Iterator yielding the same chunks.
+        """
+        return Meter(self, stage, chunks, upstream)
+
+    @contextmanager
+    def sink(self, stage, chunks):
+        """
+        Time a step that drains a metered pipeline, such as a write or an
+        upload, excluding the time spent producing its input.
+
+        Args:
+            stage (str): Stage name, e.g. 'upload'.
+            chunks (Meter): The pipeline being drained.
+        """
+        before = (chunks.seconds, chunks.cpu_seconds, chunks.bytes)
+        started, cpu_started = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.add(
+                stage,
+                chunks.bytes - before[2],
+                chunks.bytes - before[2],
+                time.perf_counter() - started - (chunks.seconds - before[0]),
+                time.process_time() - cpu_started - (chunks.cpu_seconds - before[1]),
+            )
+
+    @contextmanager
+    def stage(self, stage, bytes_in=0):
+        """
+        Time a file-based step. Set ``bytes_out`` on the yielded object, and
+        ``bytes_in`` if it was not known up front.
+
+        CPU time of child processes (pg_dump, mongodump) that exit during the
+        step is recorded as ``child_cpu_seconds``.
+        """
+        totals = StageMetrics(stage)
+        totals.bytes_in = bytes_in
+        child_started = self._child_cpu()
+        started, cpu_started = time.perf_counter(), time.process_time()
+        try:
+            yield totals
+        finally:
+            self.add(
+                stage,
+                totals.bytes_in,
+                totals.bytes_out,
+                time.perf_counter() - started,
+                time.process_time() - cpu_started,
+                self._child_cpu() - child_started,
+            )
+
+    def _child_cpu(self):
+        if resource is None:
+            return 0.0
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    def finish(self, status, location=None):
+        """
+        Record the outcome of the run.
+        """
+        self.status = status
+        self.location = location
+        self.seconds = time.perf_counter() - self._clock
+
+    def stages(self):
+        order = {name: index for index, name in enumerate(STAGE_ORDER)}
+        with self._lock:
+            stages = list(self._stages.values())
+        return sorted(stages, key=lambda s: order.get(s.name, len(order)))
+
+    def report(self):
+        """
+        Build the structured run report.
+
+        Returns:
+            dict: Run details, overall figures and one entry per stage.
+        """
+        seconds = self.seconds
+        if seconds is None:
+            seconds = time.perf_counter() - self._clock
+        return {
+            "operation": self.operation,
+            "labels": self.labels,
+            "started": self.started.isoformat(),
+            "seconds": round(seconds, 6),
+            "status": self.status,
+            "location": self.location,
+            "peak_rss_bytes": _peak_rss(resource.RUSAGE_SELF) if resource else None,
+            "children_peak_rss_bytes": (
+                _peak_rss(resource.RUSAGE_CHILDREN) if resource else None
+            ),
+            "stages": [stage.as_dict() for stage in self.stages()],
+        }
+
+    def summary(self):
+        """
+        One-line description of the stages for the log.
+        """
+        parts = []
+        for stage in self.stages():
+            entry = stage.as_dict()
+            rate = entry["throughput_bytes_per_second"]
+            text = f"{stage.name} {stage.seconds:.2f}s"
+            if rate:
+                text += f" {rate / 1048576:.1f} MiB/s"
+            if entry["ratio"] is not None and stage.bytes_in != stage.bytes_out:
+                text += f" ratio {entry['ratio']}"
+            parts.append(text)
+        return "; ".join(parts)
+
+    def write_json(self, path):
+        """
+        Write the run report as JSON.
+        """
+        _write_atomic(path, json.dumps(self.report(), indent=2))
+
+    def write_prometheus(self, path):
+        """
+        Write the run's metrics in the Prometheus text format, for the
+        node_exporter textfile collector. Give every job its own file: the
+        file is replaced, not appended to.
+        """
+        report = self.report()
+        base = dict(self.labels, operation=self.operation)
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                if value is not None:
+                    lines.append(f"{name}{{{_labels(labels)}}} {value}")
+
+        metric(
+            "backup_run_success",
+            "Whether the last run succeeded (1) or failed (0).",
+            [(base, 1 if self.status == "success" else 0)],
+        )
+        metric(
+            "backup_run_timestamp_seconds",
+            "Start time of the last run.",
+            [(base, round(self.started.timestamp(), 3))],
+        )
+        metric("backup_run_seconds", "Duration of the last run.", [(base, report["seconds"])])
+        metric(
+            "backup_run_peak_rss_bytes",
+            "Peak resident memory of the process.",
+            [(base, report["peak_rss_bytes"])],
+        )
+        stages = report["stages"]
+        for key, help_text in (
+            ("bytes_in", "Bytes entering the stage."),
+            ("bytes_out", "Bytes leaving the stage."),
+            ("seconds", "Wall time spent in the stage."),
+            ("cpu_seconds", "Process CPU time spent in the stage."),
+            ("child_cpu_seconds", "CPU time of child processes in the stage."),
+            ("throughput_bytes_per_second", "Stage throughput."),
+            ("ratio", "Output bytes per input byte."),
+        ):
+            metric(
+                f"backup_stage_{key}",
+                help_text,
+                [(dict(base, stage=stage["stage"]), stage[key]) for stage in stages],
+            )
+        _write_atomic(path, "\n".join(lines) + "\n")
+
+
+def write_restore_test_prometheus(reports, path):
+    """
+    Write the outcome and restore time of restore tests in the Prometheus
+    text format, one sample per tested database.
+
+    Args:
+        reports (list): Reports of ``database.restore_test.run_restore_test``.
+        path (str): File to replace.
+    """
+    lines = []
+    samples = [
+        (
+            {
+                "db_type": report["db_type"],
+                "host": report.get("host"),
+                "database": report["database"],
+            },
+            report,
+        )
+        for report in reports
+    ]
+    now = round(time.time(), 3)
+    for name, help_text, value in (
+        (
+            "backup_restore_test_success",
+            "Whether the last restore test passed (1) or not (0).",
+            lambda report: 1 if report["status"] == "passed" else 0,
+        ),
+        (
+            "backup_restore_test_rto_seconds",
+            "Time the last restore test took to restore the backup.",
+            lambda report: report["rto_seconds"],
+        ),
+        (
+            "backup_restore_test_timestamp_seconds",
+            "Time of the last restore test.",
+            lambda report: now,
+        ),
+    ):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, report in samples:
+            if value(report) is not None:
+                lines.append(f"{name}{{{_labels(labels)}}} {value(report)}")
+    _write_atomic(path, "\n".join(lines) + "\n")
+
+
+def _labels(labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    return ",".join(f'{key}="{escape(value)}"' for key, value in labels.items() if value is not None)
+
+
+def _write_atomic(path, text):
+    # Readers such as the textfile collector never see a half-written file.
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+
+def path_size(path):
+    """
+    Size in bytes of a file, or of all files below a directory.
+    """
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(path)
+            for name in names
+        )
+    return os.path.getsize(path)
@@ -1,4 +1,3 @@
-import requests
 import json
 
 def send_slack_notification(webhook_url, message):
@@ -8,6 +7,9 @@ def send_slack_notification(webhook_url, message):
     :param webhook_url: The Slack incoming webhook URL
     :param message: The message to send
     """
+    # requests is only loaded when a notification is actually sent.
+    import requests
+
     slack_data = {'text': message}
 
     try:
@@ -0,0 +1,87 @@
+import os
+from utils.compression import (
+    CODECS,
+    compress_backup,
+    decompress_backup,
+    decompress_stream,
+    get_codec,
+)
+from utils.encryption import (
+    FERNET_PREFIX,
+    STREAM_MAGIC,
+    decrypt_file,
+    decrypt_stream,
+    decrypt_token,
+    encrypt_file,
+)
+from utils.pipeline import as_file, peek
+
+
+def pack_file(file_path, compress, encrypt, codec="gzip", level=None, threads=None):
+    """
+    Compress and encrypt a file in place, removing the intermediate copies.
+
+    Args:
+        file_path (str): Path to the file to pack.
+        compress (bool): Whether to compress the file.
+        encrypt (bool): Whether to encrypt the file.
+        codec (str): Compression codec (gzip, zstd, lz4, xz).
+        level (int, optional): Compression level.
+        threads (int, optional): Compression threads.
+
+    Returns:
+        str: Path of the packed file.
+    """
+    packed = file_path
+    if compress:
+        packed = compress_backup(
+            file_path, f"{file_path}{get_codec(codec).extension}", codec, level, threads
+        )
+        os.remove(file_path)
+    if encrypt:
+        encrypted = encrypt_file(packed)
+        os.remove(packed)
+        packed = encrypted
+    return packed
+
+
+def unpack_file(file_path):
+    """
+    Decrypt and decompress a file packed by ``pack_file``, keeping the
+    original and removing any intermediate copy.
+
+    Returns:
+        str: Path of the plain file.
+    """
+    unpacked = file_path
+    if unpacked.endswith(".enc"):
+        unpacked = decrypt_file(unpacked)
+    for codec in CODECS.values():
+        if unpacked.endswith(codec.extension):
+            decompressed = decompress_backup(unpacked, unpacked[: -len(codec.extension)])
+            if unpacked != file_path:
+                os.remove(unpacked)
+            return decompressed
+    return unpacked
+
+
+def unpack_stream(chunks):
+    """
+    Decrypt and decompress a backup stream.
+
+    Encryption and compression are detected from the leading bytes, so any
+    combination written by the backup commands is accepted. Legacy Fernet
+    files have to be decrypted in one piece in memory.
+
+    Args:
+        chunks (iterable): Iterator yielding the stored backup bytes.
+
+    Yields:
+        bytes: The plain backup.
+    """
+    head, chunks = peek(chunks, len(STREAM_MAGIC))
+    if head == STREAM_MAGIC:
+        chunks = decrypt_stream(as_file(chunks))
+    elif head.startswith(FERNET_PREFIX):
+        chunks = iter([decrypt_token(b"".join(chunks))])
+    yield from decompress_stream(chunks)
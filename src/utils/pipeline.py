@@ -0,0 +1,249 @@
+import io
+import itertools
+import os
+import queue
+import subprocess
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class IterStream(io.RawIOBase):
+    """
+    Read-only file object over an iterator of byte chunks.
+
+    Lets SDKs that expect a file (boto3 ``upload_fileobj``, GCS
+    ``upload_from_file``) consume a pipeline without it touching disk.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def as_file(chunks, buffer_size=CHUNK_SIZE):
+    """
+    Wrap an iterator of byte chunks in a buffered file object.
+
+    Args:
+        chunks (iterable): Iterator yielding bytes.
+        buffer_size (int): Read buffer size.
+
+    Returns:
+        io.BufferedReader: File object reading from the iterator.
+    """
+    return io.BufferedReader(IterStream(chunks), buffer_size)
+
+
+def read_chunks(file_obj, chunk_size=CHUNK_SIZE):
+    """
+    Yield fixed-size chunks from a binary file object until EOF.
+    """
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def peek(chunks, size):
+    """
+    Look at the leading bytes of a stream without consuming them.
+
+    Args:
+        chunks (iterable): Iterator yielding bytes.
+        size (int): Number of bytes wanted; fewer are returned at EOF.
+
+    Returns:
+        tuple: ``(head, chunks)`` where ``chunks`` still yields the whole stream.
+    """
+    chunks = iter(chunks)
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= size:
+            break
+    return head[:size], itertools.chain([head] if head else [], chunks)
+
+
+def stream_command_output(command, env=None, chunk_size=CHUNK_SIZE):
+    """
+    Run a command and yield its stdout in chunks.
+
+    The process is killed if the consumer stops early, and a non-zero exit
+    status is raised once the output has been fully read.
+
+    Args:
+        command (list): Command and arguments to execute.
+        env (dict, optional): Environment for the child process.
+        chunk_size (int): Size of the chunks to read from stdout.
+
+    Raises:
+        subprocess.CalledProcessError: If the command exits with an error.
+    """
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, env=env)
+    try:
+        yield from read_chunks(process.stdout, chunk_size)
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, command)
+
+
+def feed_command(command, chunks, env=None):
+    """
+    Run a command with a stream of chunks as its stdin.
+
+    The process is killed if the stream fails, and a non-zero exit status is
+    raised once it has finished.
+
+    Args:
+        command (list): Command and arguments to execute.
+        chunks (iterable): Iterator yielding the bytes to send.
+        env (dict, optional): Environment for the child process.
+
+    Raises:
+        subprocess.CalledProcessError: If the command exits with an error.
+    """
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, env=env)
+    try:
+        for chunk in chunks:
+            process.stdin.write(chunk)
+    except BrokenPipeError:
+        pass  # The command stopped reading; its exit status says why.
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = process.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, command)
+
+
+def write_stream(chunks, output_file):
+    """
+    Write a stream of chunks to a file, removing it if the stream fails.
+
+    Args:
+        chunks (iterable): Iterator yielding bytes.
+        output_file (str): Destination file path.
+
+    Returns:
+        int: Number of bytes written.
+    """
+    written = 0
+    try:
+        with open(output_file, "wb") as f_out:
+            for chunk in chunks:
+                f_out.write(chunk)
+                written += len(chunk)
+    except BaseException:
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        raise
+    return written
+
+
+_END = object()
+
+
+class _SourceFailed:
+    def __init__(self, error):
+        self.error = error
+
+
+def _queued_chunks(chunk_queue):
+    while True:
+        item = chunk_queue.get()
+        if item is _END:
+            return
+        if isinstance(item, _SourceFailed):
+            raise RuntimeError(f"The source stream failed: {item.error}")
+        yield item
+
+
+def tee_stream(chunks, consumers, queue_size=4):
+    """
+    Feed one stream to several consumers running concurrently.
+
+    Each consumer runs in its own thread and reads from a bounded queue, so
+    the stream advances at the pace of the slowest consumer and at most
+    ``queue_size`` chunks are buffered per consumer. A consumer that fails
+    is dropped and the others carry on. If the stream itself fails, every
+    consumer's iterator raises so that partial output is cleaned up.
+
+    Args:
+        chunks (iterable): Iterator yielding bytes.
+        consumers (list): Callables each taking an iterator of the chunks.
+        queue_size (int): Chunks buffered per consumer.
+
+    Returns:
+        list: ``(result, error)`` per consumer, in order; ``error`` is None
+        if the consumer succeeded.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in consumers]
+    finished = [threading.Event() for _ in consumers]
+    outcomes = [(None, None)] * len(consumers)
+
+    def run(index):
+        try:
+            outcomes[index] = (consumers[index](_queued_chunks(queues[index])), None)
+        except Exception as e:
+            outcomes[index] = (None, e)
+        finally:
+            finished[index].set()
+
+    def offer(index, item):
+        # A consumer that has stopped reading must not block the others.
+        while not finished[index].is_set():
+            try:
+                queues[index].put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    threads = [
+        threading.Thread(target=run, args=(index,), daemon=True)
+        for index in range(len(consumers))
+    ]
+    for thread in threads:
+        thread.start()
+    end = _END
+    try:
+        for chunk in chunks:
+            live = [index for index in range(len(consumers)) if not finished[index].is_set()]
+            if not live:
+                break
+            for index in live:
+                offer(index, chunk)
+    except BaseException as e:
+        end = _SourceFailed(e)
+        raise
+    finally:
+        for index in range(len(consumers)):
+            offer(index, end)
+        for thread in threads:
+            thread.join()
+    return outcomes
@@ -0,0 +1,141 @@
+import os
+import re
+import shlex
+import subprocess
+from functools import lru_cache
+from utils.config import load_config
+
+# Handler parameters a connection profile may set.
+CONNECTION_FIELDS = ("host", "port", "user", "password", "database")
+# Backup options a storage profile may set.
+STORAGE_FIELDS = ("storage", "path", "provider", "bucket", "repository", "destinations")
+# Seconds a ``cmd:`` secret may take.
+SECRET_COMMAND_TIMEOUT = 30
+
+
+@lru_cache(maxsize=None)
+def resolve_secret(value):
+    """
+    Resolve a secret reference once per process and cache the result.
+
+    ``env:NAME`` reads the environment variable NAME, ``file:/path`` reads a
+    file such as a mounted Kubernetes or Docker secret, and ``cmd:command``
+    runs a command, e.g. a password manager CLI, and takes its output.
+    Trailing newlines are stripped. Any other value is returned unchanged.
+
+    Args:
+        value: The configured value.
+
+    Returns:
+        The secret, or ``value`` if it is not a reference.
+
+    Raises:
+        RuntimeError: If the variable is not set, or the file or command fails.
+    """
+    if not isinstance(value, str):
+        return value
+    scheme, _, reference = value.partition(":")
+    try:
+        if scheme == "env":
+            if reference not in os.environ:
+                raise RuntimeError(f"environment variable {reference} is not set")
+            return os.environ[reference]
+        if scheme == "file":
+            with open(os.path.expanduser(reference), "r") as file:
+                return file.read().rstrip("\r\n")
+        if scheme == "cmd":
+            result = subprocess.run(
+                shlex.split(reference),
+                check=True,
+                capture_output=True,
+                text=True,
+                timeout=SECRET_COMMAND_TIMEOUT,
+            )
+            return result.stdout.rstrip("\r\n")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to resolve secret {value}: {e.stderr.strip()}")
+    except (OSError, subprocess.TimeoutExpired, RuntimeError) as e:
+        raise RuntimeError(f"Failed to resolve secret {value}: {e}")
+    return value
+
+
+def _env_name(prefix, name, field):
+    return f"{prefix}_{re.sub(r'[^A-Z0-9]', '_', name.upper())}_{field.upper()}"
+
+
+def _profile(kind, prefix, name, fields):
+    """
+    A profile of the config's ``profiles.<kind>`` section, with each field
+    overridden by the ``<prefix>_<NAME>_<FIELD>`` environment variable.
+    """
+    profile = dict(load_config().get("profiles", {}).get(kind, {}).get(name, {}))
+    for field in fields:
+        value = os.getenv(_env_name(prefix, name, field))
+        if value is not None:
+            profile[field] = value
+    if not profile:
+        raise ValueError(f"Unknown {kind} profile: {name}")
+    return profile
+
+
+def resolve_connection(connection):
+    """
+    Handler parameters with the password resolved with ``resolve_secret``
+    and the port as a number.
+    """
+    connection = dict(connection)
+    if connection.get("password") is not None:
+        connection["password"] = resolve_secret(connection["password"])
+    if connection.get("port") not in (None, ""):
+        connection["port"] = int(connection["port"])
+    return connection
+
+
+def storage_profile(name):
+    """
+    Backup options of a storage profile, e.g. ``{"storage": "cloud",
+    "provider": "aws", "bucket": "backups", "path": "backups"}``.
+
+    Each field can be set or overridden with ``BACKUP_STORAGE_<NAME>_<FIELD>``.
+
+    Raises:
+        ValueError: If the profile is neither configured nor set in the
+            environment.
+    """
+    profile = _profile("storage", "BACKUP_STORAGE", name, STORAGE_FIELDS)
+    return {field: profile[field] for field in STORAGE_FIELDS if profile.get(field) is not None}
+
+
+def connection_profile(name):
+    """
+    Load a connection profile.
+
+    A profile sets the ``db_type``, the handler parameters (``host``,
+    ``port``, ``user``, ``password``, ``database``) and optionally the name
+    of a ``storage`` profile. Each field can be set or overridden with
+    ``BACKUP_PROFILE_<NAME>_<FIELD>``, e.g. ``BACKUP_PROFILE_ORDERS_PASSWORD``.
+    The password may be a secret reference (see ``resolve_secret``).
+
+    Args:
+        name (str): Profile name.
+
+    Returns:
+        dict: The ``db_type`` (None if not set), the ``connection``
+        parameters and the ``backup`` options of the storage profile.
+
+    Raises:
+        ValueError: If the profile or its storage profile is unknown.
+        RuntimeError: If the password cannot be resolved.
+    """
+    profile = _profile(
+        "connections", "BACKUP_PROFILE", name, ("db_type", "storage") + CONNECTION_FIELDS
+    )
+    connection = {
+        field: profile[field] for field in CONNECTION_FIELDS if profile.get(field) is not None
+    }
+    storage = profile.get("storage")
+    return {
+        "db_type": profile.get("db_type"),
+        "connection": resolve_connection(connection),
+        "backup": storage_profile(storage) if storage else {},
+    }
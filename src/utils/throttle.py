@@ -0,0 +1,304 @@
+import re
+import shutil
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from utils.config import load_config
+from utils.pipeline import CHUNK_SIZE
+
+RATE_UNITS = {
+    "": 1,
+    "k": 1000,
+    "m": 1000**2,
+    "g": 1000**3,
+    "ki": 1024,
+    "mi": 1024**2,
+    "gi": 1024**3,
+}
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+IONICE_CLASSES = {"realtime": "1", "best-effort": "2", "idle": "3"}
+
+# Throttle of the backup job running in the current thread or task; file
+# uploads started by it are paced with it.
+_current = ContextVar("throttle", default=None)
+
+
+def parse_rate(value):
+    """
+    Parse a transfer rate in bytes per second: a number, or a string such
+    as ``20MB``, ``512KiB/s`` or ``1.5G``. Decimal units are powers of 1000,
+    binary units (``KiB``, ``MiB``, ``GiB``) powers of 1024.
+
+    Returns:
+        float: Bytes per second, or None for no limit (None, 0, ``unlimited``).
+
+    Raises:
+        ValueError: If the rate cannot be parsed.
+    """
+    if value is None or value == 0 or value in ("", "0", "unlimited"):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"\s*([\d.]+)\s*([kmg]i?)?b?(?:/s)?\s*", value.lower())
+    if not match:
+        raise ValueError(f"Invalid rate: {value}")
+    return float(match.group(1)) * RATE_UNITS[match.group(2) or ""] or None
+
+
+def _minutes(value):
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+class RateSchedule:
+    """
+    A rate that depends on the time of day: the rate of the first profile
+    whose window contains the current local time, or the default.
+
+    Args:
+        default (float, optional): Bytes per second outside the profiles;
+            None for no limit.
+        profiles (list, optional): ``{"start": "08:00", "end": "18:00",
+            "rate": "10MB", "days": ["mon", ..., "fri"]}`` entries. Windows
+            may wrap midnight; ``days`` defaults to every day and applies to
+            the day the current time falls on.
+    """
+
+    def __init__(self, default=None, profiles=None):
+        self.default = default
+        self.profiles = [
+            (
+                _minutes(profile["start"]),
+                _minutes(profile["end"]),
+                {day.lower()[:3] for day in profile.get("days", DAYS)},
+                parse_rate(profile["rate"]),
+            )
+            for profile in profiles or []
+        ]
+
+    @classmethod
+    def from_config(cls, section, key):
+        """
+        Schedule of the ``key`` rate (e.g. ``job_rate``) of the config's
+        ``throttle`` section: its value is the default, and the profiles
+        that set ``key`` override it during their windows.
+        """
+        profiles = [
+            dict(profile, rate=profile[key])
+            for profile in section.get("profiles", [])
+            if key in profile
+        ]
+        return cls(parse_rate(section.get(key)), profiles)
+
+    def __bool__(self):
+        return bool(self.default or any(profile[3] for profile in self.profiles))
+
+    def rate_at(self, now):
+        minute = now.hour * 60 + now.minute
+        day = DAYS[now.weekday()]
+        for start, end, days, rate in self.profiles:
+            if start <= end:
+                inside = start <= minute < end
+            else:
+                inside = minute >= start or minute < end
+            if inside and day in days:
+                return rate
+        return self.default
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting a byte rate.
+
+    The bucket holds up to ``burst`` bytes of tokens and refills at the
+    current rate of its schedule. Taking more tokens than are left puts the
+    bucket in debt, and the caller sleeps until the debt is paid, so any
+    number of threads sharing a bucket get its rate together.
+
+    Args:
+        schedule (RateSchedule): Rate limit over the day.
+        burst (int, optional): Bucket size; one second of the rate if None.
+    """
+
+    def __init__(self, schedule, burst=None):
+        self.schedule = schedule
+        self.burst = burst
+        self._tokens = None
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size):
+        """
+        Take ``size`` bytes of tokens, sleeping while the bucket is in debt.
+
+        Returns:
+            float: Seconds slept.
+        """
+        with self._lock:
+            rate = self.schedule.rate_at(datetime.now())
+            now = time.monotonic()
+            if not rate:
+                self._tokens = None
+                return 0.0
+            burst = self.burst or rate
+            if self._tokens is None:
+                self._tokens = burst
+            else:
+                self._tokens = min(burst, self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            self._tokens -= size
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class ThrottledReader:
+    """
+    Read-only file object pacing reads from ``file`` with a throttle, for
+    SDK uploads that take a file. Not seekable, so SDKs read it only once.
+    """
+
+    def __init__(self, file, throttle):
+        self._file = file
+        self._throttle = throttle
+        self._position = file.tell()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        return self._position
+
+    def read(self, size=-1):
+        parts = []
+        while size is None or size < 0 or size > 0:
+            want = CHUNK_SIZE if size is None or size < 0 else min(size, CHUNK_SIZE)
+            data = self._file.read(want)
+            if not data:
+                break
+            self._throttle.consume(len(data))
+            parts.append(data)
+            self._position += len(data)
+            if size is not None and size >= 0:
+                size -= len(data)
+        return b"".join(parts)
+
+
+class Throttle:
+    """
+    Rate limits applied together, e.g. a job's own limit and the global one.
+
+    A throttle without any configured limit is false, so callers skip
+    wrapping streams in it.
+
+    Args:
+        *buckets (TokenBucket): Buckets each transfer takes tokens from;
+            None entries are ignored.
+    """
+
+    def __init__(self, *buckets):
+        self.buckets = [bucket for bucket in buckets if bucket is not None and bucket.schedule]
+
+    def __bool__(self):
+        return bool(self.buckets)
+
+    def consume(self, size):
+        return sum(bucket.consume(size) for bucket in self.buckets)
+
+    def wrap(self, chunks):
+        """
+        Pass a stream through at the throttle's rate.
+        """
+        for chunk in chunks:
+            self.consume(len(chunk))
+            yield chunk
+
+    def reader(self, file):
+        """
+        A ``ThrottledReader`` over an open binary file.
+        """
+        return ThrottledReader(file, self)
+
+    def activate(self):
+        """
+        Make this the throttle of file uploads started from the current
+        thread or task, until ``deactivate`` is called with the returned token.
+        """
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current.reset(token)
+
+
+def _throttle_section():
+    return load_config().get("throttle", {})
+
+
+@lru_cache(maxsize=None)
+def global_bucket():
+    """
+    The process-wide bucket of the config's ``global_rate``, shared by all
+    jobs running in this process; None if there is no global limit.
+    """
+    schedule = RateSchedule.from_config(_throttle_section(), "global_rate")
+    return TokenBucket(schedule) if schedule else None
+
+
+def job_throttle(rate_limit=None):
+    """
+    Throttle of one backup job: its own limit and the global one.
+
+    Args:
+        rate_limit (str or float, optional): The job's limit; the config's
+            ``job_rate`` schedule if None.
+    """
+    if rate_limit is None:
+        schedule = RateSchedule.from_config(_throttle_section(), "job_rate")
+    else:
+        schedule = RateSchedule(parse_rate(rate_limit))
+    return Throttle(TokenBucket(schedule), global_bucket())
+
+
+def current_throttle():
+    """
+    Throttle for a file upload: the active job's, or the global one.
+    """
+    return _current.get() or Throttle(global_bucket())
+
+
+def process_priority(nice=None, ionice=None):
+    """
+    Command prefix lowering the CPU and I/O priority of a dump process.
+
+    Args:
+        nice (int, optional): Niceness added with ``nice``; the config's
+            ``throttle.nice`` if None, and 0 to leave it unchanged.
+        ionice (str, optional): I/O class for ``ionice``: ``idle``, or
+            ``best-effort`` with an optional level (``best-effort:7``); the
+            config's ``throttle.ionice`` if None.
+
+    Returns:
+        list: Arguments to put before the command; empty if nothing is
+        lowered or the tools are not installed.
+    """
+    section = _throttle_section()
+    nice = section.get("nice", 0) if nice is None else nice
+    ionice = section.get("ionice") if ionice is None else ionice
+    prefix = []
+    name, _, level = (ionice or "").partition(":")
+    if ionice and name not in IONICE_CLASSES:
+        raise ValueError(f"Invalid ionice class: {ionice}")
+    if ionice and shutil.which("ionice"):
+        prefix += ["ionice", "-c", IONICE_CLASSES[name]]
+        if level:
+            prefix += ["-n", level]
+    if nice and shutil.which("nice"):
+        prefix += ["nice", "-n", str(nice)]
+    return prefix
@@ -0,0 +1,21 @@
+import os
+import sys
+
+# The modules are imported from src/, as cli.py does.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import pytest
+from cryptography.fernet import Fernet
+
+
+@pytest.fixture
+def encryption_key(monkeypatch):
+    """A fresh ENCRYPTION_KEY, with the cached keys derived from it reset."""
+    from utils.encryption import _master_key, derive_key
+
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    _master_key.cache_clear()
+    derive_key.cache_clear()
+    yield
+    _master_key.cache_clear()
+    derive_key.cache_clear()
@@ -0,0 +1,113 @@
+import os
+
+import pytest
+from cryptography.exceptions import InvalidTag
+
+from storage.container import (
+    ContainerReader,
+    is_container,
+    pack_container,
+    write_container,
+)
+from utils.compression import BLOCK_SIZE, CODECS
+
+pytestmark = pytest.mark.usefixtures("encryption_key")
+
+MEMBERS = {
+    "db/empty.dump": b"",
+    "db/small.dump": b"COPY public.orders FROM stdin;\n" * 100,
+    # Spans several frames and ends in a partial one.
+    "db/large.dump": os.urandom(BLOCK_SIZE) + b"x" * (2 * BLOCK_SIZE + 123),
+}
+
+
+def write(path, codec="gzip", encrypt=True, members=MEMBERS):
+    return write_container(
+        ((name, [data]) for name, data in members.items()),
+        str(path),
+        codec=codec,
+        encrypt=encrypt,
+        threads=2,
+    )
+
+
+def read_all(location):
+    with ContainerReader(location) as reader:
+        return {name: b"".join(reader.read_member(name)) for name in reader.members}
+
+
+@pytest.mark.parametrize("codec", sorted(CODECS) + [None])
+def test_round_trip(tmp_path, codec):
+    container = write(tmp_path / "backup.dbk", codec=codec)
+
+    assert is_container(container)
+    assert read_all(container) == MEMBERS
+    with ContainerReader(container) as reader:
+        assert reader.toc["codec"] == codec
+        assert len(reader.members["db/large.dump"]["frames"]) == 4
+        assert len(reader.members["db/empty.dump"]["frames"]) == 1
+
+
+def test_round_trip_unencrypted(tmp_path):
+    container = write(tmp_path / "backup.dbk", encrypt=False)
+
+    assert read_all(container) == MEMBERS
+
+
+def test_pack_and_extract_directory(tmp_path):
+    source = tmp_path / "dump"
+    (source / "db").mkdir(parents=True)
+    (source / "db" / "orders.bson").write_bytes(b"orders")
+    (source / "db" / "users.bson").write_bytes(b"users")
+    container = pack_container(str(source), str(tmp_path / "dump.dbk"))
+
+    with ContainerReader(container) as reader:
+        assert sorted(reader.members) == ["dump/db/orders.bson", "dump/db/users.bson"]
+        extracted = reader.extract("dump/db/users.bson", str(tmp_path / "out"))
+    with open(extracted, "rb") as file:
+        assert file.read() == b"users"
+
+
+def test_truncated_container(tmp_path):
+    container = write(tmp_path / "backup.dbk")
+    with open(container, "r+b") as file:
+        file.truncate(os.path.getsize(container) - 10)
+
+    with pytest.raises(ValueError, match="truncated"):
+        ContainerReader(container)
+
+
+def test_not_a_container(tmp_path):
+    path = tmp_path / "backup.dump"
+    path.write_bytes(b"PGDMP" + bytes(100))
+
+    assert not is_container(str(path))
+    with pytest.raises(ValueError, match="not a backup container"):
+        ContainerReader(str(path))
+
+
+def test_tampered_frame(tmp_path):
+    container = write(tmp_path / "backup.dbk")
+    with ContainerReader(container) as reader:
+        offset = reader.members["db/small.dump"]["frames"][0][0]
+    with open(container, "r+b") as file:
+        file.seek(offset + 5)
+        byte = file.read(1)
+        file.seek(offset + 5)
+        file.write(bytes([byte[0] ^ 0xFF]))
+
+    with ContainerReader(container) as reader:
+        with pytest.raises(InvalidTag):
+            b"".join(reader.read_member("db/small.dump"))
+        # The other members are still readable.
+        assert b"".join(reader.read_member("db/large.dump")) == MEMBERS["db/large.dump"]
+
+
+def test_extract_rejects_paths_outside_output(tmp_path):
+    container = write(tmp_path / "backup.dbk", members={"../escape": b"data"})
+
+    with ContainerReader(container) as reader:
+        with pytest.raises(ValueError, match="outside"):
+            reader.extract("../escape", str(tmp_path / "out"))
+    assert not (tmp_path / "escape").exists()
+
@@ -0,0 +1,117 @@
+import io
+import os
+import struct
+
+import pytest
+from cryptography.exceptions import InvalidTag
+
+from utils.encryption import (
+    STREAM_MAGIC,
+    decrypt_file,
+    decrypt_stream,
+    encrypt_file,
+    encrypt_stream,
+    is_stream_encrypted,
+)
+
+pytestmark = pytest.mark.usefixtures("encryption_key")
+
+CHUNK_SIZE = 1024
+
+
+def encrypt(data, chunk_size=CHUNK_SIZE):
+    # Fed in uneven pieces to exercise the frame buffering.
+    pieces = [data[i : i + 700] for i in range(0, len(data), 700)]
+    return b"".join(encrypt_stream(pieces, chunk_size))
+
+
+def decrypt(stream):
+    return b"".join(decrypt_stream(io.BytesIO(stream)))
+
+
+def frames(stream):
+    """Offsets and header lengths of the frames of an encrypted stream."""
+    offset = len(STREAM_MAGIC) + 7
+    found = []
+    while offset < len(stream):
+        (length,) = struct.unpack(">I", stream[offset : offset + 4])
+        found.append((offset, length))
+        offset += 4 + (length & 0x7FFFFFFF)
+    return found
+
+
+@pytest.mark.parametrize("size", [0, 1, CHUNK_SIZE, 3 * CHUNK_SIZE + 17])
+def test_round_trip(size):
+    data = os.urandom(size)
+    stream = encrypt(data)
+
+    assert stream.startswith(STREAM_MAGIC)
+    assert decrypt(stream) == data
+
+
+def test_only_the_last_frame_is_final():
+    stream = encrypt(os.urandom(3 * CHUNK_SIZE + 17))
+
+    flags = [bool(length & 0x80000000) for _, length in frames(stream)]
+    assert flags == [False, False, False, True]
+
+
+def test_dropped_final_frame():
+    stream = encrypt(os.urandom(3 * CHUNK_SIZE + 17))
+    last, _ = frames(stream)[-1]
+
+    with pytest.raises(ValueError, match="truncated"):
+        decrypt(stream[:last])
+
+
+def test_truncated_frame():
+    stream = encrypt(os.urandom(3 * CHUNK_SIZE))
+
+    with pytest.raises(ValueError, match="truncated"):
+        decrypt(stream[:-10])
+
+
+def test_frame_marked_final_early():
+    stream = bytearray(encrypt(os.urandom(3 * CHUNK_SIZE + 17)))
+    offset, length = frames(bytes(stream))[1]
+    stream[offset : offset + 4] = struct.pack(">I", length | 0x80000000)
+
+    # The final flag is part of the nonce, so cutting the stream short at a
+    # frame boundary does not authenticate.
+    with pytest.raises(InvalidTag):
+        decrypt(bytes(stream[: offset + 4 + length]))
+
+
+def test_tampered_frame():
+    stream = bytearray(encrypt(os.urandom(3 * CHUNK_SIZE)))
+    offset, _ = frames(bytes(stream))[1]
+    stream[offset + 10] ^= 0xFF
+
+    with pytest.raises(InvalidTag):
+        decrypt(bytes(stream))
+
+
+def test_trailing_data():
+    stream = encrypt(b"data")
+
+    with pytest.raises(ValueError, match="after the end"):
+        decrypt(stream + b"x")
+
+
+def test_not_an_encrypted_stream():
+    with pytest.raises(ValueError, match="Not an encrypted"):
+        decrypt(b"PGDMP" + bytes(100))
+
+
+def test_encrypt_and_decrypt_file(tmp_path):
+    path = tmp_path / "backup.dump"
+    data = os.urandom(100_000)
+    path.write_bytes(data)
+
+    encrypted = encrypt_file(str(path))
+    path.unlink()
+
+    assert is_stream_encrypted(encrypted)
+    decrypted = decrypt_file(encrypted)
+    with open(decrypted, "rb") as file:
+        assert file.read() == data
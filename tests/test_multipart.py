@@ -0,0 +1,106 @@
+import logging
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from storage.multipart import AzureBlockUploader, ResumeManifest, S3MultipartUploader
+
+BUCKET = "backups"
+PART_SIZE = 5 * 2**20
+logger = logging.getLogger("test")
+
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture
+def backup_file(tmp_path):
+    path = tmp_path / "backup.dump.gz.enc"
+    path.write_bytes(os.urandom(3 * PART_SIZE + 1000))
+    return str(path)
+
+
+class FailingUploader(S3MultipartUploader):
+    """Uploader whose connection drops on one part."""
+
+    def __init__(self, client, fail_on, **kwargs):
+        super().__init__(client, **kwargs)
+        self.fail_on = fail_on
+        self.sent = []
+
+    def upload_part(self, bucket, object_name, upload_id, number, data):
+        if number == self.fail_on:
+            raise ConnectionError("connection reset")
+        self.sent.append(number)
+        return super().upload_part(bucket, object_name, upload_id, number, data)
+
+
+def test_s3_upload_resumes_with_missing_parts(s3, backup_file, tmp_path):
+    settings = {"part_size": PART_SIZE, "concurrency": 1, "manifest_dir": str(tmp_path / "m")}
+    first = FailingUploader(s3, fail_on=3, **settings)
+    with pytest.raises(ConnectionError):
+        first.upload(backup_file, BUCKET, "backup", logger)
+    manifest = ResumeManifest(
+        settings["manifest_dir"], "aws", BUCKET, "backup", backup_file, PART_SIZE
+    )
+    assert sorted(manifest.parts) == [1, 2, 4]
+
+    second = FailingUploader(s3, fail_on=None, **settings)
+    second.upload(backup_file, BUCKET, "backup", logger)
+
+    assert second.sent == [3]
+    body = s3.get_object(Bucket=BUCKET, Key="backup")["Body"].read()
+    with open(backup_file, "rb") as file:
+        assert body == file.read()
+    assert not os.path.exists(manifest.path)
+
+
+def test_s3_upload_restarts_when_upload_is_gone(s3, backup_file, tmp_path):
+    settings = {"part_size": PART_SIZE, "concurrency": 1, "manifest_dir": str(tmp_path / "m")}
+    first = FailingUploader(s3, fail_on=2, **settings)
+    with pytest.raises(ConnectionError):
+        first.upload(backup_file, BUCKET, "backup", logger)
+    manifest = ResumeManifest(
+        settings["manifest_dir"], "aws", BUCKET, "backup", backup_file, PART_SIZE
+    )
+    s3.abort_multipart_upload(Bucket=BUCKET, Key="backup", UploadId=manifest.upload_id)
+
+    second = FailingUploader(s3, fail_on=None, **settings)
+    second.upload(backup_file, BUCKET, "backup", logger)
+
+    assert second.sent == [1, 2, 3, 4]
+    assert s3.head_object(Bucket=BUCKET, Key="backup")["ContentLength"] == os.path.getsize(
+        backup_file
+    )
+
+
+def test_azure_block_list_errors_are_not_treated_as_missing_blocks():
+    from azure.core.exceptions import ClientAuthenticationError, ResourceNotFoundError
+
+    class Blob:
+        def __init__(self, error):
+            self.error = error
+
+        def get_block_list(self, kind):
+            raise self.error
+
+    class Container:
+        def __init__(self, error):
+            self.error = error
+
+        def get_blob_client(self, name):
+            return Blob(self.error)
+
+    missing = AzureBlockUploader(Container(ResourceNotFoundError("no blob")))
+    assert missing.existing_parts("c", "backup", "id") == set()
+
+    denied = AzureBlockUploader(Container(ClientAuthenticationError("bad key")))
+    with pytest.raises(ClientAuthenticationError):
+        denied.existing_parts("c", "backup", "id")
@@ -0,0 +1,225 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from storage.catalog import BackupCatalog
+from storage.retention import RetentionPolicy, prune
+
+logger = logging.getLogger("test")
+
+
+@pytest.fixture(autouse=True)
+def utc(monkeypatch):
+    # Retention periods are in local time.
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def entries(*times, db_type="postgres", host="db1", database="shop", backup_format="custom"):
+    """Catalog entries taken at ``times``, newest first, with ids in input order."""
+    return [
+        {
+            "id": f"{host}/{database}/{created}",
+            "db_type": db_type,
+            "host": host,
+            "database": database,
+            "format": backup_format,
+            "created": created,
+        }
+        for created in sorted(times, reverse=True)
+    ]
+
+
+def ids(*times, host="db1", database="shop"):
+    return {f"{host}/{database}/{created}" for created in times}
+
+
+def hourly_from(start, count, step=timedelta(hours=1)):
+    start = datetime.fromisoformat(start)
+    return [(start + n * step).strftime("%Y-%m-%dT%H:%M:%SZ") for n in range(count)]
+
+
+def test_empty_policy():
+    with pytest.raises(ValueError, match="keeps no backups"):
+        RetentionPolicy()
+    with pytest.raises(ValueError, match="negative"):
+        RetentionPolicy(keep_last=1, daily=-1)
+
+
+def test_from_config_overrides():
+    policy = RetentionPolicy.from_config(
+        {"retention": {"keep_last": 3, "daily": 7}}, daily=None, weekly=4
+    )
+
+    assert policy.keep_last == 3
+    assert policy.rules == {"hourly": 0, "daily": 7, "weekly": 4, "monthly": 0}
+
+
+def test_keep_last():
+    times = hourly_from("2026-01-01T00:00:00", 5)
+
+    kept = RetentionPolicy(keep_last=2).keep(entries(*times))
+
+    assert kept == ids(*times[-2:])
+
+
+def test_hourly_keeps_the_newest_of_each_hour():
+    # Two backups an hour, 00:00 to 03:30.
+    times = hourly_from("2026-01-01T00:00:00", 8, step=timedelta(minutes=30))
+
+    kept = RetentionPolicy(hourly=3).keep(entries(*times))
+
+    assert kept == ids("2026-01-01T03:30:00Z", "2026-01-01T02:30:00Z", "2026-01-01T01:30:00Z")
+
+
+def test_daily_across_midnight():
+    times = hourly_from("2026-01-01T20:00:00", 9)
+
+    kept = RetentionPolicy(daily=2).keep(entries(*times))
+
+    assert kept == ids("2026-01-02T04:00:00Z", "2026-01-01T23:00:00Z")
+
+
+def test_daily_skips_days_without_backups():
+    kept = RetentionPolicy(daily=2).keep(
+        entries("2026-01-10T00:00:00Z", "2026-01-01T12:00:00Z", "2026-01-01T00:00:00Z")
+    )
+
+    assert kept == ids("2026-01-10T00:00:00Z", "2026-01-01T12:00:00Z")
+
+
+def test_weekly_uses_iso_weeks_across_the_year_boundary():
+    # 2025-12-30 and 2026-01-04 are in ISO week 2026-W01, 2026-01-05 in W02.
+    times = ("2025-12-30T12:00:00Z", "2026-01-04T12:00:00Z", "2026-01-05T12:00:00Z")
+
+    kept = RetentionPolicy(weekly=3).keep(entries(*times))
+
+    assert kept == ids("2026-01-05T12:00:00Z", "2026-01-04T12:00:00Z")
+
+
+def test_monthly_across_month_end():
+    times = ("2026-01-31T23:00:00Z", "2026-02-01T00:00:00Z", "2026-02-15T00:00:00Z")
+
+    kept = RetentionPolicy(monthly=2).keep(entries(*times))
+
+    assert kept == ids("2026-02-15T00:00:00Z", "2026-01-31T23:00:00Z")
+
+
+def test_rules_combine():
+    # Daily backups at noon for 60 days.
+    times = hourly_from("2026-01-01T12:00:00", 60, step=timedelta(days=1))
+
+    kept = RetentionPolicy(keep_last=2, daily=3, weekly=2, monthly=3).keep(entries(*times))
+
+    assert kept == ids(
+        "2026-03-01T12:00:00Z",  # keep_last, daily, weekly and monthly
+        "2026-02-28T12:00:00Z",  # keep_last, daily, end of February
+        "2026-02-27T12:00:00Z",  # daily
+        "2026-02-22T12:00:00Z",  # weekly: Sunday of the previous ISO week
+        "2026-01-31T12:00:00Z",  # monthly
+    )
+
+
+def test_expired_groups_by_database_and_host():
+    times = hourly_from("2026-01-01T00:00:00", 3)
+    backups = (
+        entries(*times)
+        + entries(*times, host="db2")
+        + entries(*times, database="billing")
+        + entries(*times, db_type="mongo")
+    )
+    backups.sort(key=lambda backup: backup["created"], reverse=True)
+
+    expired = RetentionPolicy(keep_last=1).expired(backups)
+
+    assert len(expired) == 8
+    assert {backup["created"] for backup in expired} == set(times[:2])
+    assert [backup["created"] for backup in expired] == sorted(
+        (backup["created"] for backup in expired), reverse=True
+    )
+    # Entries of different database types are judged apart too.
+    assert {(backup["db_type"], backup["host"], backup["database"]) for backup in expired} == {
+        ("postgres", "db1", "shop"),
+        ("postgres", "db2", "shop"),
+        ("postgres", "db1", "billing"),
+        ("mongo", "db1", "shop"),
+    }
+
+
+def test_expired_skips_incremental_archives():
+    times = hourly_from("2026-01-01T00:00:00", 3)
+    backups = entries(*times) + entries("2025-01-01T00:00:00Z", backup_format="incremental")
+
+    expired = RetentionPolicy(keep_last=1).expired(backups)
+
+    assert [backup["format"] for backup in expired] == ["custom", "custom"]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    with BackupCatalog(str(tmp_path / "catalog.sqlite")) as catalog:
+        yield catalog
+
+
+def created(hours):
+    return datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(hours=hours)
+
+
+def test_latest_per_database(catalog):
+    catalog.record("postgres", "shop", ["a"], host="db1", created=created(1))
+    newest_db1 = catalog.record("postgres", "shop", ["b"], host="db1", created=created(2))
+    newest_db2 = catalog.record("postgres", "shop", ["c"], host="db2", created=created(1))
+    catalog.record("postgres", "shop", ["d"], host=None, created=created(0))
+    newest_no_host = catalog.record("postgres", "shop", ["e"], host=None, created=created(1))
+    mongo = catalog.record("mongo", "shop", ["f"], host="db1", created=created(0))
+    catalog.record(
+        "postgres", "shop", ["wal"], host="db1", created=created(5), backup_format="incremental"
+    )
+
+    latest = catalog.latest_per_database()
+
+    assert {backup["id"] for backup in latest} == {newest_db1, newest_db2, newest_no_host, mongo}
+    assert latest[0]["id"] == newest_db1 and latest[-1]["id"] == mongo
+    assert [backup["id"] for backup in catalog.latest_per_database(db_type="mongo")] == [mongo]
+    assert catalog.latest_per_database(database="billing") == []
+
+
+def test_latest_per_database_skips_pruned(catalog):
+    older = catalog.record("postgres", "shop", ["a"], host="db1", created=created(1))
+    newer = catalog.record("postgres", "shop", ["b"], host="db1", created=created(2))
+    catalog.mark_deleted(newer, "b")
+
+    assert catalog.get(newer)["status"] == "pruned"
+    assert [backup["id"] for backup in catalog.latest_per_database()] == [older]
+
+
+def test_prune_deletes_expired_backups(catalog, tmp_path):
+    paths = []
+    for hours in range(3):
+        path = tmp_path / f"shop-{hours}.dump.gz.enc"
+        path.write_bytes(b"backup")
+        paths.append(path)
+        catalog.record("postgres", "shop", [str(path)], host="db1", created=created(hours))
+    archive = tmp_path / "wal"
+    archive.mkdir()
+    catalog.record(
+        "postgres", "shop", [str(archive)], host="db1", created=created(0),
+        backup_format="incremental",
+    )
+    policy = RetentionPolicy(keep_last=1)
+
+    planned = prune(catalog, policy, logger, dry_run=True)
+    assert all(path.exists() for path in paths)
+
+    expired = prune(catalog, policy, logger)
+
+    assert [backup["id"] for backup in expired] == [backup["id"] for backup in planned]
+    assert [backup["errors"] for backup in expired] == [{}, {}]
+    assert [path.exists() for path in paths] == [False, False, True]
+    assert archive.exists()
+    assert [backup["locations"] for backup in catalog.find()] == [[str(paths[2])], [str(archive)]]
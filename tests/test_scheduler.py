@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+from scheduler.scheduler import CronSchedule
+
+
+def runs(expression, start, count):
+    schedule = CronSchedule(expression)
+    moment = datetime.fromisoformat(start)
+    found = []
+    for _ in range(count):
+        moment = schedule.next_after(moment)
+        found.append(moment.strftime("%Y-%m-%d %a %H:%M"))
+    return found
+
+
+def test_steps_and_ranges():
+    assert runs("*/20 9-10 * * *", "2026-01-01T09:30:00", 4) == [
+        "2026-01-01 Thu 09:40",
+        "2026-01-01 Thu 10:00",
+        "2026-01-01 Thu 10:20",
+        "2026-01-01 Thu 10:40",
+    ]
+
+
+def test_aliases_and_names():
+    assert runs("@weekly", "2026-01-01T00:00:00", 1) == ["2026-01-04 Sun 00:00"]
+    assert runs("30 2 1 jan,jul *", "2026-01-01T03:00:00", 1) == ["2026-07-01 Wed 02:30"]
+
+
+def test_restricted_day_fields_match_either():
+    # The 13th of each month or any Friday.
+    assert runs("0 0 13 * 5", "2026-01-01T00:00:00", 3) == [
+        "2026-01-02 Fri 00:00",
+        "2026-01-09 Fri 00:00",
+        "2026-01-13 Tue 00:00",
+    ]
+
+
+def test_stepped_day_field_is_unrestricted():
+    # Odd days that are Mondays, as in cron, not odd days or Mondays.
+    assert runs("0 0 */2 * 1", "2026-01-01T00:00:00", 3) == [
+        "2026-01-05 Mon 00:00",
+        "2026-01-19 Mon 00:00",
+        "2026-02-09 Mon 00:00",
+    ]
+    # Every day of the week, so only the first of the month.
+    assert runs("0 0 1 * */1", "2026-01-01T00:00:00", 1) == ["2026-02-01 Sun 00:00"]
+
+
+def test_invalid_expressions():
+    with pytest.raises(ValueError, match="Invalid cron expression"):
+        CronSchedule("0 0 * *")
+    with pytest.raises(ValueError, match="never matches"):
+        CronSchedule("0 0 30 2 *").next_after(datetime(2026, 1, 1))